@@ -0,0 +1,201 @@
+"""
+Long synthetic run of activation code churn against DB_URL: the former unpartitioned table
+with row deletes (the sweeper's batches) vs hourly partitions rotated by
+`services/partitions.rotate`. Each runs in its own schema with its own users. Time is
+simulated: each minute inserts `--codes-per-minute` codes one statement each, looks up as
+many recent codes, then runs the table's maintenance. Reports insert and lookup throughput,
+maintenance time, and the final table size with its dead tuples. Autovacuum gets far less
+time per simulated hour than in production, so the unpartitioned bloat is pessimistic.
+
+Usage : `python3 -m benchmarks.activation_code_churn [--hours 6] [--codes-per-minute 500]`
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import psycopg
+
+from src.repositories.activation_code import CODE_TTL
+from src.services.migrations import MIGRATIONS_DIR, list_migrations, migrate
+from src.services.partitions import rotate
+
+USERS = 10_000
+# Last migration of the unpartitioned schema
+UNPARTITIONED_VERSION = 3
+
+_INSERT_CODE = (
+    "INSERT INTO activation_code (user_id, code, created_at) VALUES (%s, %s, %s)"
+)
+# DatabaseActivationCodeRepository.has_valid_code, with the simulated clock
+_LOOKUP_CODE = """
+SELECT 1 from activation_code
+WHERE activation_code.user_id = %s
+    AND activation_code.code = %s
+    AND created_at >= %s
+    AND created_at < %s
+LIMIT 1
+"""
+# DatabaseActivationCodeRepository.delete_expired_codes
+_DELETE_EXPIRED = """
+WITH batch AS (
+    SELECT id FROM activation_code
+    WHERE id > %s AND created_at < %s
+    ORDER BY id
+    LIMIT %s
+)
+DELETE FROM activation_code
+USING batch
+WHERE activation_code.id = batch.id
+RETURNING activation_code.id
+"""
+
+
+def _connect(schema: str) -> psycopg.Connection:
+    # Commits aren't waited for: measures the table, not the disk flush
+    return psycopg.connect(
+        os.getenv("DB_URL"),
+        autocommit=True,
+        options=f"-c search_path={schema} -c synchronous_commit=off",
+    )
+
+
+def _create_schema(schema: str, max_version: int | None) -> None:
+    with psycopg.connect(os.getenv("DB_URL"), autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        conn.execute(f"CREATE SCHEMA {schema}")
+    with tempfile.TemporaryDirectory() as directory:
+        for version, _, path in list_migrations(MIGRATIONS_DIR):
+            if max_version is None or version <= max_version:
+                shutil.copy(path, Path(directory) / path.name)
+        with _connect(schema) as conn:
+            migrate(conn, Path(directory))
+            conn.execute(
+                "INSERT INTO users (email, password) "
+                "SELECT 'user' || i || '@bench.com', 'hash' FROM generate_series(1, %s) i",
+                (USERS,),
+            )
+
+
+def _delete_expired(conn: psycopg.Connection, now: datetime) -> None:
+    after_id = 0
+    while True:
+        ids = [
+            row[0]
+            for row in conn.execute(
+                _DELETE_EXPIRED, (after_id, now - CODE_TTL, 500)
+            ).fetchall()
+        ]
+        if len(ids) < 500:
+            return
+        after_id = max(ids)
+
+
+def _table_stats(conn: psycopg.Connection) -> dict:
+    conn.execute("SELECT pg_stat_force_next_flush()")
+    size, live, dead = conn.execute(
+        """
+SELECT
+    sum(pg_total_relation_size(relid)),
+    sum(COALESCE(n_live_tup, 0)),
+    sum(COALESCE(n_dead_tup, 0))
+FROM (
+    -- Partitions included, the tree is empty for a plain table
+    SELECT 'activation_code'::regclass AS relid
+    UNION SELECT relid FROM pg_partition_tree('activation_code')
+) tables
+LEFT JOIN pg_stat_user_tables stats USING (relid)
+""",
+    ).fetchone()
+    return {
+        "table_mb": round(float(size) / 2**20, 2),
+        "live_rows": int(live),
+        "dead_rows": int(dead),
+    }
+
+
+def _run(name: str, schema: str, hours: int, codes_per_minute: int) -> dict:
+    rng = random.Random(0)
+    partitioned = name == "partitioned"
+    insert_time = maintenance_time = 0.0
+    lookups = []
+
+    start = datetime.now(timezone.utc).replace(
+        minute=0, second=0, microsecond=0
+    ) - timedelta(hours=hours)
+    with _connect(schema) as conn:
+        if partitioned:
+            rotate(conn, CODE_TTL, now=start)
+        for minute in range(hours * 60):
+            now = start + timedelta(minutes=minute)
+            codes = [
+                (rng.randint(1, USERS), f"{rng.randint(0, 9999):04d}")
+                for _ in range(codes_per_minute)
+            ]
+
+            begin = time.perf_counter()
+            for i, (user_id, code) in enumerate(codes):
+                created_at = now + timedelta(seconds=60 * i / codes_per_minute)
+                conn.execute(_INSERT_CODE, (user_id, code, created_at), prepare=True)
+            insert_time += time.perf_counter() - begin
+
+            lookup_now = now + timedelta(seconds=59)
+            for user_id, code in codes:
+                begin = time.perf_counter()
+                conn.execute(
+                    _LOOKUP_CODE,
+                    (user_id, code, lookup_now - CODE_TTL, lookup_now + CODE_TTL),
+                    prepare=True,
+                ).fetchone()
+                lookups.append(time.perf_counter() - begin)
+
+            begin = time.perf_counter()
+            if partitioned:
+                rotate(conn, CODE_TTL, now=lookup_now)
+            else:
+                _delete_expired(conn, lookup_now)
+            maintenance_time += time.perf_counter() - begin
+
+        lookup_time = sum(lookups)
+        lookups.sort()
+        rows = hours * 60 * codes_per_minute
+        return {
+            "table": name,
+            "inserts_per_s": round(rows / insert_time),
+            "lookups_per_s": round(rows / lookup_time),
+            "lookup_p50_ms": round(statistics.median(lookups) * 1000, 3),
+            "lookup_p99_ms": round(lookups[int(len(lookups) * 0.99) - 1] * 1000, 3),
+            "maintenance_s": round(maintenance_time, 2),
+            **_table_stats(conn),
+        }
+
+
+def run(hours: int = 6, codes_per_minute: int = 500) -> list[dict]:
+    results = []
+    for name, schema, max_version in (
+        ("unpartitioned", "bench_codes_unpartitioned", UNPARTITIONED_VERSION),
+        ("partitioned", "bench_codes_partitioned", None),
+    ):
+        _create_schema(schema, max_version)
+        try:
+            results.append(_run(name, schema, hours, codes_per_minute))
+        finally:
+            with psycopg.connect(os.getenv("DB_URL"), autocommit=True) as conn:
+                conn.execute(f"DROP SCHEMA {schema} CASCADE")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks.activation_code_churn")
+    parser.add_argument("--hours", type=int, default=6, help="Simulated hours")
+    parser.add_argument("--codes-per-minute", type=int, default=500)
+    args = parser.parse_args()
+
+    for result in run(args.hours, args.codes_per_minute):
+        print(result, flush=True)
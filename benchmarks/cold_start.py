@@ -0,0 +1,57 @@
+"""
+Cold-start time of a fresh interpreter, for modules that may touch the database.
+
+Usage : `python3 -m benchmarks.cold_start [runs]`
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+SCENARIOS = {
+    "import use cases (tests, CLI)": "import src.use_cases.register_user",
+    "import main": "import main",
+    "startup until ready": (
+        "from fastapi.testclient import TestClient\n"
+        "import main\n"
+        "with TestClient(main.app) as client:\n"
+        "    assert client.get('/api/ready').status_code == 200\n"
+    ),
+}
+
+
+def _measure(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def run(runs: int = 3) -> list[dict]:
+    results = []
+    for name, code in SCENARIOS.items():
+        try:
+            durations = [_measure(code) for _ in range(runs)]
+        except subprocess.CalledProcessError:
+            results.append({"scenario": name, "error": "failed"})
+            continue
+        results.append(
+            {
+                "scenario": name,
+                "median_ms": round(statistics.median(durations) * 1000, 1),
+                "max_ms": round(max(durations) * 1000, 1),
+            }
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    for result in run(runs):
+        print(result)
@@ -0,0 +1,76 @@
+"""
+Concurrent HTTP load against a running API, to compare API_MODE=sync and API_MODE=async.
+
+Usage : `python3 -m benchmarks.http_load [base_url] [requests] [concurrency]`
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+
+
+async def _timed(client: httpx.AsyncClient, method: str, url: str, kwargs: dict):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    return time.perf_counter() - start, response.status_code
+
+
+async def _scenario(base_url: str, name: str, requests: int, concurrency: int, build):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+
+        async def one(i: int):
+            async with semaphore:
+                return await _timed(client, *build(i))
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status >= 500)
+    return {
+        "scenario": name,
+        "requests": requests,
+        "errors": errors,
+        "req_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+async def run(base_url: str, requests: int, concurrency: int) -> list[dict]:
+    run_id = uuid.uuid4().hex[:8]
+    return [
+        await _scenario(
+            base_url,
+            "health",
+            requests,
+            concurrency,
+            lambda i: ("GET", "/api/health", {}),
+        ),
+        await _scenario(
+            base_url,
+            "register",
+            requests,
+            concurrency,
+            lambda i: (
+                "POST",
+                "/api/user/",
+                {"json": {"email": f"{run_id}-{i}@bench.com", "password": "Bench@123"}},
+            ),
+        ),
+    ]
+
+
+if __name__ == "__main__":
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    for result in asyncio.run(run(base_url, requests, concurrency)):
+        print(result)
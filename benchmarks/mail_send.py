@@ -0,0 +1,78 @@
+"""
+Mail send throughput and TCP connections used, against the local stub mail server.
+Compares a new urllib connection per mail (former HttpEmailAdapter) with the pooled adapter.
+
+Usage : `python3 -m benchmarks.mail_send [mails] [latency_ms]`
+"""
+
+import json
+import sys
+import time
+import urllib.request
+
+from benchmarks.mail_server import StubMailServer
+from src.services.mail import HttpEmailAdapter
+
+
+def _urllib_send(url: str, mails: list[tuple[str, str]]) -> None:
+    for email, code in mails:
+        data = json.dumps({"to": email, "subject": "", "body": code}).encode()
+        request = urllib.request.Request(
+            url, data=data, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request) as response:
+            response.read()
+
+
+def _run(name: str, send, mails: list, latency: float) -> None:
+    server = StubMailServer(latency=latency).start()
+    try:
+        start = time.perf_counter()
+        send(server, mails)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    print(
+        f"{name:<24} {len(mails) / elapsed:>8.0f} mails/s  "
+        f"connections={server.connections:<4} requests={server.requests}",
+        flush=True,
+    )
+
+
+def _pooled_sequential(server: StubMailServer, mails: list) -> None:
+    adapter = HttpEmailAdapter(api_url=server.url)
+    for mail in mails:
+        adapter.send_activation_code_to(*mail)
+    adapter.close()
+
+
+def _pooled_send_many(server: StubMailServer, mails: list) -> None:
+    adapter = HttpEmailAdapter(api_url=server.url, concurrency=10)
+    adapter.send_many(mails)
+    adapter.close()
+
+
+def _bulk_send_many(server: StubMailServer, mails: list) -> None:
+    adapter = HttpEmailAdapter(
+        api_url=server.url, bulk_url=server.bulk_url, bulk_size=100
+    )
+    adapter.send_many(mails)
+    adapter.close()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 2) / 1000
+    mails = [(f"bench-{i}@bench.com", f"{i % 10000:04d}") for i in range(count)]
+
+    print(f"{count} mails, {latency * 1000:.0f} ms provider latency", flush=True)
+    _run(
+        "urllib, new connection",
+        lambda server, mails: _urllib_send(server.url, mails),
+        mails,
+        latency,
+    )
+    _run("pooled, sequential", _pooled_sequential, mails, latency)
+    _run("pooled, send_many", _pooled_send_many, mails, latency)
+    _run("bulk endpoint", _bulk_send_many, mails, latency)
@@ -0,0 +1,101 @@
+"""
+Local stand-in for the third-party mail API, counting requests, mails and TCP connections.
+`POST /api/send` takes one mail, `POST /api/send/bulk` takes `{"messages": [...]}`.
+
+Usage : `python3 -m benchmarks.mail_server [port] [latency_ms]`
+then `MAIL_API_URL=http://localhost:<port>/api/send` (and `MAIL_BULK_API_URL=.../bulk`).
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubMailServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0, fail_to: tuple = ()):
+        """
+        `latency` (s) is added to every request, mails sent to `fail_to` get a 500.
+        """
+        super().__init__(("127.0.0.1", port), _MailHandler)
+        self.latency = latency
+        self.fail_to = set(fail_to)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.mails = []
+        self.__thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/api/send"
+
+    @property
+    def bulk_url(self) -> str:
+        return f"{self.url}/bulk"
+
+    def start(self) -> "StubMailServer":
+        self.__thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Clients timing out close the connection before the response
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _MailHandler(BaseHTTPRequestHandler):
+    # Keep-alive, one handler instance per TCP connection
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, Nagle would delay the body on keep-alive
+    disable_nagle_algorithm = True
+    server: StubMailServer
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        messages = body["messages"] if self.path.endswith("/bulk") else [body]
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        failed = any(message["to"] in self.server.fail_to for message in messages)
+        with self.server.lock:
+            self.server.requests += 1
+            if not failed:
+                self.server.mails.extend(messages)
+
+        response = json.dumps({"accepted": 0 if failed else len(messages)}).encode()
+        self.send_response(500 if failed else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8025
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    server = StubMailServer(port, latency_ms / 1000)
+    print(f"Stub mail server on {server.url} (bulk: {server.bulk_url})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(
+            f"connections={server.connections} requests={server.requests} "
+            f"mails={len(server.mails)}"
+        )
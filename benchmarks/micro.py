@@ -0,0 +1,339 @@
+"""
+Microbenchmarks of the hot paths: value objects, snapshots, auth parsing, bcrypt and
+repositories (in memory, Postgres, SQLite). Results (ops/s, per-call p50/p99, peak
+allocation per op) are written as JSON and compared with `benchmarks/baseline.json`, exiting with 1
+when an op/s drop exceeds the threshold. Postgres benchmarks run against DB_URL and are
+skipped without it, SQLite ones use a temporary file.
+
+Usage : `python3 -m benchmarks.micro [-k name] [--threshold 0.25] [--update-baseline]`
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from contextlib import contextmanager
+from pathlib import Path
+
+import psycopg
+from starlette.requests import Request
+
+from src.models import User
+from src.models.value_objects import Email, Password, UserId
+from src.repositories import InMemoryActivationCodeRepository, InMemoryUserRepository
+from src.repositories.activation_code import (
+    CodeStoreActivationCodeRepository,
+    DatabaseActivationCodeRepository,
+    SQLiteActivationCodeRepository,
+)
+from src.repositories.user import DatabaseUserRepository, SQLiteUserRepository
+from src.services import auth, hashing
+from src.services.code_store import CodeStore
+from src.services.migrations import migrate
+from src.services.sqlite import SQLiteDatabase
+
+BASELINE = Path(__file__).parent / "baseline.json"
+RESULTS = Path(__file__).parent / "results.json"
+
+
+class SkipBenchmark(Exception):
+    pass
+
+
+def _basic_auth_request() -> Request:
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (b"authorization", b"Basic dXNlckB0ZXN0LmNvbTpQYXNzd29yZEAxMjM=")
+            ],
+        }
+    )
+
+
+@contextmanager
+def _models():
+    password = Password("Password@123")
+    # Hash is memoized, the snapshot is measured without bcrypt
+    password.to_snapshot()
+    user = User(Email("user@test.com"), password)
+    request = _basic_auth_request()
+
+    yield {
+        "email_validation": lambda: Email("user@test.com"),
+        "password_validation": lambda: Password("Password@123"),
+        # Peak allocation is the memory of one User with its value objects
+        "user_construction": lambda: User(
+            Email("user@test.com"), Password("Password@123")
+        ),
+        "user_to_snapshot": user.to_snapshot,
+        "user_to_public_snapshot": user.to_public_snapshot,
+        "parse_basic_auth": lambda: auth._parse_basic_auth(request),
+    }
+
+
+@contextmanager
+def _bcrypt():
+    hashed = hashing._hashpw(b"Password@123")
+
+    yield {
+        "bcrypt_hash": lambda: hashing._hashpw(b"Password@123"),
+        "bcrypt_check": lambda: hashing._checkpw(b"Password@123", hashed),
+    }
+
+
+def _repository_benchmarks(repository, run_id: str) -> dict:
+    # Users share one password, hashed once, so repository ops don't include bcrypt
+    password = Password("Password@123")
+    password.to_snapshot()
+    ids = itertools.count()
+    repository.save_user(User(Email(f"{run_id}@bench.com"), password))
+
+    return {
+        "save_user": lambda: repository.save_user(
+            User(Email(f"{run_id}-{next(ids)}@bench.com"), password)
+        ),
+        "select_by_email": lambda: repository.select_by_email(f"{run_id}@bench.com"),
+    }
+
+
+def _activation_code_benchmarks(repository, user: User) -> dict:
+    code = user.to_public_snapshot().get("activation_code")
+    repository.save_activation_code(user)
+
+    return {
+        "save_activation_code": lambda: repository.save_activation_code(user),
+        "has_valid_code": lambda: repository.has_valid_code(
+            user.to_public_snapshot().get("id"), code
+        ),
+    }
+
+
+@contextmanager
+def _in_memory_repositories():
+    repository = InMemoryUserRepository(InMemoryActivationCodeRepository())
+    benchmarks = _repository_benchmarks(repository, "memory")
+
+    yield {f"in_memory_{name}": fn for name, fn in benchmarks.items()}
+
+
+@contextmanager
+def _database_repositories():
+    if not os.getenv("DB_URL"):
+        raise SkipBenchmark("no DB_URL")
+    try:
+        conn = psycopg.connect(os.getenv("DB_URL"), connect_timeout=3)
+    except psycopg.OperationalError as e:
+        raise SkipBenchmark(f"database unavailable ({e})")
+
+    migrate(conn)
+    repository = DatabaseUserRepository(conn, DatabaseActivationCodeRepository(conn))
+    benchmarks = _repository_benchmarks(repository, f"micro-{time.time_ns()}")
+    user = User(
+        Email(f"micro-codes-{time.time_ns()}@bench.com"), Password("Password@123")
+    )
+    repository.save_user(user)
+    benchmarks |= _activation_code_benchmarks(
+        DatabaseActivationCodeRepository(conn), user
+    )
+    try:
+        yield {f"database_{name}": fn for name, fn in benchmarks.items()}
+    finally:
+        # Nothing written by the benchmarks is kept
+        conn.rollback()
+        conn.close()
+
+
+@contextmanager
+def _sqlite_repositories():
+    # Same benchmarks as Postgres, each write is committed (WAL, synchronous=NORMAL)
+    with tempfile.TemporaryDirectory() as directory:
+        db = SQLiteDatabase(os.path.join(directory, "micro.sqlite3"))
+        db.open()
+        repository = SQLiteUserRepository(db, SQLiteActivationCodeRepository(db))
+        benchmarks = _repository_benchmarks(repository, "sqlite")
+        try:
+            yield {f"sqlite_{name}": fn for name, fn in benchmarks.items()}
+        finally:
+            db.close()
+
+
+@contextmanager
+def _code_store_repositories():
+    # Same code benchmarks as Postgres, in the process' timing wheel
+    user = User(Email("codes@bench.com"), Password("Password@123"))
+    user.register(UserId(1))
+    benchmarks = _activation_code_benchmarks(
+        CodeStoreActivationCodeRepository(CodeStore()), user
+    )
+
+    yield {f"code_store_{name}": fn for name, fn in benchmarks.items()}
+
+
+GROUPS = [
+    _models,
+    _bcrypt,
+    _in_memory_repositories,
+    _code_store_repositories,
+    _database_repositories,
+    _sqlite_repositories,
+]
+
+
+def _time(fn: Callable, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - start
+
+
+def _peak_allocation(fn: Callable, runs: int) -> int:
+    """
+    Median of the memory peak reached by one call, above what was allocated before it.
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(runs):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return int(statistics.median(peaks))
+
+
+def _call_times(fn: Callable, min_time: float, min_calls: int) -> list[float]:
+    """
+    Duration of single calls, timer overhead included (tens of ns).
+    """
+    times = []
+    deadline = time.perf_counter() + min_time
+    while len(times) < min_calls or (
+        time.perf_counter() < deadline and len(times) < 100_000
+    ):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def measure(fn: Callable, min_time: float = 0.5, min_rounds: int = 5) -> dict:
+    """
+    Times rounds of `number` calls, `number` growing until a round lasts min_time / 20:
+    ops/s is over the rounds. Percentiles are over single calls, timed apart for another
+    min_time / 2 (the rounds are single calls already when `number` is 1).
+    """
+    number = 1
+    while (elapsed := _time(fn, number)) < min_time / 20 and number < 1 << 20:
+        number *= 2
+
+    samples = [elapsed / number]
+    while len(samples) < min_rounds or sum(samples) * number < min_time:
+        samples.append(_time(fn, number) / number)
+
+    calls = list(samples) if number == 1 else _call_times(fn, min_time / 2, min_rounds)
+    calls.sort()
+    p99 = calls[min(len(calls) - 1, int(len(calls) * 0.99))]
+    return {
+        "ops_per_s": round(len(samples) / sum(samples), 1),
+        "p50_us": round(statistics.median(calls) * 1e6, 3),
+        "p99_us": round(p99 * 1e6, 3),
+        "peak_alloc_bytes": _peak_allocation(fn, 1 if min(samples) > 0.01 else 50),
+        "rounds": len(samples),
+        "calls_per_round": number,
+        "timed_calls": len(calls),
+    }
+
+
+def run(pattern: str = "", min_time: float = 0.5) -> dict:
+    results = {}
+    for group in GROUPS:
+        try:
+            with group() as benchmarks:
+                for name, fn in benchmarks.items():
+                    if pattern in name:
+                        results[name] = measure(fn, min_time)
+                        print(f"{name:<32} {results[name]['ops_per_s']:>14,.1f} ops/s")
+        except SkipBenchmark as e:
+            print(f"{group.__name__.strip('_')}: skipped, {e}")
+
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Returns the benchmarks whose ops/s dropped more than `threshold` below the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<32} new")
+            continue
+        ratio = result["ops_per_s"] / baseline[name]["ops_per_s"]
+        regressed = ratio < 1 - threshold
+        print(
+            f"{name:<32} {ratio:>7.2f}x baseline{'  REGRESSION' if regressed else ''}"
+        )
+        if regressed:
+            regressions.append(name)
+
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks.micro")
+    parser.add_argument(
+        "-k", dest="pattern", default="", help="Run matching names only"
+    )
+    parser.add_argument(
+        "--min-time", type=float, default=0.5, help="Seconds per benchmark"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="Allowed ops/s drop (0.25 = 25%%)"
+    )
+    parser.add_argument("--output", type=Path, default=RESULTS)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="Store the results as baseline"
+    )
+    args = parser.parse_args(argv)
+
+    # bcrypt runs in this process, not on the hashing pool
+    hashing.hashing_service = hashing.HashingService(workers=0)
+    Password.hasher = hashing.hashing_service
+    results = run(args.pattern, args.min_time)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print("No baseline to compare with, run with --update-baseline")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())["results"]
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"Regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
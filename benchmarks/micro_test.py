@@ -0,0 +1,22 @@
+from benchmarks.micro import compare, measure
+
+
+def test_measure_reports_ops_and_percentiles():
+    result = measure(lambda: sum(range(100)), min_time=0.01)
+
+    assert result["ops_per_s"] > 0
+    assert result["p50_us"] <= result["p99_us"]
+    assert result["rounds"] >= 5
+    # Percentiles over single calls, not over the rounds
+    assert result["timed_calls"] > result["rounds"]
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = {"fast": {"ops_per_s": 100}, "slow": {"ops_per_s": 100}}
+    results = {
+        "fast": {"ops_per_s": 80},
+        "slow": {"ops_per_s": 70},
+        "new": {"ops_per_s": 1},
+    }
+
+    assert compare(results, baseline, threshold=0.25) == ["slow"]
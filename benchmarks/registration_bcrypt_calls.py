@@ -0,0 +1,56 @@
+"""
+Count bcrypt calls made by a single registration.
+
+Usage : `python3 -m benchmarks.registration_bcrypt_calls [registrations]`
+"""
+
+import sys
+import time
+
+import bcrypt
+from fastapi import BackgroundTasks
+
+from src.models import User
+from src.models.value_objects import Email, Password
+from src.repositories import InMemoryActivationCodeRepository, InMemoryUserRepository
+from src.services.mail import InMemoryMailAdapter
+from src.use_cases.register_user import RegisterUser
+
+
+def run(registrations: int = 5) -> dict:
+    calls = 0
+    real_hashpw = bcrypt.hashpw
+
+    def counting_hashpw(password: bytes, salt: bytes) -> bytes:
+        nonlocal calls
+        calls += 1
+        return real_hashpw(password, salt)
+
+    bcrypt.hashpw = counting_hashpw
+    try:
+        user_repository = InMemoryUserRepository(InMemoryActivationCodeRepository())
+        mail_adapter = InMemoryMailAdapter()
+        start = time.perf_counter()
+        for i in range(registrations):
+            background_tasks = BackgroundTasks()
+            user = User(Email(f"user{i}@test.com"), Password("Password@123"))
+            RegisterUser(user_repository, mail_adapter, background_tasks).execute(user)
+            # Mail task runs after the response, its snapshot is part of the cost
+            for task in background_tasks.tasks:
+                task.func(*task.args, **task.kwargs)
+        elapsed = time.perf_counter() - start
+    finally:
+        bcrypt.hashpw = real_hashpw
+
+    return {
+        "registrations": registrations,
+        "bcrypt_calls": calls,
+        "bcrypt_calls_per_registration": calls / registrations,
+        "ms_per_registration": elapsed * 1000 / registrations,
+    }
+
+
+if __name__ == "__main__":
+    registrations = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for key, value in run(registrations).items():
+        print(f"{key}: {value}")
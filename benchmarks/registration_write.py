@@ -0,0 +1,95 @@
+"""
+Round-trips and latency of persisting one registration, against a local Postgres (DB_URL).
+Compares the former two-statement write with DatabaseUserRepository.save_user.
+
+Usage : `python3 -m benchmarks.registration_write [registrations]`
+"""
+
+import statistics
+import sys
+import time
+import uuid
+
+import bcrypt
+from psycopg import Cursor
+
+from src.models import User
+from src.models.value_objects import Email, Password, UserId
+from src.repositories.activation_code import DatabaseActivationCodeRepository
+from src.repositories.user import DatabaseUserRepository
+from src.services import database, hashing
+
+
+class CountingCursor(Cursor):
+    executed = 0
+
+    def execute(self, *args, **kwargs):
+        CountingCursor.executed += 1
+        return super().execute(*args, **kwargs)
+
+
+def _two_statements_write(conn, user: User) -> None:
+    user_data = user.to_snapshot()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO users (email, password) VALUES (%s, %s) RETURNING id",
+            (user_data.get("email"), user_data.get("password")),
+        )
+        user.register(UserId(cursor.fetchone()[0]))
+    DatabaseActivationCodeRepository(conn).save_activation_code(user)
+
+
+def _repository_write(conn, user: User) -> None:
+    DatabaseUserRepository(conn, DatabaseActivationCodeRepository(conn)).save_user(user)
+
+
+def _run(name: str, write, registrations: int) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    users = [
+        User(Email(f"{run_id}-{i}@bench.com"), Password("Bench@123"))
+        for i in range(registrations)
+    ]
+    User.hash_passwords(users)
+
+    latencies = []
+    CountingCursor.executed = 0
+    for user in users:
+        with database.pool.connection() as conn:
+            conn.cursor_factory = CountingCursor
+            start = time.perf_counter()
+            write(conn, user)
+            latencies.append(time.perf_counter() - start)
+            conn.cursor_factory = Cursor
+
+    latencies.sort()
+    return {
+        "write": name,
+        "round_trips_per_registration": CountingCursor.executed / registrations,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+    }
+
+
+def run(registrations: int = 500) -> list[dict]:
+    # Hashing is not measured here, keep it cheap and inline
+    real_gensalt = bcrypt.gensalt
+    bcrypt.gensalt = lambda: real_gensalt(rounds=4)
+    hashing.hashing_service = hashing.HashingService(workers=0)
+    Password.hasher = hashing.hashing_service
+
+    database.open_pools(prewarm=False)
+    database.run_migrations()
+    try:
+        return [
+            _run("two statements", _two_statements_write, registrations),
+            _run("single CTE", _repository_write, registrations),
+        ]
+    finally:
+        database.close_pools()
+        bcrypt.gensalt = real_gensalt
+
+
+if __name__ == "__main__":
+    registrations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    for result in run(registrations):
+        print(result)
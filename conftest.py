@@ -1,6 +1,15 @@
+import os
+
 import bcrypt
+import psycopg
 import pytest
 
+from src.models.value_objects import Password
+from src.services import hashing
+from src.services.credential_cache import credential_cache
+from src.services.rate_limiter import rate_limiter
+from src.services.user_cache import user_cache
+
 
 @pytest.fixture(autouse=True)
 def fake_password_hashing(monkeypatch):
@@ -11,3 +20,41 @@ def fake_password_hashing(monkeypatch):
         return fake_hash
 
     monkeypatch.setattr(bcrypt, "hashpw", fake_hashpw)
+    # Inline hashing so the fake is used (process pool workers wouldn't see it)
+    service = hashing.HashingService(workers=0)
+    monkeypatch.setattr(hashing, "hashing_service", service)
+    monkeypatch.setattr(Password, "hasher", service)
+
+
+@pytest.fixture(autouse=True)
+def clear_credential_cache():
+    """Don't leak authenticated users across tests"""
+    credential_cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    """Users saved by a test are unknown to the next one"""
+    user_cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def clear_rate_limiter():
+    """Every test starts with full buckets"""
+    rate_limiter.clear()
+    yield
+
+
+@pytest.fixture
+def db_conn():
+    """Connection to DB_URL, tests using it are skipped without a database"""
+    if not os.getenv("DB_URL"):
+        pytest.skip("No database configured")
+    try:
+        conn = psycopg.connect(os.getenv("DB_URL"), connect_timeout=3)
+    except psycopg.OperationalError:
+        pytest.skip("No database available")
+    yield conn
+    conn.close()
@@ -1,10 +1,106 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import APIRouter, FastAPI
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+
+from src.models.value_objects import Password
+from src.services import database, metrics
+from src.services import profiler as profiling
+from src.services.code_store import CODE_STORE_ENABLED, code_store
+from src.services.email_filter import EMAIL_FILTER_ENABLED, email_filter
+from src.services.hashing import hashing_service
+from src.services.mail import MAIL_OUTBOX
+from src.services.mail_dispatcher import MAIL_DISPATCHER_ENABLED, mail_dispatcher
+from src.services.partitions import PARTITION_ROTATION_ENABLED, partition_rotator
+from src.services.sweeper import SWEEPER_ENABLED, sweeper
+from src.services.user_cache import (
+    USER_CACHE_ENABLED,
+    USER_CACHE_LISTEN,
+    user_cache_listener,
+)
+
+# Set MAIL_DISPATCHER_ENABLED=false when running `python3 -m src.cli dispatch-mail` instead
+# The outbox and LISTEN/NOTIFY need a single Postgres database
+SINGLE_POSTGRES = not database.SQLITE_MODE and not database.SHARDED_MODE
+DISPATCH_MAIL = MAIL_OUTBOX and MAIL_DISPATCHER_ENABLED and SINGLE_POSTGRES
+LISTEN_USER_CACHE = USER_CACHE_ENABLED and USER_CACHE_LISTEN and SINGLE_POSTGRES
+# On Postgres, expired activation codes go with their partition rather than row deletes
+SWEEP_CODES = SWEEPER_ENABLED and database.SQLITE_MODE
+ROTATE_PARTITIONS = PARTITION_ROTATION_ENABLED and not database.SQLITE_MODE
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if EMAIL_FILTER_ENABLED and not LISTEN_USER_CACHE:
+        # Saves of other workers only reach the filter through the cache notifications,
+        # their users would get 404s until the next refresh
+        raise RuntimeError("EMAIL_FILTER_ENABLED needs USER_CACHE_LISTEN on Postgres")
+    Password.hasher = hashing_service
+    # Blocking pool open and migrations run off the event loop
+    if database.SQLITE_MODE:
+        await asyncio.to_thread(database.sqlite_db.open)
+    else:
+        await asyncio.to_thread(database.open_pools)
+    if database.ASYNC_MODE:
+        await database.open_async_pool()
+    if database.MIGRATE_ON_STARTUP and not database.SQLITE_MODE:
+        await asyncio.to_thread(database.run_migrations)
+    if CODE_STORE_ENABLED:
+        # Codes pending before the restart, from the snapshot
+        await asyncio.to_thread(code_store.start)
+    if SWEEP_CODES:
+        sweeper.start()
+    if ROTATE_PARTITIONS:
+        partition_rotator.start()
+    if DISPATCH_MAIL:
+        mail_dispatcher.start()
+    if LISTEN_USER_CACHE:
+        user_cache_listener.start()
+    if EMAIL_FILTER_ENABLED:
+        # Loaded in background, every email may exist until then
+        email_filter.start()
+    if database.REPLICA_ENABLED:
+        database.replica_router.start()
+    yield
+    if database.REPLICA_ENABLED:
+        database.replica_router.stop()
+    if EMAIL_FILTER_ENABLED:
+        email_filter.stop()
+    if LISTEN_USER_CACHE:
+        user_cache_listener.stop()
+    if DISPATCH_MAIL:
+        mail_dispatcher.stop()
+    if ROTATE_PARTITIONS:
+        partition_rotator.stop()
+    if SWEEP_CODES:
+        sweeper.stop()
+    if CODE_STORE_ENABLED:
+        await asyncio.to_thread(code_store.stop)
+    if database.ASYNC_MODE:
+        await database.close_async_pool()
+    if database.SQLITE_MODE:
+        database.sqlite_db.close()
+    else:
+        database.close_pools()
+    # Spawned bcrypt workers would outlive a reload
+    await asyncio.to_thread(hashing_service.shutdown)
+
 
 app = FastAPI(
     title="User Registration API",
     openapi_url="/openapi.json",
+    lifespan=lifespan,
 )
+app.add_middleware(metrics.MetricsMiddleware)
+if profiling.PROFILING_ENABLED:
+    # Not even added otherwise, requests never go through it
+    app.add_middleware(
+        profiling.ProfilingMiddleware,
+        profiler=profiling.profiler,
+        # Their signed header is meant for the admin endpoint itself
+        skip_paths=("/api/admin/profile", "/api/admin/stats"),
+    )
 
 
 @app.get("/")
@@ -14,14 +110,30 @@ def hosted_page():
 
 api_router = APIRouter(prefix="/api")
 
-from src.routers import user_router
+from src.routers import admin_router, user_router
 
 api_router.include_router(user_router)
+api_router.include_router(admin_router)
 
 
 @api_router.get("/health")
 def health_check():
+    # Public, the internal stats are behind /api/admin/stats
     return JSONResponse({"status": "running"})
 
 
+@api_router.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(
+        metrics.registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@api_router.get("/ready")
+def readiness_check():
+    if not database.is_ready():
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return JSONResponse({"status": "ready"})
+
+
 app.include_router(api_router)
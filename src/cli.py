@@ -0,0 +1,416 @@
+"""
+Command line entry point : `python3 -m src.cli <command> --help`
+"""
+
+import argparse
+import json
+import os
+import time
+from collections.abc import Iterator
+from datetime import timedelta
+
+from src.models import User
+from src.models.exceptions import ValidationError
+from src.models.value_objects import Email, Password
+
+
+def _read_lines(path: str, offset: int) -> Iterator[tuple[int, bytes]]:
+    """
+    Streams the file from `offset`, yielding each line with the offset right after it.
+    """
+    with open(path, "rb") as file:
+        file.seek(offset)
+        while line := file.readline():
+            yield file.tell(), line
+
+
+def _read_chunks(
+    path: str, offset: int, chunk_size: int
+) -> Iterator[tuple[int, list[bytes]]]:
+    chunk = []
+    for end_offset, line in _read_lines(path, offset):
+        if line.strip():
+            chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield end_offset, chunk
+            chunk = []
+    if chunk:
+        yield end_offset, chunk
+
+
+def _parse_users(lines: list[bytes]) -> tuple[list[User], int]:
+    users = []
+    seen = set()
+    invalid = 0
+    for line in lines:
+        try:
+            entry = json.loads(line)
+            user = User(Email(str(entry["email"])), Password(str(entry["password"])))
+        except (ValueError, KeyError, TypeError, ValidationError):
+            invalid += 1
+            continue
+        email = user.to_public_snapshot().get("email")
+        if email not in seen:
+            seen.add(email)
+            users.append(user)
+
+    return users, invalid
+
+
+def _read_checkpoint(path: str | None) -> int:
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as file:
+        return int(file.read().strip() or 0)
+
+
+def _write_checkpoint(path: str | None, offset: int) -> None:
+    if not path:
+        return
+    # Atomic replace, a crash never leaves a truncated checkpoint
+    with open(f"{path}.tmp", "w") as file:
+        file.write(str(offset))
+    os.replace(f"{path}.tmp", path)
+
+
+def import_users(args: argparse.Namespace) -> None:
+    from src.repositories.activation_code import (
+        DatabaseActivationCodeRepository,
+        SQLiteActivationCodeRepository,
+    )
+    from src.repositories.user import (
+        DatabaseUserRepository,
+        ShardedUserRepository,
+        SQLiteUserRepository,
+    )
+    from src.services.code_store import CODE_STORE_ENABLED
+    from src.services.database import (
+        SHARDED_MODE,
+        SQLITE_MODE,
+        open_pools,
+        pool,
+        sharded_db,
+        sqlite_db,
+    )
+    from src.services.mail import get_email_adapter
+
+    if CODE_STORE_ENABLED:
+        # The codes would go to the table, never read by the app's in-memory store
+        raise SystemExit(
+            "import-users writes activation codes to the database, "
+            "unset ACTIVATION_CODE_STORE=memory"
+        )
+    if SQLITE_MODE:
+        sqlite_db.open()
+    else:
+        open_pools(prewarm=False)
+
+    mail_adapter = get_email_adapter() if args.send_mail else None
+    offset = (
+        args.offset if args.offset is not None else _read_checkpoint(args.checkpoint)
+    )
+    totals = {"created": 0, "duplicate": 0, "invalid": 0}
+    rows = 0
+    start = time.perf_counter()
+    print(f"Importing {args.file} from byte {offset}", flush=True)
+
+    for end_offset, lines in _read_chunks(args.file, offset, args.chunk_size):
+        chunk_start = time.perf_counter()
+        users, invalid = _parse_users(lines)
+        if SQLITE_MODE:
+            # No COPY, batch inserts in one transaction per chunk
+            created = SQLiteUserRepository(
+                sqlite_db, SQLiteActivationCodeRepository(sqlite_db)
+            ).save_users(users)
+        elif SHARDED_MODE:
+            # One transaction per node, a chunk is committed once all of them are
+            created = ShardedUserRepository(sharded_db).save_users(users)
+        else:
+            with pool.connection() as conn:
+                user_repository = DatabaseUserRepository(
+                    conn, DatabaseActivationCodeRepository(conn)
+                )
+                created = user_repository.copy_users(users)
+        _write_checkpoint(args.checkpoint, end_offset)
+
+        if mail_adapter:
+            for user in created:
+                mail_adapter.send_activation_code(user)
+
+        totals["created"] += len(created)
+        totals["duplicate"] += len(lines) - invalid - len(created)
+        totals["invalid"] += invalid
+        rows += len(lines)
+        chunk_elapsed = time.perf_counter() - chunk_start
+        print(
+            f"offset={end_offset} rows={rows} "
+            f"chunk={len(lines) / chunk_elapsed:.0f} rows/s "
+            f"overall={rows / (time.perf_counter() - start):.0f} rows/s",
+            flush=True,
+        )
+
+    print(
+        f"Done: {rows} rows in {time.perf_counter() - start:.1f}s "
+        f"(created={totals['created']} duplicate={totals['duplicate']} "
+        f"invalid={totals['invalid']})",
+        flush=True,
+    )
+
+
+def sweep_codes(args: argparse.Namespace) -> None:
+    from src.services.database import SQLITE_MODE, open_pools, sqlite_db
+    from src.services.partitions import partition_rotator
+    from src.services.sweeper import ActivationCodeSweeper
+
+    if not SQLITE_MODE:
+        # Row deletes would bloat the partitions and wait on the rotator's locks
+        open_pools(prewarm=False)
+        print("Postgres drops expired codes with their partition, rotating", flush=True)
+        print(
+            f"Activation code partitions: {partition_rotator.rotate_once()}", flush=True
+        )
+        return
+    sqlite_db.open()
+
+    sweeper = ActivationCodeSweeper(
+        batch_size=args.batch_size, batch_delay=args.batch_delay
+    )
+    print(f"Expired activation codes: {sweeper.sweep_once()}", flush=True)
+
+
+def rotate_partitions(args: argparse.Namespace) -> None:
+    from src.services.database import open_pools
+    from src.services.partitions import PartitionRotator
+
+    open_pools(prewarm=False)
+
+    rotator = PartitionRotator(ahead=args.ahead)
+    print(f"Activation code partitions: {rotator.rotate_once()}", flush=True)
+
+
+def dispatch_mail(args: argparse.Namespace) -> None:
+    from src.services.database import open_pools
+    from src.services.mail_dispatcher import mail_dispatcher
+
+    open_pools(prewarm=False)
+
+    if args.once:
+        print(f"Mail outbox: {mail_dispatcher.dispatch_all()}", flush=True)
+        return
+
+    print("Dispatching mail outbox, Ctrl+C to stop", flush=True)
+    mail_dispatcher.start()
+    try:
+        while True:
+            time.sleep(60)
+            print(f"Mail dispatcher: {mail_dispatcher.stats()}", flush=True)
+    except KeyboardInterrupt:
+        mail_dispatcher.stop()
+
+
+def purge_outbox(args: argparse.Namespace) -> None:
+    from src.services.database import open_pools
+    from src.services.mail_dispatcher import mail_dispatcher
+
+    open_pools(prewarm=False)
+
+    retention = timedelta(hours=args.retention_hours) if args.retention_hours else None
+    purged = mail_dispatcher.purge_parked(retention)
+    print(f"Parked mails purged: {purged}", flush=True)
+
+
+def profile_token(args: argparse.Namespace) -> None:
+    from src.services.profiler import PROFILING_HEADER, profiler, sign
+
+    if not profiler.secret:
+        raise SystemExit("PROFILING_SECRET is not set")
+    expires = int(time.time() + args.ttl)
+    signature = sign(profiler.secret, args.method, args.path, expires)
+    print(f"{PROFILING_HEADER}: {signature}")
+
+
+def migrate(args: argparse.Namespace) -> None:
+    from src.services.database import SQLITE_MODE, open_pools, run_migrations, sqlite_db
+
+    if SQLITE_MODE:
+        # Migrations run when the database is opened
+        sqlite_db.open()
+        sqlite_db.close()
+        print("Schema up to date", flush=True)
+        return
+    open_pools(prewarm=False)
+    applied = run_migrations()
+    print(f"Schema up to date ({len(applied)} migration(s) applied)", flush=True)
+
+
+def shard_map(args: argparse.Namespace) -> None:
+    from src.services.sharding import ShardMap
+
+    nodes = dict(node.split("=", 1) for node in args.nodes)
+    if args.current:
+        current = ShardMap.load(args.current)
+        new_map = current.rebalance(nodes)
+        for (source, destination), buckets in current.moves(new_map).items():
+            print(f"{len(buckets)} bucket(s) from {source} to {destination}")
+    else:
+        new_map = ShardMap.even(nodes)
+    with open(args.output, "w") as file:
+        json.dump(new_map.to_config(), file, indent=2)
+    print(f"Shard map written to {args.output}", flush=True)
+
+
+def reshard(args: argparse.Namespace) -> None:
+    import psycopg
+
+    from src.services import migrations
+    from src.services.database import DB_SHARD_MAP
+    from src.services.sharding import ShardMap, move_buckets
+
+    if not DB_SHARD_MAP:
+        raise SystemExit("DB_SHARD_MAP is not set")
+    current, target = ShardMap.load(DB_SHARD_MAP), ShardMap.load(args.new_map)
+    for node, conninfo in target.nodes.items():
+        if current.nodes.get(node, conninfo) != conninfo:
+            raise SystemExit(f"Node {node} has another address in {args.new_map}")
+    moves = current.moves(target)
+    for (source, destination), buckets in moves.items():
+        print(f"{len(buckets)} bucket(s) from {source} to {destination}", flush=True)
+    if args.dry_run or not moves:
+        return
+
+    connections = {
+        node: psycopg.connect(conninfo, autocommit=True)
+        for node, conninfo in {**current.nodes, **target.nodes}.items()
+    }
+    try:
+        for node in target.nodes:
+            migrations.migrate(connections[node])
+        for (source, destination), buckets in moves.items():
+            start = time.perf_counter()
+            moved = 0
+            for i in range(0, len(buckets), args.batch_buckets):
+                moved += move_buckets(
+                    connections[source],
+                    connections[destination],
+                    buckets[i : i + args.batch_buckets],
+                )
+            print(
+                f"{source} -> {destination}: {moved} user(s) "
+                f"in {time.perf_counter() - start:.1f}s",
+                flush=True,
+            )
+    finally:
+        for conn in connections.values():
+            conn.close()
+    print(f"Done: set DB_SHARD_MAP={args.new_map} before restarting", flush=True)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python3 -m src.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser(
+        "import-users", help='Import a JSONL file of {"email", "password"} objects'
+    )
+    import_parser.add_argument("file")
+    import_parser.add_argument("--chunk-size", type=int, default=1000)
+    import_parser.add_argument(
+        "--offset", type=int, help="Byte offset to start from (overrides checkpoint)"
+    )
+    import_parser.add_argument(
+        "--checkpoint", help="File storing the offset of the last committed chunk"
+    )
+    import_parser.add_argument("--send-mail", action="store_true")
+    import_parser.set_defaults(handler=import_users)
+
+    sweep_parser = commands.add_parser(
+        "sweep-codes",
+        help="Delete expired activation codes once (rotates partitions on Postgres)",
+    )
+    sweep_parser.add_argument("--batch-size", type=int, default=500)
+    sweep_parser.add_argument(
+        "--batch-delay", type=float, default=0.1, help="Pause between batches (s)"
+    )
+    sweep_parser.set_defaults(handler=sweep_codes)
+
+    rotate_parser = commands.add_parser(
+        "rotate-partitions",
+        help="Create the next activation code partitions and drop expired ones",
+    )
+    rotate_parser.add_argument(
+        "--ahead", type=int, default=3, help="Hourly partitions created in advance"
+    )
+    rotate_parser.set_defaults(handler=rotate_partitions)
+
+    dispatch_parser = commands.add_parser(
+        "dispatch-mail", help="Send the mails queued in the outbox"
+    )
+    dispatch_parser.add_argument(
+        "--once", action="store_true", help="Exit once the outbox is drained"
+    )
+    dispatch_parser.set_defaults(handler=dispatch_mail)
+
+    purge_parser = commands.add_parser(
+        "purge-outbox", help="Delete the outbox mails parked past their retention"
+    )
+    purge_parser.add_argument(
+        "--retention-hours",
+        type=float,
+        help="Parked mails kept (default MAIL_OUTBOX_PARKED_RETENTION_HOURS, 168)",
+    )
+    purge_parser.set_defaults(handler=purge_outbox)
+
+    token_parser = commands.add_parser(
+        "profile-token",
+        help="Print a single use X-Profile header, signed for one method and path",
+    )
+    token_parser.add_argument("method", help="e.g. POST")
+    token_parser.add_argument("path", help="e.g. /api/admin/profile")
+    token_parser.add_argument(
+        "--ttl", type=int, default=300, help="Validity in seconds"
+    )
+    token_parser.set_defaults(handler=profile_token)
+
+    migrate_parser = commands.add_parser(
+        "migrate", help="Apply pending schema migrations"
+    )
+    migrate_parser.set_defaults(handler=migrate)
+
+    shard_map_parser = commands.add_parser(
+        "shard-map", help="Write a shard map spreading the buckets over nodes"
+    )
+    shard_map_parser.add_argument(
+        "nodes", nargs="+", metavar="NAME=CONNINFO", help="Nodes of the new map"
+    )
+    shard_map_parser.add_argument(
+        "--current", help="Map to rebalance, moving as few buckets as possible"
+    )
+    shard_map_parser.add_argument("--output", required=True)
+    shard_map_parser.set_defaults(handler=shard_map)
+
+    reshard_parser = commands.add_parser(
+        "reshard",
+        help="Move users from the DB_SHARD_MAP nodes to those of a new map (app stopped)",
+    )
+    reshard_parser.add_argument("new_map")
+    reshard_parser.add_argument(
+        "--batch-buckets", type=int, default=16, help="Buckets moved per transaction"
+    )
+    reshard_parser.add_argument(
+        "--dry-run", action="store_true", help="Only print the buckets to move"
+    )
+    reshard_parser.set_defaults(handler=reshard)
+
+    args = parser.parse_args(argv)
+    from src.services.hashing import hashing_service
+
+    # Hashes the passwords of imported users
+    Password.hasher = hashing_service
+    try:
+        args.handler(args)
+    finally:
+        hashing_service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import json
+
+import pytest
+
+from src.cli import _parse_users, _read_chunks, import_users, sweep_codes
+from src.services import code_store, database, partitions
+
+
+def test_read_chunks_resumes_from_offset(tmp_path):
+    path = tmp_path / "users.jsonl"
+    path.write_text("".join(f'{{"email": "user{i}@test.com"}}\n' for i in range(5)))
+
+    chunks = list(_read_chunks(str(path), 0, 2))
+    assert [len(lines) for _, lines in chunks] == [2, 2, 1]
+
+    resumed = list(_read_chunks(str(path), chunks[0][0], 2))
+    assert resumed == chunks[1:]
+
+
+def test_parse_users_skips_invalid_and_repeated_entries():
+    lines = [
+        json.dumps({"email": "user@test.com", "password": "Password@123"}).encode(),
+        json.dumps({"email": "USER@test.com", "password": "Password@123"}).encode(),
+        json.dumps({"email": "user.com", "password": "Password@123"}).encode(),
+        b"not json",
+    ]
+
+    users, invalid = _parse_users(lines)
+    assert len(users) == 1
+    assert invalid == 2
+
+
+def test_import_users_refuses_the_memory_code_store(monkeypatch, tmp_path):
+    monkeypatch.setattr(code_store, "CODE_STORE_ENABLED", True)
+
+    with pytest.raises(SystemExit, match="ACTIVATION_CODE_STORE"):
+        import_users(argparse.Namespace(file=str(tmp_path / "users.jsonl")))
+
+
+def test_import_users_goes_through_the_sqlite_backend(monkeypatch, tmp_path):
+    db = database.SQLiteDatabase(str(tmp_path / "users.sqlite3"))
+    monkeypatch.setattr(database, "SQLITE_MODE", True)
+    monkeypatch.setattr(database, "sqlite_db", db)
+    path = tmp_path / "users.jsonl"
+    path.write_text(
+        "".join(
+            json.dumps({"email": email, "password": "Password@123"}) + "\n"
+            for email in ("one@test.com", "two@test.com", "one@test.com")
+        )
+    )
+
+    import_users(
+        argparse.Namespace(
+            file=str(path),
+            chunk_size=2,
+            offset=None,
+            checkpoint=str(tmp_path / "checkpoint"),
+            send_mail=False,
+        )
+    )
+    try:
+        users = db.reader().execute("SELECT email FROM users ORDER BY id")
+        assert [email for email, in users] == ["one@test.com", "two@test.com"]
+        codes = db.reader().execute("SELECT count(*) FROM activation_code")
+        assert codes.fetchone()[0] == 2
+    finally:
+        db.close()
+
+
+def test_sweep_codes_rotates_partitions_on_postgres(monkeypatch, capsys):
+    class Rotator:
+        def rotate_once(self):
+            return {"created": [], "dropped": ["activation_code_p2001010110"]}
+
+    monkeypatch.setattr(database, "SQLITE_MODE", False)
+    monkeypatch.setattr(database, "open_pools", lambda prewarm: None)
+    monkeypatch.setattr(partitions, "partition_rotator", Rotator())
+
+    sweep_codes(argparse.Namespace(batch_size=500, batch_delay=0))
+    assert "activation_code_p2001010110" in capsys.readouterr().out
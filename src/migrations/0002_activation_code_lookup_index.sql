@@ -0,0 +1,3 @@
+-- has_valid_code filters on all three columns, user_id first also serves the FK cascade
+CREATE INDEX IF NOT EXISTS activation_code_lookup_idx
+    ON activation_code (user_id, code, created_at);
@@ -0,0 +1,11 @@
+-- Mails to send, written in the same transaction as the data they are about
+CREATE TABLE IF NOT EXISTS outbox (
+    id              BIGSERIAL       PRIMARY KEY,
+    kind            VARCHAR(64)     NOT NULL,
+    payload         JSONB           NOT NULL,
+    attempts        INTEGER         NOT NULL DEFAULT 0,
+    last_error      TEXT,
+    available_at    TIMESTAMPTZ     NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at      TIMESTAMPTZ     NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS outbox_available_idx ON outbox (available_at, id);
@@ -0,0 +1,34 @@
+-- Codes are dead a minute after their insert: the table is range partitioned by hour on
+-- created_at, and services/partitions.py drops whole partitions instead of deleting rows
+-- (no dead tuples left for vacuum). Rows without a partition land in the default one,
+-- emptied by each rotation.
+CREATE TABLE activation_code_partitioned (
+    id          BIGINT          NOT NULL DEFAULT nextval('activation_code_id_seq'),
+    user_id     BIGINT          NOT NULL,
+    code        VARCHAR(4)      NOT NULL,
+    created_at  TIMESTAMPTZ     NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- The partition key has to be part of the primary key
+    CONSTRAINT activation_code_partitioned_pkey PRIMARY KEY (id, created_at),
+    CONSTRAINT fk_user_partitioned
+        FOREIGN KEY (user_id)
+        REFERENCES users(id)
+        ON DELETE CASCADE
+) PARTITION BY RANGE (created_at);
+CREATE TABLE activation_code_default PARTITION OF activation_code_partitioned DEFAULT;
+CREATE INDEX activation_code_default_lookup_idx
+    ON activation_code_default (user_id, code, created_at);
+
+-- Older codes are expired anyway
+INSERT INTO activation_code_partitioned (id, user_id, code, created_at)
+SELECT id, user_id, code, created_at FROM activation_code
+WHERE created_at >= CURRENT_TIMESTAMP - interval '1 hour';
+
+-- Ids keep going on, dropping the old table would drop its sequence
+ALTER SEQUENCE activation_code_id_seq OWNED BY activation_code_partitioned.id;
+DROP TABLE activation_code;
+ALTER TABLE activation_code_partitioned RENAME TO activation_code;
+ALTER TABLE activation_code
+    RENAME CONSTRAINT activation_code_partitioned_pkey TO activation_code_pkey;
+ALTER TABLE activation_code RENAME CONSTRAINT fk_user_partitioned TO fk_user;
+-- Attaches the default partition's index, each partition gets its own
+CREATE INDEX activation_code_lookup_idx ON activation_code (user_id, code, created_at);
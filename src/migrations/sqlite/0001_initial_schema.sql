@@ -0,0 +1,16 @@
+CREATE TABLE IF NOT EXISTS users (
+    id          INTEGER     PRIMARY KEY,
+    email       TEXT        NOT NULL UNIQUE,
+    password    TEXT        NOT NULL,
+    activated   INTEGER     NOT NULL DEFAULT 0,
+    created_at  TEXT        NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+-- created_at is a unix timestamp, compared numerically against the code TTL
+CREATE TABLE IF NOT EXISTS activation_code (
+    id          INTEGER     PRIMARY KEY,
+    user_id     INTEGER     NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    code        TEXT        NOT NULL,
+    created_at  REAL        NOT NULL
+);
+CREATE INDEX IF NOT EXISTS activation_code_lookup_idx
+    ON activation_code (user_id, code, created_at);
@@ -0,0 +1,17 @@
+class Snapshot(dict):
+    """
+    Read-only dict, so a cached snapshot can be shared between callers.
+    Still a dict for DB drivers and JSON, `dict(snapshot)` gives a mutable copy.
+    """
+
+    __slots__ = ()
+
+    def __readonly(self, *args, **kwargs):
+        raise TypeError("Snapshots are read-only, copy them with dict(snapshot)")
+
+    def __reduce__(self):
+        # copy and pickle would rebuild it item by item
+        return (Snapshot, (dict(self),))
+
+    __setitem__ = __delitem__ = __ior__ = __readonly
+    clear = pop = popitem = setdefault = update = __readonly
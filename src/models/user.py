@@ -1,11 +1,24 @@
+from .snapshot import Snapshot
 from .value_objects import ActivationCode, Email, Password, UserId
 
 
 class User:
+    __slots__ = (
+        "__id",
+        "__email",
+        "__password",
+        "__activation_code",
+        "__public_snapshot",
+        "__snapshot",
+    )
+
     __id: UserId | None
     __email: Email
     __password: Password
     __activation_code: ActivationCode
+    # Built once, reset when the id changes
+    __public_snapshot: Snapshot | None
+    __snapshot: Snapshot | None
 
     def __init__(
         self,
@@ -17,16 +30,48 @@ class User:
         self.__email = email
         self.__password = password
         self.__activation_code = ActivationCode()
+        self.__public_snapshot = None
+        self.__snapshot = None
 
     def register(self, id: UserId) -> "User":
         self.__id = id
+        self.__public_snapshot = None
+        self.__snapshot = None
 
         return self
 
-    def to_snapshot(self) -> dict:
-        return {
-            "id": self.__id.to_snapshot() if self.__id else None,
-            "email": self.__email.to_snapshot(),
-            "password": self.__password.to_snapshot(),
-            "activation_code": self.__activation_code.to_snapshot(),
-        }
+    @staticmethod
+    def hash_passwords(users: list["User"]) -> None:
+        Password.hash_all([user.__password for user in users])
+
+    @staticmethod
+    async def hash_passwords_async(users: list["User"]) -> None:
+        await Password.hash_all_async([user.__password for user in users])
+
+    def to_snapshot(self) -> Snapshot:
+        """
+        Read-only, the same snapshot is returned until `register` (the hash is memoized).
+        """
+        if self.__snapshot is None:
+            self.__snapshot = Snapshot(
+                self.to_public_snapshot(), password=self.__password.to_snapshot()
+            )
+        return self.__snapshot
+
+    async def to_snapshot_async(self) -> Snapshot:
+        if self.__snapshot is None:
+            password = await self.__password.to_snapshot_async()
+            self.__snapshot = Snapshot(self.to_public_snapshot(), password=password)
+        return self.__snapshot
+
+    def to_public_snapshot(self) -> Snapshot:
+        """
+        Snapshot without the password, for consumers that never need the hash.
+        """
+        if self.__public_snapshot is None:
+            self.__public_snapshot = Snapshot(
+                id=self.__id.to_snapshot() if self.__id else None,
+                email=self.__email.to_snapshot(),
+                activation_code=self.__activation_code.to_snapshot(),
+            )
+        return self.__public_snapshot
@@ -0,0 +1,72 @@
+import copy
+import re
+
+import pytest
+
+from src.models import User
+from src.models.exceptions import ValidationError
+from src.models.value_objects import Email, Password, UserId
+
+
+def test_snapshots_are_cached_read_only_and_reset_on_register():
+    user = User(Email("User@Test.com"), Password("Password@123"))
+    snapshot = user.to_snapshot()
+
+    assert user.to_snapshot() is snapshot
+    assert snapshot["email"] == "user@test.com" and snapshot["id"] is None
+    with pytest.raises(TypeError):
+        snapshot["id"] = 1
+    assert copy.copy(snapshot) == snapshot
+
+    user.register(UserId(1))
+    assert user.to_snapshot()["id"] == 1
+    assert user.to_public_snapshot()["id"] == 1
+
+
+def test_value_objects_have_no_instance_dict():
+    user = User(Email("user@test.com"), Password("Password@123"))
+
+    for instance in (user, Email("user@test.com"), Password("Password@123")):
+        assert not hasattr(instance, "__dict__")
+
+
+@pytest.mark.parametrize("email", ["", "a@b", "user.test.com", "user@test", "a@@b.c"])
+def test_invalid_emails(email):
+    with pytest.raises(ValidationError):
+        Email(email)
+
+
+@pytest.mark.parametrize(
+    "password",
+    ["Pass@1", "Password@123456789012", "Pässword@123", "password@123", "Password123"],
+)
+def test_invalid_passwords(password):
+    with pytest.raises(ValidationError):
+        Password(password)
+
+
+# The bare patterns the value objects validated with before their fast paths
+EMAIL_PATTERN = r"[^@]+@[^@]+\.[^@]+"
+PASSWORD_PATTERN = r"^(?=.*[A-Z])(?=.*[a-z])(?=.*\d)(?=.*[!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>\/?`~])[A-Za-z\d!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>\/?`~]{8,20}$"
+
+
+@pytest.mark.parametrize(
+    "value_object, pattern, value",
+    [
+        (Email, EMAIL_PATTERN, "a@b.c"),
+        (Email, EMAIL_PATTERN, f"{'a' * 250}@test.com"),
+        (Email, EMAIL_PATTERN, "user@test.com\n"),
+        (Email, EMAIL_PATTERN, "a@b."),
+        (Password, PASSWORD_PATTERN, "Password@123"),
+        (Password, PASSWORD_PATTERN, "Password@\u0661\u0662\u0663"),
+        (Password, PASSWORD_PATTERN, "Password@12345678901\n"),
+        (Password, PASSWORD_PATTERN, "Password@123456789012"),
+        (Password, PASSWORD_PATTERN, "Pässword@123"),
+    ],
+)
+def test_fast_paths_accept_what_the_pattern_accepts(value_object, pattern, value):
+    if re.match(pattern, value.lower() if value_object is Email else value):
+        value_object(value)
+    else:
+        with pytest.raises(ValidationError):
+            value_object(value)
@@ -2,6 +2,8 @@ import random
 
 
 class ActivationCode:
+    __slots__ = ("__value",)
+
     __value: str
 
     def __init__(self):
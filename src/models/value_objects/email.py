@@ -2,17 +2,29 @@ import re
 
 from src.models.exceptions import ValidationError
 
+# Compiled once, not looked up in the re module cache on each call
+_VALIDATION_PATTERN = re.compile(r"[^@]+@[^@]+\.[^@]+")
+# Shortest address the pattern matches, "a@b.c"
+_MIN_LENGTH = 5
+
 
 class Email:
+    __slots__ = ("__value",)
+
     __value: str
-    __validation_pattern = r"[^@]+@[^@]+\.[^@]+"
 
     def __init__(self, email: str):
         self.__value = email.lower()
         self.__validate()
 
     def __validate(self):
-        if not re.match(self.__validation_pattern, self.__value):
+        value = self.__value
+        # Cheap checks first, only for inputs the regex would reject anyway
+        if (
+            len(value) < _MIN_LENGTH
+            or "@" not in value
+            or not _VALIDATION_PATTERN.match(value)
+        ):
             raise ValidationError(
                 infos={"prop": "email", "reason": "invalid mail syntax"}
             )
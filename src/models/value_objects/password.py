@@ -1,32 +1,98 @@
 import re
-
-import bcrypt
+from typing import ClassVar, Protocol
 
 from src.models.exceptions import ValidationError
 
+# Compiled once, not looked up in the re module cache on each call
+_VALIDATION_PATTERN = re.compile(
+    r"^(?=.*[A-Z])(?=.*[a-z])(?=.*\d)(?=.*[!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>\/?`~])[A-Za-z\d!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>\/?`~]{8,20}$"
+)
+_MIN_LENGTH, _MAX_LENGTH = 8, 20
+_INVALID_PASSWORD = {
+    "prop": "password",
+    "reason": (
+        "Password must be 8-20 characters long and contain at least:\n"
+        "• one uppercase letter (A-Z)\n"
+        "• one lowercase letter (a-z)\n"
+        "• one number (0-9)\n"
+        "• one special character: ! @ # $ % ^ & * ( ) _ + - = [ ] { } ; : ' \" , . < > / ? ` ~"
+    ),
+}
+
+
+class PasswordHasher(Protocol):
+    def hash_password(self, password: str) -> str: ...
+
+    async def hash_password_async(self, password: str) -> str: ...
+
+    def hash_passwords(self, passwords: list[str]) -> list[str]: ...
+
+    async def hash_passwords_async(self, passwords: list[str]) -> list[str]: ...
+
 
 class Password:
+    __slots__ = ("__value", "__hash")
+
+    # Set where the app starts (main.py lifespan, src.cli), models don't depend on it
+    hasher: ClassVar[PasswordHasher | None] = None
+
     __value: str
-    __validation_pattern = r"^(?=.*[A-Z])(?=.*[a-z])(?=.*\d)(?=.*[!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>\/?`~])[A-Za-z\d!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>\/?`~]{8,20}$"
+    __hash: str | None
 
     def __init__(self, password: str):
         self.__value = password
+        self.__hash = None
         self.__validate()
 
     def __validate(self):
-        if not re.match(self.__validation_pattern, self.__value):
-            raise ValidationError(
-                infos={
-                    "prop": "password",
-                    "reason": (
-                        "Password must be 8-20 characters long and contain at least:\n"
-                        "• one uppercase letter (A-Z)\n"
-                        "• one lowercase letter (a-z)\n"
-                        "• one number (0-9)\n"
-                        "• one special character: ! @ # $ % ^ & * ( ) _ + - = [ ] { } ; : ' \" , . < > / ? ` ~"
-                    ),
-                }
-            )
+        value = self.__value
+        # The length rules out inputs the regex would reject anyway, before running it.
+        # The "$" also matches before a trailing newline, hence the + 1. No ASCII check:
+        # "\d" matches any Unicode digit.
+        if not _MIN_LENGTH <= len(
+            value
+        ) <= _MAX_LENGTH + 1 or not _VALIDATION_PATTERN.match(value):
+            raise ValidationError(infos=dict(_INVALID_PASSWORD))
 
     def to_snapshot(self) -> str:
-        return bcrypt.hashpw(self.__value.encode(), bcrypt.gensalt()).decode()
+        """
+        Hash is computed on first call only, later snapshots reuse the same digest.
+        """
+        if self.__hash is None:
+            self.__hash = Password._hasher().hash_password(self.__value)
+        return self.__hash
+
+    async def to_snapshot_async(self) -> str:
+        """
+        Same as `to_snapshot` without blocking the event loop on bcrypt.
+        """
+        if self.__hash is None:
+            self.__hash = await Password._hasher().hash_password_async(self.__value)
+        return self.__hash
+
+    @staticmethod
+    def _hasher() -> PasswordHasher:
+        if Password.hasher is None:
+            raise RuntimeError("No password hasher configured, see Password.hasher")
+        return Password.hasher
+
+    @staticmethod
+    def hash_all(passwords: list["Password"]) -> None:
+        """
+        Hashes every password not hashed yet in one parallel batch.
+        """
+        pending = [password for password in passwords if password.__hash is None]
+        hashes = Password._hasher().hash_passwords(
+            [password.__value for password in pending]
+        )
+        for password, hashed in zip(pending, hashes):
+            password.__hash = hashed
+
+    @staticmethod
+    async def hash_all_async(passwords: list["Password"]) -> None:
+        pending = [password for password in passwords if password.__hash is None]
+        hashes = await Password._hasher().hash_passwords_async(
+            [password.__value for password in pending]
+        )
+        for password, hashed in zip(pending, hashes):
+            password.__hash = hashed
@@ -1,8 +1,10 @@
 class UserId:
+    __slots__ = ("__value",)
+
     __value: int
 
     def __init__(self, id: int):
         self.__value = id
 
-    def to_snapshot(self) -> dict:
+    def to_snapshot(self) -> int:
         return self.__value
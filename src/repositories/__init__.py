@@ -1,6 +1,18 @@
 from .activation_code import (
     ActivationCodeRepository,
+    AsyncActivationCodeRepository,
+    AsyncInMemoryActivationCodeRepository,
     InMemoryActivationCodeRepository,
     get_activation_code_repository,
+    get_async_activation_code_repository,
+)
+from .user import (
+    AsyncInMemoryUserRepository,
+    AsyncUserRepository,
+    InMemoryUserRepository,
+    UserRepository,
+    get_async_user_lookup,
+    get_async_user_repository,
+    get_user_lookup,
+    get_user_repository,
 )
-from .user import InMemoryUserRepository, UserRepository, get_user_repository
@@ -1,24 +1,134 @@
+import time
 from abc import ABC, abstractmethod
+from collections.abc import Callable
 from datetime import datetime, timedelta, timezone
+from functools import partial
 
 from fastapi import Depends
-from psycopg import Connection
+from psycopg import AsyncConnection, Connection
 
 from src.models import User
-from src.services.database import get_db
+from src.services.code_store import CODE_STORE_ENABLED, CodeStore, code_store
+from src.services.database import (
+    SHARDED_MODE,
+    SQLITE_MODE,
+    get_async_db,
+    get_db,
+    sharded_db,
+    sqlite_db,
+)
+from src.services.sharding import BUCKETS, ShardedDatabase, id_bucket
+from src.services.sqlite import SQLiteDatabase
 
 from .exceptions import CodeExpired, InvalidActivationCode
 
+CODE_TTL = timedelta(minutes=1)
+
+# Latest matching code, deleted when still valid. One row: (valid, consumed)
+_CONSUME_CODE = """
+WITH matched AS (
+    SELECT id, created_at, created_at >= %(valid_after)s AS valid
+    FROM activation_code
+    WHERE user_id = %(user_id)s AND code = %(code)s AND created_at < %(valid_before)s
+    ORDER BY created_at DESC
+    LIMIT 1
+), consumed AS (
+    -- The whole primary key: only the code's partition is searched
+    DELETE FROM activation_code
+    WHERE (id, created_at) IN (SELECT id, created_at FROM matched WHERE valid)
+    RETURNING user_id
+)
+"""
+
+# Shard-aware ids, in the bucket of their user: unique across nodes and moved with it
+_INSERT_SHARDED_CODES = """
+INSERT INTO activation_code (id, user_id, code)
+SELECT nextval('activation_code_id_seq') * %(buckets)s + mod(user_id, %(buckets)s), user_id, code
+FROM unnest(%(user_ids)s::bigint[], %(codes)s::varchar[]) AS codes (user_id, code)
+"""
+
+
+def _insert_sharded_codes(conn: Connection, users: list[User]) -> None:
+    if not users:
+        return
+    users_data = [user.to_public_snapshot() for user in users]
+    conn.execute(
+        _INSERT_SHARDED_CODES,
+        {
+            "buckets": BUCKETS,
+            "user_ids": [data.get("id") for data in users_data],
+            "codes": [data.get("activation_code") for data in users_data],
+        },
+    )
+
+
+def _validity_window() -> dict:
+    now = datetime.now(timezone.utc)
+    # Upper bound for partition pruning, a TTL ahead for clock skew with the database
+    return {"valid_after": now - CODE_TTL, "valid_before": now + CODE_TTL}
+
+
+def _check_consumed_code(row: tuple | None) -> None:
+    # A valid code consumed meanwhile by a concurrent request is a replay
+    if not row or (row[0] and not row[1]):
+        raise InvalidActivationCode()
+    if not row[0]:
+        raise CodeExpired()
+
 
 class ActivationCodeRepository(ABC):
+    # True when codes are rows of the users' database: user repositories then write and
+    # consume them in their own statements
+    in_user_database: bool = False
+
     @abstractmethod
     def save_activation_code(self, user: User) -> User:
         pass
 
+    @abstractmethod
+    def save_activation_codes(self, users: list[User]) -> None:
+        pass
+
     @abstractmethod
     def has_valid_code(self, user_id: int, code: str) -> None:
         pass
 
+    @abstractmethod
+    def consume_code(self, user_id: int, code: str) -> Callable[[], None] | None:
+        """
+        Validates then deletes the code, so it can't be used twice. Returns what puts it
+        back when the deletion is out of the request transaction, for its rollback.
+        """
+        pass
+
+    @abstractmethod
+    def delete_expired_codes(self, after_id: int, limit: int) -> list[int]:
+        """
+        Deletes up to `limit` expired codes with an id above `after_id` (keyset pagination).
+        Returns deleted ids.
+        """
+        pass
+
+
+class AsyncActivationCodeRepository(ABC):
+    in_user_database: bool = False
+
+    @abstractmethod
+    async def save_activation_code(self, user: User) -> User:
+        pass
+
+    @abstractmethod
+    async def save_activation_codes(self, users: list[User]) -> None:
+        pass
+
+    @abstractmethod
+    async def has_valid_code(self, user_id: int, code: str) -> None:
+        pass
+
+    @abstractmethod
+    async def consume_code(self, user_id: int, code: str) -> Callable[[], None] | None:
+        pass
+
 
 class InMemoryActivationCodeRepository(ActivationCodeRepository):
     activation_codes: dict
@@ -27,21 +137,41 @@ class InMemoryActivationCodeRepository(ActivationCodeRepository):
         self.activation_codes = {}
 
     def save_activation_code(self, user: User) -> None:
-        user_data = user.to_snapshot()
+        user_data = user.to_public_snapshot()
         self.activation_codes[user_data.get("id")] = {
             "activation_code": user_data.get("activation_code"),
             "created_at": datetime.now(timezone.utc),
         }
 
+    def save_activation_codes(self, users: list[User]) -> None:
+        for user in users:
+            self.save_activation_code(user)
+
     def has_valid_code(self, user_id: int, code: str) -> None:
         data = self.activation_codes.get(user_id)
-        one_minute_ago = datetime.now(timezone.utc) - timedelta(minutes=1)
+        one_minute_ago = datetime.now(timezone.utc) - CODE_TTL
 
         if not data or data["activation_code"] != code:
             raise InvalidActivationCode()
         if data["created_at"] < one_minute_ago:
             raise CodeExpired()
 
+    def consume_code(self, user_id: int, code: str) -> None:
+        self.has_valid_code(user_id, code)
+        del self.activation_codes[user_id]
+
+    def delete_expired_codes(self, after_id: int, limit: int) -> list[int]:
+        expired_before = datetime.now(timezone.utc) - CODE_TTL
+        deleted = sorted(
+            user_id
+            for user_id, data in self.activation_codes.items()
+            if user_id > after_id and data["created_at"] < expired_before
+        )[:limit]
+        for user_id in deleted:
+            del self.activation_codes[user_id]
+
+        return deleted
+
     def expire_code(self, user_id: int) -> None:
         self.activation_codes[user_id]["created_at"] = datetime.now(
             timezone.utc
@@ -54,15 +184,35 @@ class InMemoryActivationCodeRepository(ActivationCodeRepository):
         }
 
 
+class AsyncInMemoryActivationCodeRepository(AsyncActivationCodeRepository):
+    repository: ActivationCodeRepository
+
+    def __init__(self, repository: ActivationCodeRepository):
+        self.repository = repository
+
+    async def save_activation_code(self, user: User) -> None:
+        self.repository.save_activation_code(user)
+
+    async def save_activation_codes(self, users: list[User]) -> None:
+        self.repository.save_activation_codes(users)
+
+    async def has_valid_code(self, user_id: int, code: str) -> None:
+        self.repository.has_valid_code(user_id, code)
+
+    async def consume_code(self, user_id: int, code: str) -> Callable[[], None] | None:
+        return self.repository.consume_code(user_id, code)
+
+
 class DatabaseActivationCodeRepository(ActivationCodeRepository):
     __conn: Connection
+    in_user_database = True
 
     def __init__(self, conn: Connection):
         self.__conn = conn
 
     def save_activation_code(self, user: User) -> None:
         with self.__conn.cursor() as cursor:
-            user_data = user.to_snapshot()
+            user_data = user.to_public_snapshot()
             cursor.execute(
                 """
 INSERT INTO activation_code (user_id, code)
@@ -73,25 +223,370 @@ RETURNING id
             )
             return cursor.fetchone()[0]
 
-    def has_valid_code(self, user_id: int, code: str) -> None:
-        one_minute_ago = datetime.now(timezone.utc) - timedelta(minutes=1)
+    def save_activation_codes(self, users: list[User]) -> None:
+        if not users:
+            return
+        user_data = [user.to_public_snapshot() for user in users]
+        with self.__conn.cursor() as cursor:
+            cursor.execute(
+                """
+INSERT INTO activation_code (user_id, code)
+SELECT * FROM unnest(%s::bigint[], %s::varchar[])
+""",
+                (
+                    [data.get("id") for data in user_data],
+                    [data.get("activation_code") for data in user_data],
+                ),
+            )
 
+    def has_valid_code(self, user_id: int, code: str) -> None:
         with self.__conn.cursor() as cursor:
             cursor.execute(
                 """
 SELECT 1 from activation_code
-WHERE activation_code.user_id = %s
-    AND activation_code.code = %s
-    AND created_at >= %s
+WHERE activation_code.user_id = %(user_id)s
+    AND activation_code.code = %(code)s
+    AND created_at >= %(valid_after)s
+    AND created_at < %(valid_before)s
 LIMIT 1
 """,
-                (user_id, code, one_minute_ago),
+                {"user_id": user_id, "code": code, **_validity_window()},
             )
             if not cursor.fetchone():
                 raise InvalidActivationCode()
 
+    def consume_code(self, user_id: int, code: str) -> None:
+        with self.__conn.cursor() as cursor:
+            cursor.execute(
+                _CONSUME_CODE
+                + "SELECT valid, EXISTS (SELECT 1 FROM consumed) FROM matched",
+                {"user_id": user_id, "code": code, **_validity_window()},
+            )
+            _check_consumed_code(cursor.fetchone())
 
-def get_activation_code_repository(
+    def delete_expired_codes(self, after_id: int, limit: int) -> list[int]:
+        with self.__conn.cursor() as cursor:
+            cursor.execute(
+                """
+WITH batch AS (
+    SELECT id FROM activation_code
+    WHERE id > %s AND created_at < %s
+    ORDER BY id
+    LIMIT %s
+)
+DELETE FROM activation_code
+USING batch
+WHERE activation_code.id = batch.id
+RETURNING activation_code.id
+""",
+                (after_id, datetime.now(timezone.utc) - CODE_TTL, limit),
+            )
+            return sorted(row[0] for row in cursor.fetchall())
+
+
+class AsyncDatabaseActivationCodeRepository(AsyncActivationCodeRepository):
+    __conn: AsyncConnection
+    in_user_database = True
+
+    def __init__(self, conn: AsyncConnection):
+        self.__conn = conn
+
+    async def save_activation_code(self, user: User) -> None:
+        async with self.__conn.cursor() as cursor:
+            user_data = user.to_public_snapshot()
+            await cursor.execute(
+                """
+INSERT INTO activation_code (user_id, code)
+VALUES (%s, %s)
+RETURNING id
+""",
+                (user_data.get("id"), user_data.get("activation_code")),
+            )
+            return (await cursor.fetchone())[0]
+
+    async def save_activation_codes(self, users: list[User]) -> None:
+        if not users:
+            return
+        user_data = [user.to_public_snapshot() for user in users]
+        async with self.__conn.cursor() as cursor:
+            await cursor.execute(
+                """
+INSERT INTO activation_code (user_id, code)
+SELECT * FROM unnest(%s::bigint[], %s::varchar[])
+""",
+                (
+                    [data.get("id") for data in user_data],
+                    [data.get("activation_code") for data in user_data],
+                ),
+            )
+
+    async def has_valid_code(self, user_id: int, code: str) -> None:
+        async with self.__conn.cursor() as cursor:
+            await cursor.execute(
+                """
+SELECT 1 from activation_code
+WHERE activation_code.user_id = %(user_id)s
+    AND activation_code.code = %(code)s
+    AND created_at >= %(valid_after)s
+    AND created_at < %(valid_before)s
+LIMIT 1
+""",
+                {"user_id": user_id, "code": code, **_validity_window()},
+            )
+            if not await cursor.fetchone():
+                raise InvalidActivationCode()
+
+    async def consume_code(self, user_id: int, code: str) -> None:
+        async with self.__conn.cursor() as cursor:
+            await cursor.execute(
+                _CONSUME_CODE
+                + "SELECT valid, EXISTS (SELECT 1 FROM consumed) FROM matched",
+                {"user_id": user_id, "code": code, **_validity_window()},
+            )
+            _check_consumed_code(await cursor.fetchone())
+
+
+class SQLiteActivationCodeRepository(ActivationCodeRepository):
+    __db: SQLiteDatabase
+
+    def __init__(self, db: SQLiteDatabase):
+        self.__db = db
+
+    def save_activation_code(self, user: User) -> None:
+        self.save_activation_codes([user])
+
+    def save_activation_codes(self, users: list[User]) -> None:
+        if not users:
+            return
+        now = time.time()
+        with self.__db.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO activation_code (user_id, code, created_at) VALUES (?, ?, ?)",
+                [
+                    (data.get("id"), data.get("activation_code"), now)
+                    for data in (user.to_public_snapshot() for user in users)
+                ],
+            )
+
+    def has_valid_code(self, user_id: int, code: str) -> None:
+        row = (
+            self.__db.reader()
+            .execute(
+                """
+SELECT 1 FROM activation_code
+WHERE user_id = ? AND code = ? AND created_at >= ?
+LIMIT 1
+""",
+                (user_id, code, time.time() - CODE_TTL.total_seconds()),
+            )
+            .fetchone()
+        )
+        if not row:
+            raise InvalidActivationCode()
+
+    def consume_code(self, user_id: int, code: str) -> None:
+        # Writes are serialized, nothing can consume the code between select and delete
+        with self.__db.transaction() as conn:
+            row = conn.execute(
+                """
+SELECT id, created_at >= ? FROM activation_code
+WHERE user_id = ? AND code = ?
+ORDER BY created_at DESC
+LIMIT 1
+""",
+                (time.time() - CODE_TTL.total_seconds(), user_id, code),
+            ).fetchone()
+            _check_consumed_code(row and (row[1], True))
+            conn.execute("DELETE FROM activation_code WHERE id = ?", (row[0],))
+
+    def delete_expired_codes(self, after_id: int, limit: int) -> list[int]:
+        with self.__db.transaction() as conn:
+            rows = conn.execute(
+                """
+DELETE FROM activation_code
+WHERE id IN (
+    SELECT id FROM activation_code
+    WHERE id > ? AND created_at < ?
+    ORDER BY id
+    LIMIT ?
+)
+RETURNING id
+""",
+                (after_id, time.time() - CODE_TTL.total_seconds(), limit),
+            ).fetchall()
+            return sorted(row[0] for row in rows)
+
+
+class ShardedActivationCodeRepository(ActivationCodeRepository):
+    """
+    Codes live on the node of their user, found from the user id.
+    """
+
+    __db: ShardedDatabase
+
+    def __init__(self, db: ShardedDatabase):
+        self.__db = db
+
+    def save_activation_code(self, user: User) -> None:
+        self.save_activation_codes([user])
+
+    def save_activation_codes(self, users: list[User]) -> None:
+        by_node = {}
+        for user in users:
+            node = self.__db.shard_map.node_for_id(user.to_public_snapshot().get("id"))
+            by_node.setdefault(node, []).append(user)
+        for node, node_users in by_node.items():
+            with self.__db.connection(node) as conn:
+                _insert_sharded_codes(conn, node_users)
+
+    def has_valid_code(self, user_id: int, code: str) -> None:
+        with self.__db.connection_for_id(user_id) as conn:
+            DatabaseActivationCodeRepository(conn).has_valid_code(user_id, code)
+
+    def consume_code(self, user_id: int, code: str) -> None:
+        with self.__db.connection_for_id(user_id) as conn:
+            DatabaseActivationCodeRepository(conn).consume_code(user_id, code)
+
+    def delete_expired_codes(self, after_id: int, limit: int) -> list[int]:
+        # Ids are unique across nodes but interleaved: the batch is the `limit` lowest
+        # expired ids of all nodes, so the next one starts after it on every node.
+        expired_before = datetime.now(timezone.utc) - CODE_TTL
+        candidates = []
+        for node in self.__db.pools:
+            with self.__db.connection(node) as conn:
+                candidates += [
+                    row[0]
+                    for row in conn.execute(
+                        """
+SELECT id FROM activation_code
+WHERE id > %s AND created_at < %s
+ORDER BY id
+LIMIT %s
+""",
+                        (after_id, expired_before, limit),
+                    )
+                ]
+
+        by_node = {}
+        for id in sorted(candidates)[:limit]:
+            by_node.setdefault(
+                self.__db.shard_map.node_for_bucket(id_bucket(id)), []
+            ).append(id)
+        deleted = []
+        for node, ids in by_node.items():
+            with self.__db.connection(node) as conn:
+                deleted += [
+                    row[0]
+                    for row in conn.execute(
+                        """
+DELETE FROM activation_code
+WHERE id = ANY(%s) AND created_at < %s
+RETURNING id
+""",
+                        (ids, expired_before),
+                    )
+                ]
+        return sorted(deleted)
+
+
+class CodeStoreActivationCodeRepository(ActivationCodeRepository):
+    """
+    Codes in a CodeStore of this process, without database round trip. They are neither
+    shared with other processes nor kept past a restart without its snapshot.
+    """
+
+    __store: CodeStore
+
+    def __init__(self, store: CodeStore):
+        self.__store = store
+
+    def save_activation_code(self, user: User) -> None:
+        user_data = user.to_public_snapshot()
+        self.__store.put(
+            user_data.get("id"), user_data.get("activation_code"), CODE_TTL
+        )
+
+    def save_activation_codes(self, users: list[User]) -> None:
+        for user in users:
+            self.save_activation_code(user)
+
+    def has_valid_code(self, user_id: int, code: str) -> None:
+        entry = self.__store.get(user_id)
+        if not entry or entry[0] != code:
+            raise InvalidActivationCode()
+        if not entry[1]:
+            raise CodeExpired()
+
+    def consume_code(self, user_id: int, code: str) -> Callable[[], None]:
+        expires_at = self.__store.consume(user_id, code)
+        if expires_at is None:
+            raise InvalidActivationCode()
+        if not expires_at:
+            raise CodeExpired()
+        return partial(self.__store.restore, user_id, code, expires_at)
+
+    def delete_expired_codes(self, after_id: int, limit: int) -> list[int]:
+        # Dropped by the store when they expire, nothing left to sweep
+        return []
+
+
+def _database_activation_code_repository(
     conn: Connection = Depends(get_db),
 ) -> DatabaseActivationCodeRepository:
     return DatabaseActivationCodeRepository(conn)
+
+
+def _sqlite_activation_code_repository() -> SQLiteActivationCodeRepository:
+    return SQLiteActivationCodeRepository(sqlite_db)
+
+
+def _sharded_activation_code_repository() -> ShardedActivationCodeRepository:
+    return ShardedActivationCodeRepository(sharded_db)
+
+
+def _code_store_activation_code_repository() -> CodeStoreActivationCodeRepository:
+    return CodeStoreActivationCodeRepository(code_store)
+
+
+# Chosen once from ACTIVATION_CODE_STORE and DB_BACKEND, routes keep depending on (and
+# tests overriding) the getter
+def get_activation_code_repository(
+    repository: ActivationCodeRepository = Depends(
+        _code_store_activation_code_repository
+        if CODE_STORE_ENABLED
+        else (
+            _sqlite_activation_code_repository
+            if SQLITE_MODE
+            else (
+                _sharded_activation_code_repository
+                if SHARDED_MODE
+                else _database_activation_code_repository
+            )
+        )
+    ),
+) -> ActivationCodeRepository:
+    return repository
+
+
+def _async_database_activation_code_repository(
+    conn: AsyncConnection = Depends(get_async_db),
+) -> AsyncDatabaseActivationCodeRepository:
+    return AsyncDatabaseActivationCodeRepository(conn)
+
+
+def _async_code_store_activation_code_repository() -> (
+    AsyncInMemoryActivationCodeRepository
+):
+    return AsyncInMemoryActivationCodeRepository(
+        CodeStoreActivationCodeRepository(code_store)
+    )
+
+
+def get_async_activation_code_repository(
+    repository: AsyncActivationCodeRepository = Depends(
+        _async_code_store_activation_code_repository
+        if CODE_STORE_ENABLED
+        else _async_database_activation_code_repository
+    ),
+) -> AsyncActivationCodeRepository:
+    return repository
@@ -0,0 +1,220 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+from psycopg import AsyncConnection, Connection
+from psycopg.rows import dict_row
+
+ACTIVATION_CODE_MAIL = "activation_code"
+
+# How long claimed messages are hidden from other dispatchers while being sent
+CLAIM_LEASE = timedelta(seconds=30)
+
+# Activation mails for users just inserted, params: (user emails, codes)
+_ENQUEUE_ACTIVATION_MAILS = """
+INSERT INTO outbox (kind, payload)
+SELECT 'activation_code', jsonb_build_object('email', email, 'activation_code', code)
+FROM unnest(%s::text[], %s::text[]) AS mail(email, code)
+"""
+
+
+class OutboxRepository(ABC):
+    @abstractmethod
+    def claim_batch(self, limit: int, lease: timedelta = CLAIM_LEASE) -> list[dict]:
+        """
+        Postpones up to `limit` due messages by `lease` and returns them: other dispatchers
+        skip them while they're sent, no lock is held meanwhile. Messages neither deleted
+        nor rescheduled within the lease (e.g. after a crash) are due again.
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, ids: list[int]) -> None:
+        pass
+
+    @abstractmethod
+    def reschedule(self, id: int, delay: timedelta | None, error: str) -> None:
+        """
+        Records a failed attempt, `delay=None` parks the message for good.
+        """
+        pass
+
+    @abstractmethod
+    def backlog(self) -> int:
+        pass
+
+    @abstractmethod
+    def parked(self) -> int:
+        pass
+
+    @abstractmethod
+    def purge_parked(self, created_before: datetime) -> int:
+        """
+        Deletes the parked messages created before `created_before`, returns their count.
+        """
+        pass
+
+
+class InMemoryOutboxRepository(OutboxRepository):
+    messages: dict
+    __last_id: int
+
+    def __init__(self):
+        self.messages = {}
+        self.__last_id = 0
+
+    def enqueue(self, kind: str, payload: dict) -> None:
+        self.__last_id += 1
+        self.messages[self.__last_id] = {
+            "id": self.__last_id,
+            "kind": kind,
+            "payload": payload,
+            "attempts": 0,
+            "last_error": None,
+            "available_at": datetime.now(timezone.utc),
+            "created_at": datetime.now(timezone.utc),
+        }
+
+    def claim_batch(self, limit: int, lease: timedelta = CLAIM_LEASE) -> list[dict]:
+        now = datetime.now(timezone.utc)
+        due = [
+            message
+            for message in self.messages.values()
+            if message["available_at"] and message["available_at"] <= now
+        ][:limit]
+        claimed = [dict(message) for message in due]
+        for message in due:
+            message["available_at"] = now + lease
+        return claimed
+
+    def delete(self, ids: list[int]) -> None:
+        for id in ids:
+            self.messages.pop(id, None)
+
+    def reschedule(self, id: int, delay: timedelta | None, error: str) -> None:
+        message = self.messages[id]
+        message["attempts"] += 1
+        message["last_error"] = error
+        message["available_at"] = (
+            datetime.now(timezone.utc) + delay if delay is not None else None
+        )
+
+    def backlog(self) -> int:
+        return sum(1 for message in self.messages.values() if message["available_at"])
+
+    def parked(self) -> int:
+        return len(self.messages) - self.backlog()
+
+    def purge_parked(self, created_before: datetime) -> int:
+        purged = [
+            id
+            for id, message in self.messages.items()
+            if not message["available_at"] and message["created_at"] < created_before
+        ]
+        self.delete(purged)
+        return len(purged)
+
+
+class DatabaseOutboxRepository(OutboxRepository):
+    __conn: Connection
+
+    def __init__(self, conn: Connection):
+        self.__conn = conn
+
+    def enqueue_activation_mails(self, users_data: list[dict]) -> None:
+        if not users_data:
+            return
+        with self.__conn.cursor() as cursor:
+            cursor.execute(
+                _ENQUEUE_ACTIVATION_MAILS,
+                (
+                    [data.get("email") for data in users_data],
+                    [data.get("activation_code") for data in users_data],
+                ),
+            )
+
+    def claim_batch(self, limit: int, lease: timedelta = CLAIM_LEASE) -> list[dict]:
+        with self.__conn.cursor(row_factory=dict_row) as cursor:
+            cursor.execute(
+                """
+UPDATE outbox
+SET available_at = now() + %s::interval
+WHERE id IN (
+    SELECT id
+    FROM outbox
+    WHERE available_at <= now()
+    ORDER BY available_at, id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id, kind, payload, attempts, created_at
+""",
+                (lease, limit),
+            )
+            return sorted(cursor.fetchall(), key=lambda message: message["id"])
+
+    def delete(self, ids: list[int]) -> None:
+        if not ids:
+            return
+        with self.__conn.cursor() as cursor:
+            cursor.execute("DELETE FROM outbox WHERE id = ANY(%s)", (ids,))
+
+    def reschedule(self, id: int, delay: timedelta | None, error: str) -> None:
+        with self.__conn.cursor() as cursor:
+            cursor.execute(
+                """
+UPDATE outbox
+SET attempts = attempts + 1,
+    last_error = %s,
+    available_at = COALESCE(now() + %s::interval, 'infinity')
+WHERE id = %s
+""",
+                (error, delay, id),
+            )
+
+    def backlog(self) -> int:
+        with self.__conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM outbox WHERE available_at < 'infinity'"
+            )
+            return cursor.fetchone()[0]
+
+    def parked(self) -> int:
+        with self.__conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM outbox WHERE available_at = 'infinity'"
+            )
+            return cursor.fetchone()[0]
+
+    def purge_parked(self, created_before: datetime) -> int:
+        with self.__conn.cursor() as cursor:
+            cursor.execute(
+                """
+DELETE FROM outbox
+WHERE available_at = 'infinity' AND created_at < %s
+""",
+                (created_before,),
+            )
+            return cursor.rowcount
+
+
+class AsyncDatabaseOutboxRepository:
+    """
+    Enqueues activation mails from the async API, the dispatcher drains them in sync.
+    """
+
+    __conn: AsyncConnection
+
+    def __init__(self, conn: AsyncConnection):
+        self.__conn = conn
+
+    async def enqueue_activation_mails(self, users_data: list[dict]) -> None:
+        if not users_data:
+            return
+        async with self.__conn.cursor() as cursor:
+            await cursor.execute(
+                _ENQUEUE_ACTIVATION_MAILS,
+                (
+                    [data.get("email") for data in users_data],
+                    [data.get("activation_code") for data in users_data],
+                ),
+            )
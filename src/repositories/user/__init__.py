@@ -0,0 +1,13 @@
+from .base import AsyncUserRepository, UserRepository
+from .cached import AsyncCachedUserRepository, CachedUserRepository
+from .dependencies import (
+    get_async_user_lookup,
+    get_async_user_repository,
+    get_user_lookup,
+    get_user_repository,
+)
+from .memory import AsyncInMemoryUserRepository, InMemoryUserRepository
+from .postgres import DatabaseUserRepository
+from .postgres_async import AsyncDatabaseUserRepository
+from .sharded import ShardedUserRepository
+from .sqlite import SQLiteUserRepository
@@ -0,0 +1,59 @@
+from abc import ABC, abstractmethod
+
+from src.models import User
+
+
+class UserRepository(ABC):
+    # True when save_user(s) also writes activation mails to the outbox
+    outbox_enabled: bool = False
+
+    @abstractmethod
+    def save_user(self, user: User) -> User:
+        pass
+
+    @abstractmethod
+    def save_users(self, users: list[User]) -> list[User]:
+        """
+        Persists users in one transaction, returns the created ones (others are duplicates).
+        """
+        pass
+
+    @abstractmethod
+    def select_by_email(self, email: str) -> dict:
+        pass
+
+    @abstractmethod
+    def update_activated(self, user_id: int) -> None:
+        pass
+
+    @abstractmethod
+    def activate_with_code(self, user_id: int, code: str) -> None:
+        """
+        Consumes a valid activation code and activates its user atomically.
+        Raises InvalidActivationCode or CodeExpired.
+        """
+        pass
+
+
+class AsyncUserRepository(ABC):
+    outbox_enabled: bool = False
+
+    @abstractmethod
+    async def save_user(self, user: User) -> User:
+        pass
+
+    @abstractmethod
+    async def save_users(self, users: list[User]) -> list[User]:
+        pass
+
+    @abstractmethod
+    async def select_by_email(self, email: str) -> dict:
+        pass
+
+    @abstractmethod
+    async def update_activated(self, user_id: int) -> None:
+        pass
+
+    @abstractmethod
+    async def activate_with_code(self, user_id: int, code: str) -> None:
+        pass
@@ -0,0 +1,199 @@
+from collections.abc import Awaitable, Callable
+from functools import partial
+
+from src.models import User
+from src.services.user_cache import (
+    NOT_CACHED,
+    UserCache,
+    email_changed,
+    user_changed,
+)
+
+from ..exceptions import DuplicateEmailError, UserNotFound
+from .base import AsyncUserRepository, UserRepository
+
+
+def _invalidate_emails(cache: UserCache, emails: list[str]) -> None:
+    for email in emails:
+        cache.invalidate_email(email)
+
+
+class _CacheHandling:
+    """
+    Cache side of both cached repositories, which only add the (awaited) calls to the
+    wrapped repository and to `publish`. Writes drop the entries they change once
+    committed (through `after_commit`, right away without it) and return the payloads to
+    publish.
+    """
+
+    __cache: UserCache
+    __after_commit: Callable[[Callable[[], None]], None] | None
+
+    def __init__(
+        self,
+        cache: UserCache,
+        after_commit: Callable[[Callable[[], None]], None] | None,
+    ):
+        self.__cache = cache
+        self.__after_commit = after_commit
+
+    def get(self, email: str) -> dict | object:
+        """
+        NOT_CACHED or the cached user, raises UserNotFound for an email cached as unknown.
+        """
+        user = self.__cache.get(email)
+        if user is None:
+            raise UserNotFound()
+        return user
+
+    def found(self, email: str, user: dict) -> None:
+        self.__cache.set(email, user)
+
+    def not_found(self, email: str) -> None:
+        self.__cache.set(email, None)
+
+    def duplicate(self, user: User) -> None:
+        # Committed by another request, the email may be cached as unknown
+        self.__cache.invalidate_email(user.to_public_snapshot().get("email"))
+
+    def saved(self, users: list[User], created: list[User]) -> list[str]:
+        # Duplicates too, at the same time, their emails may be cached as unknown
+        emails = [user.to_public_snapshot().get("email") for user in users]
+        self.__invalidate(partial(_invalidate_emails, self.__cache, emails))
+        return [
+            email_changed(user.to_public_snapshot().get("email")) for user in created
+        ]
+
+    def activated(self, user_id: int) -> list[str]:
+        self.__invalidate(partial(self.__cache.invalidate_user, user_id))
+        return [user_changed(user_id)]
+
+    def __invalidate(self, invalidation: Callable[[], None]) -> None:
+        # Before the commit, a concurrent read could cache the old row again
+        if self.__after_commit:
+            self.__after_commit(invalidation)
+        else:
+            invalidation()
+
+
+class CachedUserRepository(UserRepository):
+    """
+    Read-through `select_by_email` cache in front of another repository. Writes `publish`
+    the entries they change for the other workers (see UserCacheListener).
+    """
+
+    __repository: UserRepository
+    __cache: _CacheHandling
+    __publish: Callable[[str], None] | None
+
+    def __init__(
+        self,
+        repository: UserRepository,
+        cache: UserCache,
+        publish: Callable[[str], None] | None = None,
+        after_commit: Callable[[Callable[[], None]], None] | None = None,
+    ):
+        self.__repository = repository
+        self.__cache = _CacheHandling(cache, after_commit)
+        self.__publish = publish
+        self.outbox_enabled = repository.outbox_enabled
+
+    def save_user(self, user: User) -> User:
+        try:
+            saved = self.__repository.save_user(user)
+        except DuplicateEmailError:
+            self.__cache.duplicate(user)
+            raise
+        self.__changed(self.__cache.saved([user], [user]))
+
+        return saved
+
+    def save_users(self, users: list[User]) -> list[User]:
+        created = self.__repository.save_users(users)
+        self.__changed(self.__cache.saved(users, created))
+
+        return created
+
+    def select_by_email(self, email: str) -> dict:
+        user = self.__cache.get(email)
+        if user is NOT_CACHED:
+            try:
+                user = self.__repository.select_by_email(email)
+            except UserNotFound:
+                self.__cache.not_found(email)
+                raise
+            self.__cache.found(email, user)
+
+        return user
+
+    def update_activated(self, user_id: int) -> None:
+        self.__repository.update_activated(user_id)
+        self.__changed(self.__cache.activated(user_id))
+
+    def activate_with_code(self, user_id: int, code: str) -> None:
+        self.__repository.activate_with_code(user_id, code)
+        self.__changed(self.__cache.activated(user_id))
+
+    def __changed(self, payloads: list[str]) -> None:
+        if self.__publish:
+            for payload in payloads:
+                self.__publish(payload)
+
+
+class AsyncCachedUserRepository(AsyncUserRepository):
+    __repository: AsyncUserRepository
+    __cache: _CacheHandling
+    __publish: Callable[[str], Awaitable[None]] | None
+
+    def __init__(
+        self,
+        repository: AsyncUserRepository,
+        cache: UserCache,
+        publish: Callable[[str], Awaitable[None]] | None = None,
+        after_commit: Callable[[Callable[[], None]], None] | None = None,
+    ):
+        self.__repository = repository
+        self.__cache = _CacheHandling(cache, after_commit)
+        self.__publish = publish
+        self.outbox_enabled = repository.outbox_enabled
+
+    async def save_user(self, user: User) -> User:
+        try:
+            saved = await self.__repository.save_user(user)
+        except DuplicateEmailError:
+            self.__cache.duplicate(user)
+            raise
+        await self.__changed(self.__cache.saved([user], [user]))
+
+        return saved
+
+    async def save_users(self, users: list[User]) -> list[User]:
+        created = await self.__repository.save_users(users)
+        await self.__changed(self.__cache.saved(users, created))
+
+        return created
+
+    async def select_by_email(self, email: str) -> dict:
+        user = self.__cache.get(email)
+        if user is NOT_CACHED:
+            try:
+                user = await self.__repository.select_by_email(email)
+            except UserNotFound:
+                self.__cache.not_found(email)
+                raise
+            self.__cache.found(email, user)
+
+        return user
+
+    async def update_activated(self, user_id: int) -> None:
+        await self.__repository.update_activated(user_id)
+        await self.__changed(self.__cache.activated(user_id))
+
+    async def activate_with_code(self, user_id: int, code: str) -> None:
+        await self.__repository.activate_with_code(user_id, code)
+        await self.__changed(self.__cache.activated(user_id))
+
+    async def __changed(self, payloads: list[str]) -> None:
+        if self.__publish:
+            for payload in payloads:
+                await self.__publish(payload)
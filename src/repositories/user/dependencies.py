@@ -0,0 +1,167 @@
+from collections.abc import Awaitable, Callable
+from functools import partial
+
+from fastapi import Depends
+from psycopg import AsyncConnection, Connection
+
+from src.services.database import (
+    REPLICA_ENABLED,
+    SHARDED_MODE,
+    SQLITE_MODE,
+    after_commit,
+    async_pool,
+    get_async_db,
+    get_db,
+    pool,
+    replica_router,
+    sharded_db,
+    sqlite_db,
+)
+from src.services.mail import MAIL_OUTBOX
+from src.services.user_cache import (
+    USER_CACHE_CHANNEL,
+    USER_CACHE_ENABLED,
+    USER_CACHE_LISTEN,
+    user_cache,
+)
+
+from ..activation_code import (
+    ActivationCodeRepository,
+    AsyncActivationCodeRepository,
+    AsyncDatabaseActivationCodeRepository,
+    DatabaseActivationCodeRepository,
+    SQLiteActivationCodeRepository,
+    get_activation_code_repository,
+    get_async_activation_code_repository,
+)
+from .base import AsyncUserRepository, UserRepository
+from .cached import AsyncCachedUserRepository, CachedUserRepository
+from .postgres import DatabaseUserRepository
+from .postgres_async import AsyncDatabaseUserRepository
+from .queries import _NOTIFY_USER_CACHE
+from .sharded import ShardedUserRepository
+from .sqlite import SQLiteUserRepository
+
+
+def _cached(
+    repository: UserRepository, conn: Connection | None = None
+) -> UserRepository:
+    if not USER_CACHE_ENABLED:
+        return repository
+
+    def publish(payload: str) -> None:
+        conn.execute(_NOTIFY_USER_CACHE, (USER_CACHE_CHANNEL, payload))
+
+    listened = conn is not None and USER_CACHE_LISTEN
+    return CachedUserRepository(
+        repository,
+        user_cache,
+        publish if listened else None,
+        partial(after_commit, conn) if conn is not None else None,
+    )
+
+
+def _cached_async(
+    repository: AsyncUserRepository, conn: AsyncConnection
+) -> AsyncUserRepository:
+    if not USER_CACHE_ENABLED:
+        return repository
+
+    async def publish(payload: str) -> None:
+        await conn.execute(_NOTIFY_USER_CACHE, (USER_CACHE_CHANNEL, payload))
+
+    return AsyncCachedUserRepository(
+        repository,
+        user_cache,
+        publish if USER_CACHE_LISTEN else None,
+        partial(after_commit, conn),
+    )
+
+
+def _database_user_repository(
+    conn: Connection = Depends(get_db),
+    activation_code_repository: ActivationCodeRepository = Depends(
+        get_activation_code_repository
+    ),
+) -> UserRepository:
+    return _cached(
+        DatabaseUserRepository(
+            conn,
+            activation_code_repository,
+            outbox=MAIL_OUTBOX,
+            router=replica_router if REPLICA_ENABLED else None,
+        ),
+        conn,
+    )
+
+
+def _sqlite_user_repository(
+    activation_code_repository: ActivationCodeRepository = Depends(
+        get_activation_code_repository
+    ),
+) -> UserRepository:
+    return _cached(SQLiteUserRepository(sqlite_db, activation_code_repository))
+
+
+def _sharded_user_repository() -> UserRepository:
+    return _cached(ShardedUserRepository(sharded_db))
+
+
+def get_user_repository(
+    repository: UserRepository = Depends(
+        _sqlite_user_repository
+        if SQLITE_MODE
+        else _sharded_user_repository if SHARDED_MODE else _database_user_repository
+    ),
+) -> UserRepository:
+    return repository
+
+
+def get_async_user_repository(
+    conn: AsyncConnection = Depends(get_async_db),
+    activation_code_repository: AsyncActivationCodeRepository = Depends(
+        get_async_activation_code_repository
+    ),
+) -> AsyncUserRepository:
+    return _cached_async(
+        AsyncDatabaseUserRepository(
+            conn, activation_code_repository, outbox=MAIL_OUTBOX
+        ),
+        conn,
+    )
+
+
+def _lookup_user(email: str) -> dict:
+    if SQLITE_MODE:
+        repository = _sqlite_user_repository(SQLiteActivationCodeRepository(sqlite_db))
+        return repository.select_by_email(email)
+    if SHARDED_MODE:
+        return _sharded_user_repository().select_by_email(email)
+    with pool.connection() as conn:
+        repository = _database_user_repository(
+            conn, DatabaseActivationCodeRepository(conn)
+        )
+        return repository.select_by_email(email)
+
+
+async def _lookup_user_async(email: str) -> dict:
+    async with async_pool.connection() as conn:
+        repository = get_async_user_repository(
+            conn, AsyncDatabaseActivationCodeRepository(conn)
+        )
+        return await repository.select_by_email(email)
+
+
+def get_user_lookup() -> Callable[[str], dict]:
+    """
+    `select_by_email` of the user repository, checking a connection out only when called:
+    a request served without it (e.g. a credential cache hit) never touches the pool.
+    """
+    return _lookup_user
+
+
+def get_async_user_lookup() -> Callable[[str], Awaitable[dict]]:
+    """
+    Same as `get_user_lookup` on the async pool.
+    """
+    return _lookup_user_async
@@ -0,0 +1,117 @@
+from collections.abc import Iterator
+
+from src.models import User
+from src.models.value_objects import UserId
+from src.services.credential_cache import credential_cache
+from src.services.email_filter import email_filter
+
+from ..activation_code import ActivationCodeRepository
+from ..exceptions import DuplicateEmailError, UserNotFound
+from .base import AsyncUserRepository, UserRepository
+from .queries import _new_users
+
+
+class InMemoryUserRepository(UserRepository):
+    users: dict
+    __last_id: int
+    __activation_code_repository: ActivationCodeRepository
+
+    def __init__(
+        self,
+        activation_code_repository: ActivationCodeRepository,
+    ):
+        self.users = {}
+        self.__last_id = 1
+        self.__activation_code_repository = activation_code_repository
+
+    def save_user(self, user: User) -> User:
+        email = user.to_public_snapshot().get("email")
+        if email in self.users:
+            raise DuplicateEmailError()
+        user.register(UserId(self.__last_id))
+        email_filter.add(email)
+        # Mutable copy, update_activated changes it in place
+        self.users[email] = dict(user.to_snapshot())
+        self.__activation_code_repository.save_activation_code(user)
+        self.__incr_id()
+
+        return User
+
+    def save_users(self, users: list[User]) -> list[User]:
+        users = _new_users(users, self.users.keys())
+        User.hash_passwords(users)
+        created = []
+        for user in users:
+            try:
+                self.save_user(user)
+                created.append(user)
+            except DuplicateEmailError:
+                pass
+
+        return created
+
+    def select_by_email(self, email: str) -> dict:
+        user_data = self.users.get(email)
+        if not user_data:
+            raise UserNotFound()
+
+        return user_data
+
+    def stream_emails(self, after_id: int = 0) -> Iterator[tuple[int, str]]:
+        return iter(
+            sorted(
+                (user["id"], email)
+                for email, user in self.users.items()
+                if user["id"] > after_id
+            )
+        )
+
+    def update_activated(self, user_id: int) -> None:
+        for email, user in self.users.items():
+            if user["id"] == user_id:
+                self.users[email]["activated"] = True
+                break
+        else:
+            raise UserNotFound()
+        credential_cache.invalidate_user(user_id)
+
+    def activate_with_code(self, user_id: int, code: str) -> None:
+        self.__activation_code_repository.consume_code(user_id, code)
+        self.update_activated(user_id)
+
+    def has_user(self, email: str) -> bool:
+        return email in self.users
+
+    def activate(self, email: str) -> None:
+        self.users[email]["activated"] = True
+
+    def save_inactive_user(self, user_data: dict):
+        self.users[user_data.get("email")] = user_data
+
+    def __incr_id(self):
+        self.__last_id += 1
+
+
+class AsyncInMemoryUserRepository(AsyncUserRepository):
+    repository: InMemoryUserRepository
+
+    def __init__(self, repository: InMemoryUserRepository):
+        self.repository = repository
+
+    async def save_user(self, user: User) -> User:
+        await user.to_snapshot_async()
+        return self.repository.save_user(user)
+
+    async def save_users(self, users: list[User]) -> list[User]:
+        users = _new_users(users, self.repository.users.keys())
+        await User.hash_passwords_async(users)
+        return self.repository.save_users(users)
+
+    async def select_by_email(self, email: str) -> dict:
+        return self.repository.select_by_email(email)
+
+    async def update_activated(self, user_id: int) -> None:
+        self.repository.update_activated(user_id)
+
+    async def activate_with_code(self, user_id: int, code: str) -> None:
+        self.repository.activate_with_code(user_id, code)
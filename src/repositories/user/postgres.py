@@ -0,0 +1,225 @@
+from collections.abc import Iterator
+from functools import partial
+
+import psycopg
+from psycopg import Connection
+from psycopg.errors import UniqueViolation
+from psycopg.rows import dict_row
+from psycopg_pool import PoolTimeout
+
+from src.models import User
+from src.models.value_objects import UserId
+from src.services.credential_cache import credential_cache
+from src.services.database import ReplicaRouter, after_commit, after_rollback, db_reads
+from src.services.email_filter import email_filter
+
+from ..activation_code import ActivationCodeRepository, _check_consumed_code
+from ..exceptions import DuplicateEmailError
+from ..outbox import DatabaseOutboxRepository
+from .base import UserRepository
+from .queries import (
+    _ACTIVATE_WITH_CODE,
+    _INSERT_USER_STATEMENTS,
+    _INSERT_USERS,
+    _REGISTERED_EMAILS,
+    _SELECT_USER,
+    _STREAM_EMAILS,
+    _UPDATE_ACTIVATED,
+    _activation_params,
+    _batch_emails,
+    _found_user,
+    _ids_by_email,
+    _insert_users_params,
+    _new_users,
+    _register_created,
+)
+
+
+def _select_user(conn: Connection, email: str) -> dict | None:
+    with conn.cursor(row_factory=dict_row) as cursor:
+        cursor.execute(_SELECT_USER, (email,))
+        return cursor.fetchone()
+
+
+def _registered_emails(conn: Connection, emails: list[str]) -> set[str]:
+    with conn.cursor() as cursor:
+        cursor.execute(_REGISTERED_EMAILS, (emails,))
+        return {email for email, in cursor.fetchall()}
+
+
+class DatabaseUserRepository(UserRepository):
+    """
+    Same statements as AsyncDatabaseUserRepository, plus the replica reads, the stream
+    and the COPY import only the sync path has.
+    """
+
+    __conn: Connection
+    __activation_code_repository: ActivationCodeRepository
+    __router: ReplicaRouter | None
+
+    def __init__(
+        self,
+        conn: Connection,
+        activation_code_repository: ActivationCodeRepository,
+        outbox: bool = False,
+        router: ReplicaRouter | None = None,
+    ):
+        self.__conn = conn
+        self.__activation_code_repository = activation_code_repository
+        self.outbox_enabled = outbox
+        self.__router = router
+
+    def save_user(self, user: User) -> User:
+        user_data = user.to_snapshot()
+        codes = self.__activation_code_repository
+        try:
+            with self.__conn.cursor() as cursor:
+                cursor.execute(
+                    _INSERT_USER_STATEMENTS[
+                        codes.in_user_database, self.outbox_enabled
+                    ],
+                    user_data,
+                    prepare=True,
+                )
+                user.register(UserId(cursor.fetchone()[0]))
+        except UniqueViolation:
+            raise DuplicateEmailError(user_data.get("email")) from None
+        if not codes.in_user_database:
+            codes.save_activation_code(user)
+        email_filter.add(user_data.get("email"))
+        self.__written(email=user_data.get("email"))
+
+        return user
+
+    def save_users(self, users: list[User]) -> list[User]:
+        if not users:
+            return []
+        registered = _registered_emails(self.__conn, _batch_emails(users))
+        users = _new_users(users, registered)
+        if not users:
+            return []
+        User.hash_passwords(users)
+        users_data = [user.to_snapshot() for user in users]
+        with self.__conn.cursor() as cursor:
+            cursor.execute(_INSERT_USERS, _insert_users_params(users_data))
+            ids = _ids_by_email(cursor.fetchall())
+
+        created = _register_created(users, users_data, ids)
+        self.__activation_code_repository.save_activation_codes(created)
+        if self.outbox_enabled:
+            DatabaseOutboxRepository(self.__conn).enqueue_activation_mails(
+                [user.to_public_snapshot() for user in created]
+            )
+
+        return created
+
+    def copy_users(self, users: list[User]) -> list[User]:
+        """
+        Same contract as `save_users`, loading rows with COPY for large imports.
+        """
+        if not users:
+            return []
+        users = _new_users(users, _registered_emails(self.__conn, _batch_emails(users)))
+        if not users:
+            return []
+        User.hash_passwords(users)
+        users_data = [user.to_snapshot() for user in users]
+        with self.__conn.cursor() as cursor:
+            cursor.execute(
+                """
+CREATE TEMP TABLE IF NOT EXISTS users_import (
+    position    INTEGER,
+    email       VARCHAR(255),
+    password    VARCHAR(255),
+    code        VARCHAR(4)
+) ON COMMIT DELETE ROWS
+"""
+            )
+            with cursor.copy(
+                "COPY users_import (position, email, password, code) FROM STDIN"
+            ) as copy:
+                for position, data in enumerate(users_data):
+                    copy.write_row(
+                        (
+                            position,
+                            data.get("email"),
+                            data.get("password"),
+                            data.get("activation_code"),
+                        )
+                    )
+            cursor.execute(
+                """
+WITH inserted AS (
+    INSERT INTO users (email, password)
+    SELECT DISTINCT ON (email) email, password FROM users_import
+    ORDER BY email, position
+    ON CONFLICT (email) DO NOTHING
+    RETURNING id, email
+), codes AS (
+    INSERT INTO activation_code (user_id, code)
+    SELECT DISTINCT ON (inserted.id) inserted.id, users_import.code
+    FROM inserted JOIN users_import USING (email)
+    ORDER BY inserted.id, users_import.position
+)
+SELECT id, email FROM inserted
+"""
+            )
+            ids = _ids_by_email(cursor.fetchall())
+
+        return _register_created(users, users_data, ids)
+
+    def stream_emails(self, after_id: int = 0) -> Iterator[tuple[int, str]]:
+        """
+        (id, email) of users above `after_id`, fetched in chunks by a server-side cursor.
+        """
+        with self.__conn.cursor(name="stream_emails") as cursor:
+            cursor.itersize = 10_000
+            cursor.execute(_STREAM_EMAILS, (after_id,))
+            yield from cursor
+
+    def select_by_email(self, email: str) -> dict:
+        router = self.__router
+        if router and router.use_replica(email):
+            try:
+                with router.pool.connection() as replica:
+                    user = _select_user(replica, email)
+            except (psycopg.Error, PoolTimeout):
+                router.replica_failed()
+                user = None
+            # Missing or recently written: it may not be replayed yet
+            if user and not router.written_recently(user["id"]):
+                db_reads.inc("replica")
+                return user
+
+        user = _select_user(self.__conn, email)
+        if router:
+            db_reads.inc("primary")
+
+        return _found_user(user)
+
+    def update_activated(self, user_id: int) -> None:
+        with self.__conn.cursor() as cursor:
+            cursor.execute(_UPDATE_ACTIVATED, (user_id,))
+        self.__written(user_id=user_id)
+        after_commit(self.__conn, partial(credential_cache.invalidate_user, user_id))
+
+    def activate_with_code(self, user_id: int, code: str) -> None:
+        codes = self.__activation_code_repository
+        if not codes.in_user_database:
+            restore = codes.consume_code(user_id, code)
+            if restore:
+                # The code is gone out of this transaction, back if it rolls back
+                after_rollback(self.__conn, restore)
+            self.update_activated(user_id)
+            return
+        with self.__conn.cursor() as cursor:
+            cursor.execute(
+                _ACTIVATE_WITH_CODE, _activation_params(user_id, code), prepare=True
+            )
+            _check_consumed_code(cursor.fetchone())
+        self.__written(user_id=user_id)
+        after_commit(self.__conn, partial(credential_cache.invalidate_user, user_id))
+
+    def __written(self, email: str | None = None, user_id: int | None = None) -> None:
+        if self.__router:
+            self.__router.mark_written(email=email, user_id=user_id)
@@ -0,0 +1,129 @@
+from functools import partial
+
+from psycopg import AsyncConnection
+from psycopg.errors import UniqueViolation
+from psycopg.rows import dict_row
+
+from src.models import User
+from src.models.value_objects import UserId
+from src.services.credential_cache import credential_cache
+from src.services.database import after_commit, after_rollback
+from src.services.email_filter import email_filter
+
+from ..activation_code import AsyncActivationCodeRepository, _check_consumed_code
+from ..exceptions import DuplicateEmailError
+from ..outbox import AsyncDatabaseOutboxRepository
+from .base import AsyncUserRepository
+from .queries import (
+    _ACTIVATE_WITH_CODE,
+    _INSERT_USER_STATEMENTS,
+    _INSERT_USERS,
+    _REGISTERED_EMAILS,
+    _SELECT_USER,
+    _UPDATE_ACTIVATED,
+    _activation_params,
+    _batch_emails,
+    _found_user,
+    _ids_by_email,
+    _insert_users_params,
+    _new_users,
+    _register_created,
+)
+
+
+async def _select_user(conn: AsyncConnection, email: str) -> dict | None:
+    async with conn.cursor(row_factory=dict_row) as cursor:
+        await cursor.execute(_SELECT_USER, (email,))
+        return await cursor.fetchone()
+
+
+async def _registered_emails(conn: AsyncConnection, emails: list[str]) -> set[str]:
+    async with conn.cursor() as cursor:
+        await cursor.execute(_REGISTERED_EMAILS, (emails,))
+        return {email for email, in await cursor.fetchall()}
+
+
+class AsyncDatabaseUserRepository(AsyncUserRepository):
+    """
+    DatabaseUserRepository on an AsyncConnection, reads stay on the primary.
+    """
+
+    __conn: AsyncConnection
+    __activation_code_repository: AsyncActivationCodeRepository
+
+    def __init__(
+        self,
+        conn: AsyncConnection,
+        activation_code_repository: AsyncActivationCodeRepository,
+        outbox: bool = False,
+    ):
+        self.__conn = conn
+        self.__activation_code_repository = activation_code_repository
+        self.outbox_enabled = outbox
+
+    async def save_user(self, user: User) -> User:
+        user_data = await user.to_snapshot_async()
+        codes = self.__activation_code_repository
+        try:
+            async with self.__conn.cursor() as cursor:
+                await cursor.execute(
+                    _INSERT_USER_STATEMENTS[
+                        codes.in_user_database, self.outbox_enabled
+                    ],
+                    user_data,
+                    prepare=True,
+                )
+                user.register(UserId((await cursor.fetchone())[0]))
+        except UniqueViolation:
+            raise DuplicateEmailError(user_data.get("email")) from None
+        if not codes.in_user_database:
+            await codes.save_activation_code(user)
+        email_filter.add(user_data.get("email"))
+
+        return user
+
+    async def save_users(self, users: list[User]) -> list[User]:
+        if not users:
+            return []
+        registered = await _registered_emails(self.__conn, _batch_emails(users))
+        users = _new_users(users, registered)
+        if not users:
+            return []
+        await User.hash_passwords_async(users)
+        users_data = [user.to_snapshot() for user in users]
+        async with self.__conn.cursor() as cursor:
+            await cursor.execute(_INSERT_USERS, _insert_users_params(users_data))
+            ids = _ids_by_email(await cursor.fetchall())
+
+        created = _register_created(users, users_data, ids)
+        await self.__activation_code_repository.save_activation_codes(created)
+        if self.outbox_enabled:
+            await AsyncDatabaseOutboxRepository(self.__conn).enqueue_activation_mails(
+                [user.to_public_snapshot() for user in created]
+            )
+
+        return created
+
+    async def select_by_email(self, email: str) -> dict:
+        return _found_user(await _select_user(self.__conn, email))
+
+    async def update_activated(self, user_id: int) -> None:
+        async with self.__conn.cursor() as cursor:
+            await cursor.execute(_UPDATE_ACTIVATED, (user_id,))
+        after_commit(self.__conn, partial(credential_cache.invalidate_user, user_id))
+
+    async def activate_with_code(self, user_id: int, code: str) -> None:
+        codes = self.__activation_code_repository
+        if not codes.in_user_database:
+            restore = await codes.consume_code(user_id, code)
+            if restore:
+                # The code is gone out of this transaction, back if it rolls back
+                after_rollback(self.__conn, restore)
+            await self.update_activated(user_id)
+            return
+        async with self.__conn.cursor() as cursor:
+            await cursor.execute(
+                _ACTIVATE_WITH_CODE, _activation_params(user_id, code), prepare=True
+            )
+            _check_consumed_code(await cursor.fetchone())
+        after_commit(self.__conn, partial(credential_cache.invalidate_user, user_id))
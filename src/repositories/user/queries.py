@@ -0,0 +1,133 @@
+# SQL and row mapping shared by the sync and async backends, which only add the I/O
+from collections.abc import Container, Iterable
+
+from src.models import User
+from src.models.value_objects import UserId
+from src.services.email_filter import email_filter
+
+from ..activation_code import _CONSUME_CODE, _validity_window
+from ..exceptions import UserNotFound
+
+# User, activation code and activation mail (to the outbox) in a single round trip
+_INSERT_USER = """
+WITH inserted AS (
+    INSERT INTO users (email, password)
+    VALUES (%(email)s, %(password)s)
+    RETURNING id
+)"""
+_INSERT_CODE = """, code AS (
+    INSERT INTO activation_code (user_id, code)
+    SELECT id, %(activation_code)s FROM inserted
+)"""
+_INSERT_MAIL = """, mail AS (
+    INSERT INTO outbox (kind, payload)
+    SELECT 'activation_code', jsonb_build_object(
+        'email', %(email)s::text, 'activation_code', %(activation_code)s::text
+    )
+    FROM inserted
+)"""
+# By (code in the users' database, mail in the outbox)
+_INSERT_USER_STATEMENTS = {
+    (code, mail): _INSERT_USER
+    + (_INSERT_CODE if code else "")
+    + (_INSERT_MAIL if mail else "")
+    + "\nSELECT id FROM inserted\n"
+    for code in (True, False)
+    for mail in (True, False)
+}
+
+_INSERT_USERS = """
+INSERT INTO users (email, password)
+SELECT * FROM unnest(%s::varchar[], %s::varchar[])
+ON CONFLICT (email) DO NOTHING
+RETURNING id, email
+"""
+
+# Ids encode the bucket of the email (see sharding.BUCKETS), so lookups by id find the node
+_INSERT_SHARDED_USER_WITH_CODE = """
+WITH inserted AS (
+    INSERT INTO users (id, email, password)
+    VALUES (nextval('users_id_seq') * %(buckets)s + %(bucket)s, %(email)s, %(password)s)
+    RETURNING id
+), code AS (
+    INSERT INTO activation_code (id, user_id, code)
+    SELECT nextval('activation_code_id_seq') * %(buckets)s + %(bucket)s, id, %(activation_code)s
+    FROM inserted
+)
+SELECT id FROM inserted
+"""
+
+_SELECT_USER = "SELECT * from users WHERE users.email = %s"
+
+_REGISTERED_EMAILS = "SELECT email FROM users WHERE email = ANY(%s::varchar[])"
+
+_STREAM_EMAILS = "SELECT id, email FROM users WHERE id > %s ORDER BY id"
+
+_UPDATE_ACTIVATED = "UPDATE users SET activated = TRUE WHERE id = %s"
+
+# Consumes the code and activates its user in a single statement
+_ACTIVATE_WITH_CODE = (
+    _CONSUME_CODE
+    + """, activated AS (
+    UPDATE users
+    SET activated = TRUE
+    WHERE id IN (SELECT user_id FROM consumed)
+    RETURNING id
+)
+SELECT valid, EXISTS (SELECT 1 FROM activated) FROM matched
+"""
+)
+
+# Delivered to every UserCacheListener when the transaction commits
+_NOTIFY_USER_CACHE = "SELECT pg_notify(%s, %s)"
+
+
+def _found_user(row: dict | None) -> dict:
+    if not row:
+        raise UserNotFound()
+    return row
+
+
+def _activation_params(user_id: int, code: str) -> dict:
+    return {"user_id": user_id, "code": code, **_validity_window()}
+
+
+def _batch_emails(users: list[User]) -> list[str]:
+    return list(dict.fromkeys(user.to_public_snapshot().get("email") for user in users))
+
+
+def _new_users(users: list[User], registered: Container[str]) -> list[User]:
+    """
+    First user of each email not `registered` yet: the only ones worth a password hash,
+    the others are duplicates.
+    """
+    first = {}
+    for user in users:
+        first.setdefault(user.to_public_snapshot().get("email"), user)
+    return [user for email, user in first.items() if email not in registered]
+
+
+def _insert_users_params(users_data: list[dict]) -> tuple[list[str], list[str]]:
+    return (
+        [data.get("email") for data in users_data],
+        [data.get("password") for data in users_data],
+    )
+
+
+def _ids_by_email(rows: Iterable[tuple[int, str]]) -> dict[str, int]:
+    return {email: id for id, email in rows}
+
+
+def _register_created(
+    users: list[User], users_data: list[dict], ids: dict
+) -> list[User]:
+    created = []
+    for user, data in zip(users, users_data):
+        # pop: a repeated email in the batch is a duplicate of its first occurrence
+        id = ids.pop(data.get("email"), None)
+        if id is not None:
+            user.register(UserId(id))
+            email_filter.add(data.get("email"))
+            created.append(user)
+
+    return created
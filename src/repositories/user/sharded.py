@@ -0,0 +1,138 @@
+import heapq
+from collections.abc import Iterator
+from contextlib import ExitStack
+
+from psycopg.errors import UniqueViolation
+
+from src.models import User
+from src.models.value_objects import UserId
+from src.services.credential_cache import credential_cache
+from src.services.email_filter import email_filter
+from src.services.sharding import BUCKETS, ShardedDatabase, email_bucket
+
+from ..activation_code import _check_consumed_code, _insert_sharded_codes
+from ..exceptions import DuplicateEmailError
+from .base import UserRepository
+from .postgres import _registered_emails, _select_user
+from .queries import (
+    _ACTIVATE_WITH_CODE,
+    _INSERT_SHARDED_USER_WITH_CODE,
+    _STREAM_EMAILS,
+    _UPDATE_ACTIVATED,
+    _activation_params,
+    _batch_emails,
+    _found_user,
+    _ids_by_email,
+    _new_users,
+    _register_created,
+)
+
+
+class ShardedUserRepository(UserRepository):
+    """
+    Users spread over the nodes of a ShardMap by the bucket of their email, each query
+    runs on the node of its email or user id. A batch is one transaction per node, the
+    activation mails are sent by background tasks (the outbox dispatcher reads one node).
+    """
+
+    __db: ShardedDatabase
+
+    def __init__(self, db: ShardedDatabase):
+        self.__db = db
+
+    def save_user(self, user: User) -> User:
+        user_data = user.to_snapshot()
+        email = user_data.get("email")
+        try:
+            with self.__db.connection_for_email(email) as conn:
+                row = conn.execute(
+                    _INSERT_SHARDED_USER_WITH_CODE,
+                    {**user_data, "buckets": BUCKETS, "bucket": email_bucket(email)},
+                    prepare=True,
+                ).fetchone()
+        except UniqueViolation:
+            raise DuplicateEmailError(email) from None
+        user.register(UserId(row[0]))
+        email_filter.add(email)
+
+        return user
+
+    def save_users(self, users: list[User]) -> list[User]:
+        by_node = {}
+        for user in users:
+            node = self.__db.shard_map.node_for_email(
+                user.to_public_snapshot().get("email")
+            )
+            by_node.setdefault(node, []).append(user)
+        for node, node_users in by_node.items():
+            with self.__db.connection(node) as conn:
+                registered = _registered_emails(conn, _batch_emails(node_users))
+            by_node[node] = _new_users(node_users, registered)
+        # Hashed in one batch across the nodes
+        User.hash_passwords(
+            [user for node_users in by_node.values() for user in node_users]
+        )
+
+        created = []
+        for node, node_users in by_node.items():
+            if not node_users:
+                continue
+            node_data = [user.to_snapshot() for user in node_users]
+            with self.__db.connection(node) as conn:
+                rows = conn.execute(
+                    """
+INSERT INTO users (id, email, password)
+SELECT nextval('users_id_seq') * %s + bucket, email, password
+FROM unnest(%s::varchar[], %s::varchar[], %s::int[]) AS new_users (email, password, bucket)
+ON CONFLICT (email) DO NOTHING
+RETURNING id, email
+""",
+                    (
+                        BUCKETS,
+                        [data.get("email") for data in node_data],
+                        [data.get("password") for data in node_data],
+                        [email_bucket(data.get("email")) for data in node_data],
+                    ),
+                ).fetchall()
+                node_created = _register_created(
+                    node_users, node_data, _ids_by_email(rows)
+                )
+                _insert_sharded_codes(conn, node_created)
+            created += node_created
+
+        # Back in the order of `users`
+        positions = {id(user): position for position, user in enumerate(users)}
+        return sorted(created, key=lambda user: positions[id(user)])
+
+    def stream_emails(self, after_id: int = 0) -> Iterator[tuple[int, str]]:
+        """
+        (id, email) of users above `after_id` on every node, merged in id order.
+        """
+        with ExitStack() as stack:
+            cursors = []
+            for node in self.__db.pools:
+                conn = stack.enter_context(self.__db.connection(node))
+                cursor = stack.enter_context(conn.cursor(name="stream_emails"))
+                cursor.itersize = 10_000
+                cursor.execute(_STREAM_EMAILS, (after_id,))
+                cursors.append(cursor)
+            yield from heapq.merge(*cursors)
+
+    def select_by_email(self, email: str) -> dict:
+        with self.__db.connection_for_email(email) as conn:
+            user = _select_user(conn, email)
+
+        return _found_user(user)
+
+    def update_activated(self, user_id: int) -> None:
+        with self.__db.connection_for_id(user_id) as conn:
+            conn.execute(_UPDATE_ACTIVATED, (user_id,))
+        credential_cache.invalidate_user(user_id)
+
+    def activate_with_code(self, user_id: int, code: str) -> None:
+        with self.__db.connection_for_id(user_id) as conn:
+            row = conn.execute(
+                _ACTIVATE_WITH_CODE, _activation_params(user_id, code), prepare=True
+            ).fetchone()
+        _check_consumed_code(row)
+        credential_cache.invalidate_user(user_id)
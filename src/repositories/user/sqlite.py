@@ -0,0 +1,112 @@
+import json
+import sqlite3
+from collections.abc import Iterator
+
+from src.models import User
+from src.models.value_objects import UserId
+from src.services.credential_cache import credential_cache
+from src.services.email_filter import email_filter
+from src.services.sqlite import SQLiteDatabase
+
+from ..activation_code import ActivationCodeRepository
+from ..exceptions import DuplicateEmailError
+from .base import UserRepository
+from .queries import _batch_emails, _found_user, _new_users, _register_created
+
+
+class SQLiteUserRepository(UserRepository):
+    """
+    Activation mails are sent by background tasks, the outbox is Postgres only.
+    """
+
+    __db: SQLiteDatabase
+    __activation_code_repository: ActivationCodeRepository
+
+    def __init__(
+        self,
+        db: SQLiteDatabase,
+        activation_code_repository: ActivationCodeRepository,
+    ):
+        self.__db = db
+        self.__activation_code_repository = activation_code_repository
+
+    def save_user(self, user: User) -> User:
+        user_data = user.to_snapshot()
+        try:
+            with self.__db.transaction() as conn:
+                row = conn.execute(
+                    "INSERT INTO users (email, password) VALUES (:email, :password) RETURNING id",
+                    user_data,
+                ).fetchone()
+                user.register(UserId(row[0]))
+                email_filter.add(user_data.get("email"))
+                self.__activation_code_repository.save_activation_code(user)
+
+                return user
+        except sqlite3.IntegrityError:
+            raise DuplicateEmailError(user_data.get("email")) from None
+
+    def save_users(self, users: list[User]) -> list[User]:
+        if not users:
+            return []
+        # json_each: no bound parameter per email, SQLite caps their number
+        registered = {
+            email
+            for email, in self.__db.reader().execute(
+                "SELECT email FROM users WHERE email IN (SELECT value FROM json_each(?))",
+                (json.dumps(_batch_emails(users)),),
+            )
+        }
+        users = _new_users(users, registered)
+        if not users:
+            return []
+        User.hash_passwords(users)
+        users_data = [user.to_snapshot() for user in users]
+        with self.__db.transaction() as conn:
+            ids = {}
+            for data in users_data:
+                row = conn.execute(
+                    """
+INSERT INTO users (email, password) VALUES (:email, :password)
+ON CONFLICT (email) DO NOTHING
+RETURNING id
+""",
+                    data,
+                ).fetchone()
+                if row:
+                    ids[data.get("email")] = row[0]
+
+            created = _register_created(users, users_data, ids)
+            self.__activation_code_repository.save_activation_codes(created)
+
+        return created
+
+    def stream_emails(self, after_id: int = 0) -> Iterator[tuple[int, str]]:
+        # The cursor steps through rows, nothing is fetched ahead
+        yield from self.__db.reader().execute(
+            "SELECT id, email FROM users WHERE id > ? ORDER BY id", (after_id,)
+        )
+
+    def select_by_email(self, email: str) -> dict:
+        row = _found_user(
+            self.__db.reader()
+            .execute("SELECT * FROM users WHERE email = ?", (email,))
+            .fetchone()
+        )
+
+        return {**dict(row), "activated": bool(row["activated"])}
+
+    def update_activated(self, user_id: int) -> None:
+        with self.__db.transaction() as conn:
+            conn.execute("UPDATE users SET activated = 1 WHERE id = ?", (user_id,))
+        credential_cache.invalidate_user(user_id)
+
+    def activate_with_code(self, user_id: int, code: str) -> None:
+        with self.__db.transaction() as conn:
+            restore = self.__activation_code_repository.consume_code(user_id, code)
+            if restore:
+                # The code is gone out of this transaction, back if it rolls back
+                self.__db.after_rollback(restore)
+            conn.execute("UPDATE users SET activated = 1 WHERE id = ?", (user_id,))
+        # After commit, a concurrent login would otherwise cache the inactive user again
+        credential_cache.invalidate_user(user_id)
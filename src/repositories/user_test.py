@@ -0,0 +1,329 @@
+import pytest
+
+from src.models import User
+from src.models.value_objects import Email, Password
+from src.repositories import (
+    InMemoryActivationCodeRepository,
+    InMemoryUserRepository,
+)
+from src.repositories.activation_code import (
+    CodeStoreActivationCodeRepository,
+    DatabaseActivationCodeRepository,
+    SQLiteActivationCodeRepository,
+)
+from src.repositories.exceptions import (
+    CodeExpired,
+    DuplicateEmailError,
+    InvalidActivationCode,
+    UserNotFound,
+)
+from src.repositories.outbox import DatabaseOutboxRepository
+from src.repositories.user import (
+    CachedUserRepository,
+    DatabaseUserRepository,
+    SQLiteUserRepository,
+)
+from src.services import database, hashing
+from src.services.code_store import CodeStore
+from src.services.migrations import migrate
+from src.services.sqlite import SQLiteDatabase
+from src.services.user_cache import UserCache
+
+
+@pytest.fixture
+def database_user(db_conn):
+    migrate(db_conn)
+    user_repository = DatabaseUserRepository(
+        db_conn, DatabaseActivationCodeRepository(db_conn)
+    )
+    user = User(Email("activation@test.com"), Password("Password@123"))
+    user_repository.save_user(user)
+
+    yield user_repository, user.to_snapshot()
+
+    db_conn.rollback()
+
+
+def test_activate_with_code_consumes_code(database_user):
+    user_repository, user_data = database_user
+
+    with pytest.raises(InvalidActivationCode):
+        user_repository.activate_with_code(user_data.get("id"), "bad")
+    user_repository.activate_with_code(
+        user_data.get("id"), user_data.get("activation_code")
+    )
+
+    assert user_repository.select_by_email(user_data.get("email"))["activated"]
+    with pytest.raises(InvalidActivationCode):
+        user_repository.activate_with_code(
+            user_data.get("id"), user_data.get("activation_code")
+        )
+
+
+def test_activate_with_code_expired(database_user, db_conn):
+    user_repository, user_data = database_user
+    db_conn.execute(
+        "UPDATE activation_code SET created_at = created_at - interval '1 hour' "
+        "WHERE user_id = %s",
+        (user_data.get("id"),),
+    )
+
+    with pytest.raises(CodeExpired):
+        user_repository.activate_with_code(
+            user_data.get("id"), user_data.get("activation_code")
+        )
+    assert not user_repository.select_by_email(user_data.get("email"))["activated"]
+
+
+def test_save_user_writes_activation_mail_to_outbox(db_conn):
+    migrate(db_conn)
+    user_repository = DatabaseUserRepository(
+        db_conn, DatabaseActivationCodeRepository(db_conn), outbox=True
+    )
+    user = User(Email("outbox@test.com"), Password("Password@123"))
+    user_repository.save_user(user)
+    user_data = user.to_public_snapshot()
+
+    messages = DatabaseOutboxRepository(db_conn).claim_batch(100)
+
+    assert {
+        "email": user_data.get("email"),
+        "activation_code": user_data.get("activation_code"),
+    } in [message["payload"] for message in messages]
+    db_conn.rollback()
+
+
+def test_code_store_keeps_codes_out_of_the_database(db_conn):
+    migrate(db_conn)
+    user_repository = DatabaseUserRepository(
+        db_conn, CodeStoreActivationCodeRepository(CodeStore()), outbox=True
+    )
+    user = User(Email("code-store@test.com"), Password("Password@123"))
+    user_repository.save_user(user)
+    user_data = user.to_public_snapshot()
+
+    assert not db_conn.execute(
+        "SELECT 1 FROM activation_code WHERE user_id = %s", (user_data.get("id"),)
+    ).fetchone()
+    # The mail still carries the code
+    assert {
+        "email": user_data.get("email"),
+        "activation_code": user_data.get("activation_code"),
+    } in [m["payload"] for m in DatabaseOutboxRepository(db_conn).claim_batch(100)]
+    user_repository.activate_with_code(
+        user_data.get("id"), user_data.get("activation_code")
+    )
+    assert user_repository.select_by_email(user_data.get("email"))["activated"]
+    with pytest.raises(InvalidActivationCode):
+        user_repository.activate_with_code(
+            user_data.get("id"), user_data.get("activation_code")
+        )
+    db_conn.rollback()
+
+
+class _Pool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn):
+        pass
+
+
+def test_code_store_gets_the_code_back_when_the_activation_rolls_back(
+    db_conn, monkeypatch
+):
+    migrate(db_conn)
+    monkeypatch.setattr(database, "pool", _Pool(db_conn))
+    store = CodeStore()
+    request = database.get_db()
+    conn = next(request)
+    user_repository = DatabaseUserRepository(
+        conn, CodeStoreActivationCodeRepository(store), outbox=True
+    )
+    user = User(Email("code-store-rollback@test.com"), Password("Password@123"))
+    user_repository.save_user(user)
+    user_data = user.to_public_snapshot()
+    user_repository.activate_with_code(
+        user_data.get("id"), user_data.get("activation_code")
+    )
+    assert store.get(user_data.get("id")) is None
+
+    with pytest.raises(ValueError):
+        request.throw(ValueError())
+    assert store.get(user_data.get("id")) == (user_data.get("activation_code"), True)
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    db = SQLiteDatabase(str(tmp_path / "users.sqlite3"))
+    db.open()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def sqlite_user(sqlite_db):
+    user_repository = SQLiteUserRepository(
+        sqlite_db, SQLiteActivationCodeRepository(sqlite_db)
+    )
+    user = User(Email("sqlite@test.com"), Password("Password@123"))
+    user_repository.save_user(user)
+
+    return user_repository, user.to_snapshot()
+
+
+def test_sqlite_database_uses_wal(sqlite_db):
+    with sqlite_db.transaction() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_sqlite_save_and_select_user(sqlite_user):
+    user_repository, user_data = sqlite_user
+
+    saved = user_repository.select_by_email("sqlite@test.com")
+    assert saved["id"] == user_data.get("id")
+    assert saved["activated"] is False
+    with pytest.raises(DuplicateEmailError):
+        user_repository.save_user(
+            User(Email("sqlite@test.com"), Password("Password@123"))
+        )
+    with pytest.raises(UserNotFound):
+        user_repository.select_by_email("missing@test.com")
+
+
+def test_sqlite_save_users_skips_duplicates(sqlite_user):
+    user_repository, _ = sqlite_user
+    users = [
+        User(Email(email), Password("Password@123"))
+        for email in ("sqlite@test.com", "new@test.com", "new@test.com")
+    ]
+
+    calls = hashing.hashing_service.stats()["calls"]
+    created = user_repository.save_users(users)
+
+    assert created == [users[1]]
+    assert user_repository.select_by_email("new@test.com")["id"]
+    # Duplicates are dropped before hashing
+    assert hashing.hashing_service.stats()["calls"] == calls + 1
+
+
+def test_save_users_hashes_new_emails_only(database_user):
+    user_repository, _ = database_user
+    users = [
+        User(Email(email), Password("Password@123"))
+        for email in ("activation@test.com", "batch@test.com", "batch@test.com")
+    ]
+    calls = hashing.hashing_service.stats()["calls"]
+
+    assert user_repository.save_users(users) == [users[1]]
+    assert hashing.hashing_service.stats()["calls"] == calls + 1
+
+
+def test_sqlite_activate_with_code_consumes_code(sqlite_user):
+    user_repository, user_data = sqlite_user
+
+    with pytest.raises(InvalidActivationCode):
+        user_repository.activate_with_code(user_data.get("id"), "bad")
+    user_repository.activate_with_code(
+        user_data.get("id"), user_data.get("activation_code")
+    )
+
+    assert user_repository.select_by_email("sqlite@test.com")["activated"]
+    with pytest.raises(InvalidActivationCode):
+        user_repository.activate_with_code(
+            user_data.get("id"), user_data.get("activation_code")
+        )
+
+
+def test_sqlite_code_store_gets_the_code_back_when_the_activation_rolls_back(
+    sqlite_db,
+):
+    store = CodeStore()
+    user_repository = SQLiteUserRepository(
+        sqlite_db, CodeStoreActivationCodeRepository(store)
+    )
+    user = User(Email("sqlite-rollback@test.com"), Password("Password@123"))
+    user_repository.save_user(user)
+    user_data = user.to_public_snapshot()
+
+    with pytest.raises(ValueError):
+        with sqlite_db.transaction():
+            user_repository.activate_with_code(
+                user_data.get("id"), user_data.get("activation_code")
+            )
+            assert store.get(user_data.get("id")) is None
+            raise ValueError()
+
+    assert store.get(user_data.get("id")) == (user_data.get("activation_code"), True)
+    assert not user_repository.select_by_email("sqlite-rollback@test.com")["activated"]
+
+
+def test_sqlite_expired_codes(sqlite_user, sqlite_db):
+    user_repository, user_data = sqlite_user
+    with sqlite_db.transaction() as conn:
+        conn.execute("UPDATE activation_code SET created_at = created_at - 3600")
+
+    with pytest.raises(CodeExpired):
+        user_repository.activate_with_code(
+            user_data.get("id"), user_data.get("activation_code")
+        )
+    assert not user_repository.select_by_email("sqlite@test.com")["activated"]
+    code_repository = SQLiteActivationCodeRepository(sqlite_db)
+    assert code_repository.delete_expired_codes(0, 10) == [1]
+
+
+def test_cached_repository_reads_through_and_invalidates_on_write():
+    repository = InMemoryUserRepository(InMemoryActivationCodeRepository())
+    cache = UserCache()
+    published = []
+    cached_repository = CachedUserRepository(repository, cache, published.append)
+
+    with pytest.raises(UserNotFound):
+        cached_repository.select_by_email("cached@test.com")
+    with pytest.raises(UserNotFound):
+        cached_repository.select_by_email("cached@test.com")
+
+    cached_repository.save_user(
+        User(Email("cached@test.com"), Password("Password@123"))
+    )
+    user_data = cached_repository.select_by_email("cached@test.com")
+    assert cached_repository.select_by_email("cached@test.com") == user_data
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (2, 2)
+
+    # Changed behind the cache, still served from it until invalidated
+    repository.activate("cached@test.com")
+    assert not cached_repository.select_by_email("cached@test.com").get("activated")
+    cached_repository.update_activated(user_data["id"])
+    assert cached_repository.select_by_email("cached@test.com")["activated"]
+    assert published == ["email:cached@test.com", f"user:{user_data['id']}"]
+
+
+def test_cached_repository_invalidates_after_the_commit():
+    repository = InMemoryUserRepository(InMemoryActivationCodeRepository())
+    cache = UserCache()
+    committed = []
+    cached_repository = CachedUserRepository(
+        repository, cache, after_commit=committed.append
+    )
+    cached_repository.save_user(
+        User(Email("cached@test.com"), Password("Password@123"))
+    )
+    user_id = cached_repository.select_by_email("cached@test.com")["id"]
+
+    cached_repository.update_activated(user_id)
+    # A read before the commit still gets the cached row
+    assert not cached_repository.select_by_email("cached@test.com").get("activated")
+    for invalidation in committed:
+        invalidation()
+    assert cached_repository.select_by_email("cached@test.com")["activated"]
+
+    # A duplicate rolls back, the email is dropped right away
+    cache.set("cached@test.com", None)
+    with pytest.raises(DuplicateEmailError):
+        cached_repository.save_user(
+            User(Email("cached@test.com"), Password("Password@123"))
+        )
+    assert cached_repository.select_by_email("cached@test.com")["id"] == user_id
@@ -1 +1,6 @@
-from .user import router as user_router
+from src.services.database import ASYNC_MODE
+
+from .admin import router as admin_router
+from .user import async_router, router
+
+user_router = async_router if ASYNC_MODE else router
@@ -0,0 +1,74 @@
+import asyncio
+
+from fastapi import APIRouter, Header, Request
+from fastapi.exceptions import HTTPException
+
+from src.services import database
+from src.services import profiler as profiling
+from src.services.code_store import CODE_STORE_ENABLED, code_store
+from src.services.credential_cache import credential_cache
+from src.services.email_filter import email_filter
+from src.services.hashing import hashing_service
+from src.services.mail_dispatcher import mail_dispatcher
+from src.services.partitions import partition_rotator
+from src.services.rate_limiter import rate_limiter
+from src.services.user_cache import user_cache, user_cache_listener
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/stats")
+def stats(request: Request, x_profile: str | None = Header(None)):
+    """
+    Internal state of the worker's pools, caches and background services.
+    """
+    if not profiling.profiler.verify(x_profile, request.method, request.url.path):
+        raise HTTPException(403, "Invalid or expired X-Profile signature")
+    return {
+        "hashing": hashing_service.stats(),
+        "credential_cache": credential_cache.stats(),
+        "user_cache": {**user_cache.stats(), **user_cache_listener.stats()},
+        "email_filter": email_filter.stats(),
+        "replica": (
+            database.replica_router.stats() if database.REPLICA_ENABLED else None
+        ),
+        "shards": database.sharded_db.stats() if database.SHARDED_MODE else None,
+        "activation_code_partitions": partition_rotator.stats(),
+        "activation_code_store": code_store.stats() if CODE_STORE_ENABLED else None,
+        "mail_dispatcher": mail_dispatcher.stats(),
+        "rate_limiter": rate_limiter.stats(),
+    }
+
+
+@router.post("/profile")
+async def profile_process(
+    request: Request,
+    seconds: float = 10,
+    x_profile: str | None = Header(None),
+):
+    """
+    Samples every thread for `seconds`, then returns the collapsed stacks file.
+    """
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(404, "Not Found")
+    if not profiling.profiler.verify(x_profile, request.method, request.url.path):
+        raise HTTPException(403, "Invalid or expired X-Profile signature")
+    if not 0 < seconds <= profiling.PROFILING_MAX_SECONDS:
+        raise HTTPException(
+            422, f"seconds must be in ]0, {profiling.PROFILING_MAX_SECONDS}]"
+        )
+
+    sampler = profiling.profiler.start()
+    if sampler is None:
+        raise HTTPException(409, "A profile is already running")
+    try:
+        await asyncio.sleep(seconds)
+    except asyncio.CancelledError:
+        # Client gone: the partial profile is still written and the profiler freed
+        profiling.profiler.finish(sampler, f"process-{seconds:g}s-cancelled")
+        raise
+    path = await asyncio.to_thread(
+        profiling.profiler.finish, sampler, f"process-{seconds:g}s"
+    )
+
+    return {"file": str(path)}
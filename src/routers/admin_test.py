@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+from main import app
+from src.routers.admin import profile_process
+from src.services import profiler as profiling
+
+client = TestClient(app)
+
+
+def test_health_keeps_stats_behind_the_admin_signature(monkeypatch):
+    monkeypatch.setattr(profiling.profiler, "secret", b"test-secret")
+
+    assert client.get("/api/health").json() == {"status": "running"}
+    assert client.get("/api/admin/stats").status_code == 403
+
+    signature = profiling.sign(
+        b"test-secret", "GET", "/api/admin/stats", int(time.time()) + 60
+    )
+    response = client.get("/api/admin/stats", headers={"X-Profile": signature})
+    assert response.status_code == 200
+    assert "hashing" in response.json()
+    # Single use
+    response = client.get("/api/admin/stats", headers={"X-Profile": signature})
+    assert response.status_code == 403
+
+
+def test_process_profile_disabled_by_default():
+    response = client.post("/api/admin/profile", params={"seconds": 0.1})
+    assert response.status_code == 404
+
+
+def test_process_profile_requires_signature(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling.profiler, "secret", b"test-secret")
+    monkeypatch.setattr(profiling.profiler, "store", profiling.ProfileStore(tmp_path))
+
+    response = client.post("/api/admin/profile", params={"seconds": 0.1})
+    assert response.status_code == 403
+    # Signed for another route
+    signature = profiling.sign(
+        b"test-secret", "GET", "/api/admin/stats", int(time.time()) + 60
+    )
+    response = client.post(
+        "/api/admin/profile",
+        params={"seconds": 0.1},
+        headers={"X-Profile": signature},
+    )
+    assert response.status_code == 403
+
+    signature = profiling.sign(
+        b"test-secret", "POST", "/api/admin/profile", int(time.time()) + 60
+    )
+    response = client.post(
+        "/api/admin/profile",
+        params={"seconds": 0.1},
+        headers={"X-Profile": signature},
+    )
+    assert response.status_code == 200
+    assert response.json()["file"].startswith(str(tmp_path))
+
+
+def test_cancelled_process_profile_frees_the_profiler(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling.profiler, "secret", b"test-secret")
+    monkeypatch.setattr(profiling.profiler, "store", profiling.ProfileStore(tmp_path))
+    signature = profiling.sign(
+        b"test-secret", "POST", "/api/admin/profile", int(time.time()) + 60
+    )
+    request = Request(
+        {"type": "http", "method": "POST", "path": "/api/admin/profile", "headers": []}
+    )
+
+    async def cancel_profile():
+        task = asyncio.create_task(
+            profile_process(request, seconds=30, x_profile=signature)
+        )
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_profile())
+
+    [written] = tmp_path.iterdir()
+    assert "cancelled" in written.name
+    sampler = profiling.profiler.start()
+    assert sampler is not None
+    profiling.profiler.finish(sampler, "next")
@@ -1,8 +1,12 @@
 import pytest
 
+from src.models.value_objects import Password
+from src.services import hashing
+
 
 @pytest.fixture(autouse=True)
 def real_password_hashing(monkeypatch):
     """Disable fake bcrypt call for router tests"""
     monkeypatch.undo()
+    monkeypatch.setattr(Password, "hasher", hashing.hashing_service)
     yield
@@ -1,3 +1,6 @@
+import os
+from collections.abc import Callable
+
 from fastapi import APIRouter, Body, Depends, Response
 from fastapi.exceptions import HTTPException
 
@@ -10,37 +13,142 @@ from src.repositories.exceptions import (
     InvalidActivationCode,
 )
 from src.services import auth
-from src.use_cases.activate_user import ActivateUser, get_activate_user_use_case
-from src.use_cases.register_user import RegisterUser, get_register_user_use_case
-
-router = APIRouter(prefix="/user", tags=["user"])
-
-
-@router.post("/", status_code=201)
-def create_user(
-    email: str = Body(...),
-    password: str = Body(...),
-    register_user: RegisterUser = Depends(get_register_user_use_case),
-):
-    try:
-        user = User(email=Email(email), password=Password(password))
-        register_user.execute(user)
-    except ValidationError as e:
-        raise HTTPException(status_code=422, detail=e.infos)
-    except DuplicateEmailError as e:
-        raise HTTPException(409, e.detail)
-
-    return Response("User created", 201)
-
-
-@router.post("/activate", status_code=200)
-def activate(
-    code: str = Body(..., embed=True),
-    user: dict = Depends(auth.get_inactive_user),
-    activate_user: ActivateUser = Depends(get_activate_user_use_case),
-):
-    try:
-        activate_user.execute(user.get("id"), code)
-    except (CodeExpired, InvalidActivationCode) as e:
-        raise HTTPException(409, e.detail)
-    return Response("User activated", 200)
+from src.services.concurrency import call
+from src.services.hashing import HashingQueueFull
+from src.services.rate_limiter import rate_limit
+from src.use_cases.activate_user import (
+    ActivateUser,
+    AsyncActivateUser,
+    get_activate_user_use_case,
+    get_async_activate_user_use_case,
+)
+from src.use_cases.register_user import (
+    AsyncRegisterUser,
+    RegisterUser,
+    get_async_register_user_use_case,
+    get_register_user_use_case,
+)
+from src.use_cases.register_users import (
+    AsyncRegisterUsers,
+    RegisterUsers,
+    get_async_register_users_use_case,
+    get_register_users_use_case,
+)
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "5000"))
+
+
+def _parse_batch(entries: list[dict]) -> tuple[list[dict], list[User]]:
+    """
+    Validates every entry, invalid ones get their result right away.
+    """
+    if len(entries) > BATCH_MAX_SIZE:
+        raise HTTPException(413, f"Batch is limited to {BATCH_MAX_SIZE} users")
+
+    results = []
+    users = []
+    for entry in entries:
+        result = {"email": entry.get("email") if isinstance(entry, dict) else None}
+        try:
+            user = User(
+                email=Email(str(entry["email"])),
+                password=Password(str(entry["password"])),
+            )
+            users.append(user)
+            result["user"] = user
+        except ValidationError as e:
+            result.update(status="invalid", detail=e.infos)
+        except (KeyError, TypeError):
+            result.update(status="invalid", detail="email and password are required")
+        results.append(result)
+
+    return results, users
+
+
+def _batch_results(results: list[dict], created: list[User]) -> dict:
+    created_users = {id(user) for user in created}
+    for result in results:
+        user = result.pop("user", None)
+        if user is not None:
+            result["status"] = "created" if id(user) in created_users else "duplicate"
+
+    return {"results": results}
+
+
+def _user_router(
+    get_register_user: Callable,
+    get_register_users: Callable,
+    get_activate_user: Callable,
+    get_inactive_user: Callable,
+) -> APIRouter:
+    """
+    The user routes on the given use cases, sync ones run in the threadpool and async
+    ones are awaited (see concurrency.call).
+    """
+    router = APIRouter(prefix="/user", tags=["user"])
+
+    @router.post("/", status_code=201, dependencies=[Depends(rate_limit("register"))])
+    async def create_user(
+        email: str = Body(...),
+        password: str = Body(...),
+        register_user: RegisterUser | AsyncRegisterUser = Depends(get_register_user),
+    ):
+        try:
+            user = User(email=Email(email), password=Password(password))
+            await call(register_user.execute, user)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.infos)
+        except DuplicateEmailError as e:
+            raise HTTPException(409, e.detail)
+        except HashingQueueFull as e:
+            raise HTTPException(503, e.detail)
+
+        return Response("User created", 201)
+
+    @router.post(
+        "/batch", status_code=200, dependencies=[Depends(rate_limit("register_batch"))]
+    )
+    async def create_users(
+        users: list = Body(..., embed=True),
+        register_users: RegisterUsers | AsyncRegisterUsers = Depends(
+            get_register_users
+        ),
+    ):
+        results, valid_users = _parse_batch(users)
+        try:
+            created = await call(register_users.execute, valid_users)
+        except HashingQueueFull as e:
+            raise HTTPException(503, e.detail)
+
+        return _batch_results(results, created)
+
+    @router.post(
+        "/activate", status_code=200, dependencies=[Depends(rate_limit("activate"))]
+    )
+    async def activate(
+        code: str = Body(..., embed=True),
+        user: dict = Depends(get_inactive_user),
+        activate_user: ActivateUser | AsyncActivateUser = Depends(get_activate_user),
+    ):
+        try:
+            await call(activate_user.execute, user.get("id"), code)
+        except (CodeExpired, InvalidActivationCode) as e:
+            raise HTTPException(409, e.detail)
+        return Response("User activated", 200)
+
+    return router
+
+
+router = _user_router(
+    get_register_user_use_case,
+    get_register_users_use_case,
+    get_activate_user_use_case,
+    auth.get_inactive_user,
+)
+# Same routes on the async use cases, served with API_MODE=async
+async_router = _user_router(
+    get_async_register_user_use_case,
+    get_async_register_users_use_case,
+    get_async_activate_user_use_case,
+    auth.get_inactive_user_async,
+)
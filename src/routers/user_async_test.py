@@ -0,0 +1,103 @@
+"""
+Same scenarios as user_test.py, against the routes served with API_MODE=async.
+"""
+
+import base64
+
+import pytest
+from fastapi import APIRouter, BackgroundTasks, FastAPI
+from fastapi.testclient import TestClient
+
+from src.models import User
+from src.models.value_objects import Email, Password
+from src.repositories import (
+    AsyncInMemoryUserRepository,
+    InMemoryActivationCodeRepository,
+    InMemoryUserRepository,
+    get_async_user_lookup,
+)
+from src.routers.user import async_router, router
+from src.services.mail import InMemoryMailAdapter
+from src.use_cases.activate_user import (
+    AsyncActivateUser,
+    get_async_activate_user_use_case,
+)
+from src.use_cases.register_user import (
+    AsyncRegisterUser,
+    get_async_register_user_use_case,
+)
+
+api_router = APIRouter(prefix="/api")
+api_router.include_router(async_router)
+app = FastAPI()
+app.include_router(api_router)
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def mock_async_dependencies():
+    activation_code_repository = InMemoryActivationCodeRepository()
+    user_repository = InMemoryUserRepository(activation_code_repository)
+    async_user_repository = AsyncInMemoryUserRepository(user_repository)
+    register_user = AsyncRegisterUser(
+        async_user_repository,
+        InMemoryMailAdapter(),
+        BackgroundTasks(),
+    )
+    activate_user = AsyncActivateUser(async_user_repository)
+
+    app.dependency_overrides.update(
+        {
+            get_async_register_user_use_case: lambda: register_user,
+            get_async_activate_user_use_case: lambda: activate_user,
+            get_async_user_lookup: lambda: async_user_repository.select_by_email,
+        }
+    )
+
+    yield user_repository
+
+    app.dependency_overrides.clear()
+
+
+def test_both_api_modes_serve_the_same_routes():
+    def routes(user_router):
+        return [(route.path, route.methods) for route in user_router.routes]
+
+    assert routes(async_router) == routes(router)
+
+
+def test_async_user_creation_success(mock_async_dependencies):
+    response = client.post(
+        "/api/user", json={"email": "user@test.com", "password": "Test@123"}
+    )
+    assert response.status_code == 201
+    assert mock_async_dependencies.has_user("user@test.com")
+
+    response = client.post(
+        "/api/user", json={"email": "user@test.com", "password": "Test@123"}
+    )
+    assert response.status_code == 409
+
+
+def test_async_user_activation(mock_async_dependencies):
+    email = "user@test.com"
+    password = "Password@123"
+    user = User(Email(email), Password(password))
+    mock_async_dependencies.save_user(user)
+    code = user.to_snapshot().get("activation_code")
+    b64_auth = base64.b64encode(f"{email}:{password}".encode()).decode()
+
+    response = client.post(
+        "/api/user/activate",
+        json={"code": "wrong_code"},
+        headers={"Authorization": f"Basic {b64_auth}"},
+    )
+    assert response.status_code == 409
+
+    response = client.post(
+        "/api/user/activate",
+        json={"code": code},
+        headers={"Authorization": f"Basic {b64_auth}"},
+    )
+    assert response.status_code == 200
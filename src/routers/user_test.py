@@ -6,7 +6,7 @@ On a real prod case, those router integration tests should also mock use case ex
 import base64
 
 import pytest
-from fastapi import BackgroundTasks
+from fastapi import BackgroundTasks, Depends, FastAPI
 from fastapi.testclient import TestClient
 
 from main import app
@@ -15,11 +15,16 @@ from src.models.value_objects import Email, Password
 from src.repositories import (
     InMemoryActivationCodeRepository,
     InMemoryUserRepository,
-    get_user_repository,
+    get_user_lookup,
 )
+from src.services import auth, hashing
+from src.services.credential_cache import credential_cache
+from src.services.database import get_db
 from src.services.mail import InMemoryMailAdapter
+from src.services.rate_limiter import RATE_LIMITS
 from src.use_cases.activate_user import ActivateUser, get_activate_user_use_case
 from src.use_cases.register_user import RegisterUser, get_register_user_use_case
+from src.use_cases.register_users import RegisterUsers, get_register_users_use_case
 
 client = TestClient(app)
 
@@ -35,12 +40,21 @@ def mock_register_dependencies():
         mail_adapter,
         background_tasks,
     )
+    register_users = RegisterUsers(
+        user_repository,
+        mail_adapter,
+        background_tasks,
+    )
 
     def get_register_user():
         return register_user
 
+    def get_register_users():
+        return register_users
+
     overrides = {
         get_register_user_use_case: get_register_user,
+        get_register_users_use_case: get_register_users,
     }
 
     app.dependency_overrides.update(overrides)
@@ -73,6 +87,23 @@ def test_user_creation_validation_failure(mock_register_dependencies):
     assert content["detail"]["prop"] == "password"
 
 
+def test_user_batch_creation(mock_register_dependencies):
+    response = client.post(
+        "/api/user/batch",
+        json={
+            "users": [
+                {"email": "user@test.com", "password": "Test@123"},
+                {"email": "user.com", "password": "Test@123"},
+                {"email": "user@test.com", "password": "Test@123"},
+                {"email": "other@test.com"},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    statuses = [result["status"] for result in response.json()["results"]]
+    assert statuses == ["created", "invalid", "duplicate", "invalid"]
+
+
 @pytest.fixture
 def mock_activate_dependencies():
     activation_code_repository = InMemoryActivationCodeRepository()
@@ -83,17 +114,17 @@ def mock_activate_dependencies():
     user = User(Email(email), Password(password))
     user_repository.save_user(user)
 
-    activate_user = ActivateUser(user_repository, activation_code_repository)
+    activate_user = ActivateUser(user_repository)
 
     def get_activate_user():
         return activate_user
 
-    def get_mock_user_repository():
-        return user_repository
+    def get_mock_user_lookup():
+        return user_repository.select_by_email
 
     overrides = {
         get_activate_user_use_case: get_activate_user,
-        get_user_repository: get_mock_user_repository,
+        get_user_lookup: get_mock_user_lookup,
     }
 
     app.dependency_overrides.update(overrides)
@@ -146,3 +177,73 @@ def test_user_activate_wrong_code_failure(mock_activate_dependencies):
         headers={"Authorization": f"Basic {b64_auth}"},
     )
     assert response.status_code == 409
+
+
+def test_user_activate_auth_is_cached(mock_activate_dependencies):
+    email, password, code = mock_activate_dependencies
+    b64_auth = base64.b64encode(f"{email}:{password}".encode()).decode()
+    for _ in range(2):
+        response = client.post(
+            "/api/user/activate",
+            json={"code": "wrong_code"},
+            headers={"Authorization": f"Basic {b64_auth}"},
+        )
+        assert response.status_code == 409
+
+    assert credential_cache.stats()["hits"] == 1
+
+
+def test_cached_credentials_never_check_out_a_connection():
+    checked_out = []
+
+    def get_recorded_db():
+        checked_out.append(True)
+        yield None
+
+    auth_app = FastAPI()
+
+    @auth_app.get("/user")
+    def get_user(user: dict = Depends(auth.get_inactive_user)):
+        return user
+
+    auth_app.dependency_overrides[get_db] = get_recorded_db
+    b64_auth = base64.b64encode(b"cached@test.com:Password@123").decode()
+    user = {"id": 1, "email": "cached@test.com", "activated": False}
+    credential_cache.set(f"Basic {b64_auth}", user)
+
+    response = TestClient(auth_app).get(
+        "/user", headers={"Authorization": f"Basic {b64_auth}"}
+    )
+    assert response.status_code == 200
+    assert response.json() == user
+    assert not checked_out
+
+
+def test_user_creation_is_rate_limited_by_email(mock_register_dependencies):
+    for status_code in (201, 409, 409, 429):
+        response = client.post(
+            "/api/user/",
+            json={"email": "limited@test.com", "password": "Password@123"},
+        )
+        assert response.status_code == status_code
+
+    assert "Retry-After" in response.headers
+
+
+def test_user_activate_rate_limit_runs_before_auth(
+    mock_activate_dependencies, monkeypatch
+):
+    monkeypatch.setitem(RATE_LIMITS["activate"], "email", (1 / 60, 1))
+    email, password, code = mock_activate_dependencies
+    b64_auth = base64.b64encode(f"{email}:wrong_password".encode()).decode()
+    hashing_calls = hashing.hashing_service.stats()["calls"]
+    for status_code in (401, 429):
+        response = client.post(
+            "/api/user/activate",
+            json={"code": str(code)},
+            headers={"Authorization": f"Basic {b64_auth}"},
+        )
+        assert response.status_code == status_code
+
+    # Rejected before any password check
+    assert hashing.hashing_service.stats()["calls"] == hashing_calls + 1
@@ -1,10 +1,14 @@
 import base64
+from collections.abc import Callable
 
-import bcrypt
 from fastapi import Depends, HTTPException, Request
 
-from src.repositories import UserRepository, get_user_repository
+from src.repositories import get_async_user_lookup, get_user_lookup
 from src.repositories.exceptions import UserNotFound
+from src.services import hashing
+from src.services.concurrency import call
+from src.services.credential_cache import credential_cache
+from src.services.email_filter import email_filter
 
 
 def _parse_basic_auth(request: Request) -> dict:
@@ -16,30 +20,70 @@ def _parse_basic_auth(request: Request) -> dict:
     except:
         raise HTTPException(422, "No BASIC AUTH authentication found")
 
-    return {"email": email, "password": password}
+    return {"email": email, "password": password, "header": authorization_header}
 
 
-def _get_authenticated_user(
-    auth_data: dict = Depends(_parse_basic_auth),
-    user_repository: UserRepository = Depends(get_user_repository),
-) -> dict:
-    try:
-        user = user_repository.select_by_email(auth_data["email"])
-    except UserNotFound:
+def _parse_known_basic_auth(auth_data: dict = Depends(_parse_basic_auth)) -> dict:
+    """
+    Resolved before the repository, so an unknown email never checks out a connection.
+    """
+    if not email_filter.might_exist(auth_data["email"]):
         raise HTTPException(404, "User not found")
+    return auth_data
 
-    if not user or not bcrypt.checkpw(
-        auth_data["password"].encode(), user.get("password").encode()
-    ):
-        raise HTTPException(401, "Couldn't authenticate user")
 
-    return user
+def _cached_user(auth_data: dict = Depends(_parse_known_basic_auth)) -> dict | None:
+    """
+    User of an already verified header, found without the repository.
+    """
+    return credential_cache.get(auth_data["header"])
+
 
+def _user_not_found() -> HTTPException:
+    email_filter.record_false_positive()
+    return HTTPException(404, "User not found")
 
-def get_active_user(user: dict = Depends(_get_authenticated_user)) -> dict:
+
+def _authenticated_user(get_lookup: Callable[[], Callable]) -> Callable:
     """
-    Unused in the project, but this is the way to authenticate users 99% of time.
+    Dependency authenticating with the `select_by_email` given by `get_lookup`, the same
+    for both API modes: a sync lookup runs in the threadpool, an async one is awaited.
     """
+
+    async def get_authenticated_user(
+        auth_data: dict = Depends(_parse_known_basic_auth),
+        cached_user: dict | None = Depends(_cached_user),
+        select_user: Callable = Depends(get_lookup),
+    ) -> dict:
+        if cached_user:
+            return cached_user
+
+        try:
+            user = await call(select_user, auth_data["email"])
+        except UserNotFound:
+            raise _user_not_found()
+
+        try:
+            is_valid = user and await hashing.hashing_service.check_password_async(
+                auth_data["password"], user.get("password")
+            )
+        except hashing.HashingQueueFull as e:
+            raise HTTPException(503, e.detail)
+
+        if not is_valid:
+            raise HTTPException(401, "Couldn't authenticate user")
+
+        credential_cache.set(auth_data["header"], user)
+        return user
+
+    return get_authenticated_user
+
+
+_get_authenticated_user = _authenticated_user(get_user_lookup)
+_get_authenticated_user_async = _authenticated_user(get_async_user_lookup)
+
+
+def _ensure_active(user: dict) -> dict:
     if not user.get("activated"):
         raise HTTPException(
             status_code=403, detail="Account not activated. Please check your email."
@@ -47,10 +91,22 @@ def get_active_user(user: dict = Depends(_get_authenticated_user)) -> dict:
     return user
 
 
-def get_inactive_user(user: dict = Depends(_get_authenticated_user)) -> dict:
-    """
-    Special auth route for users not activated yet (should only be used for /activate route)
-    """
+def _ensure_inactive(user: dict) -> dict:
     if user.get("activated"):
         raise HTTPException(status_code=400, detail="Account is already activated")
     return user
+
+
+def _checked_user(get_user: Callable, check: Callable[[dict], dict]) -> Callable:
+    async def get_checked_user(user: dict = Depends(get_user)) -> dict:
+        return check(user)
+
+    return get_checked_user
+
+
+# Unused in the project, but this is the way to authenticate users 99% of time
+get_active_user = _checked_user(_get_authenticated_user, _ensure_active)
+# Special auth for users not activated yet (should only be used for /activate route)
+get_inactive_user = _checked_user(_get_authenticated_user, _ensure_inactive)
+get_active_user_async = _checked_user(_get_authenticated_user_async, _ensure_active)
+get_inactive_user_async = _checked_user(_get_authenticated_user_async, _ensure_inactive)
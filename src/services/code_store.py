@@ -0,0 +1,385 @@
+import array
+import math
+import os
+import threading
+import time
+from collections.abc import Callable
+from datetime import timedelta
+from pathlib import Path
+
+from src.services.database import SHARDED_MODE
+
+# Each level of the wheel has 2**SLOT_BITS slots
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+
+# An entry is one int: expiry in ms above the code (4 digits, see ActivationCode)
+_CODE_BITS = 14
+_CODE_MASK = (1 << _CODE_BITS) - 1
+
+# Followed by native (user id, entry) int64 pairs
+_SNAPSHOT_HEADER = b"ACS1"
+
+
+def _pack(code: str, expires_at: float) -> int:
+    value = int(code)
+    if str(value) != code or value > _CODE_MASK:
+        raise ValueError(f"Activation code {code!r} doesn't fit in {_CODE_BITS} bits")
+    return round(expires_at * 1000) << _CODE_BITS | value
+
+
+def _expires_at(entry: int) -> float:
+    return (entry >> _CODE_BITS) / 1000
+
+
+class CodeStore:
+    """
+    Activation codes by user id in process memory, expired by a hierarchical timing wheel:
+    `levels` wheels of SLOTS slots of `resolution` seconds, 64 times coarser each, an
+    overflow set beyond. An entry sits in the slot of the first level whose round contains
+    its deadline tick, slots of a higher level cascade down when their round starts. A
+    bitmap per level marks its non-empty slots, so insert, lookup and expiry are O(1), and
+    finding the next slot to expire or evict O(levels), with no scan nor sorted structure.
+
+    Codes are kept `keep_expired` after their expiry (so a late attempt gets CodeExpired),
+    at most `max_size` of them, the closest to their deadline evicted first.
+    Entries survive a restart through `snapshot_path`, written every `snapshot_interval`
+    seconds and on `stop`.
+    """
+
+    __max_size: int
+    __resolution: float
+    __levels: int
+    __keep_expired: float
+    __clock: Callable[[], float]
+    __entries: dict[int, int]
+    __wheels: list[list[set[int]]]
+    __occupied: list[int]
+    __overflow: set[int]
+    __tick: int
+    __expired: int
+    __evicted: int
+    __snapshot_path: Path | None
+    __snapshot_interval: float
+    __last_snapshot: dict
+    __lock: threading.Lock
+    __stop: threading.Event
+    __thread: threading.Thread | None
+
+    def __init__(
+        self,
+        max_size: int = 1_000_000,
+        resolution: float = 1.0,
+        levels: int = 4,
+        keep_expired: timedelta = timedelta(minutes=1),
+        snapshot_path: str | None = None,
+        snapshot_interval: float = 10,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.__max_size = max_size
+        self.__resolution = resolution
+        self.__levels = levels
+        self.__keep_expired = keep_expired.total_seconds()
+        # Wall clock: expiries in a snapshot stay right across restarts
+        self.__clock = clock
+        self.__entries = {}
+        self.__wheels = [[set() for _ in range(SLOTS)] for _ in range(levels)]
+        # Bit i of level n set when its slot i holds entries
+        self.__occupied = [0] * levels
+        self.__overflow = set()
+        self.__tick = int(clock() / resolution)
+        self.__expired = 0
+        self.__evicted = 0
+        self.__snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.__snapshot_interval = snapshot_interval
+        self.__last_snapshot = {}
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def put(self, user_id: int, code: str, ttl: timedelta) -> None:
+        """
+        Replaces the code of `user_id`, valid for `ttl`.
+        """
+        with self.__lock:
+            now = self.__advance()
+            self.__delete(user_id)
+            if len(self.__entries) >= self.__max_size:
+                self.__evict()
+            self.__insert(user_id, _pack(code, now + ttl.total_seconds()))
+
+    def get(self, user_id: int) -> tuple[str, bool] | None:
+        """
+        (code, still valid) of `user_id`, None without code.
+        """
+        with self.__lock:
+            now = self.__advance()
+            entry = self.__entries.get(user_id)
+            if entry is None:
+                return None
+            return str(entry & _CODE_MASK), _expires_at(entry) > now
+
+    def consume(self, user_id: int, code: str) -> float | bool | None:
+        """
+        Deletes the code of `user_id` when it's `code` and still valid. Its expiry (for
+        `restore`) when deleted, False when expired, None when `user_id` has no such code.
+        """
+        with self.__lock:
+            now = self.__advance()
+            entry = self.__entries.get(user_id)
+            if entry is None or str(entry & _CODE_MASK) != code:
+                return None
+            if _expires_at(entry) <= now:
+                return False
+            self.__delete(user_id)
+            return _expires_at(entry)
+
+    def restore(self, user_id: int, code: str, expires_at: float) -> None:
+        """
+        Puts back a consumed code, unless `user_id` got another one or it's past its
+        deadline meanwhile.
+        """
+        with self.__lock:
+            self.__advance()
+            entry = _pack(code, expires_at)
+            if user_id in self.__entries or self.__deadline(entry) <= self.__tick:
+                return
+            if len(self.__entries) >= self.__max_size:
+                self.__evict()
+            self.__insert(user_id, entry)
+
+    def delete(self, user_id: int) -> None:
+        with self.__lock:
+            self.__advance()
+            self.__delete(user_id)
+
+    def snapshot(self) -> int:
+        """
+        Writes the entries to `snapshot_path` (replaced atomically), returns their count.
+        """
+        with self.__lock:
+            self.__advance()
+            items = list(self.__entries.items())
+        start = time.perf_counter()
+        pairs = array.array("q", [value for item in items for value in item])
+        temporary = self.__snapshot_path.with_name(self.__snapshot_path.name + ".tmp")
+        with open(temporary, "wb") as file:
+            file.write(_SNAPSHOT_HEADER)
+            pairs.tofile(file)
+        os.replace(temporary, self.__snapshot_path)
+        self.__last_snapshot = {
+            "entries": len(items),
+            "duration_ms": (time.perf_counter() - start) * 1000,
+        }
+        return len(items)
+
+    def load(self) -> int:
+        """
+        Adds the entries of `snapshot_path` still kept, returns their count.
+        A missing or unreadable snapshot loads nothing.
+        """
+        try:
+            data = self.__snapshot_path.read_bytes()
+        except FileNotFoundError:
+            return 0
+        pairs = array.array("q")
+        if not data.startswith(_SNAPSHOT_HEADER) or (
+            (len(data) - len(_SNAPSHOT_HEADER)) % (2 * pairs.itemsize)
+        ):
+            print(
+                f"Ignored activation code snapshot {self.__snapshot_path}", flush=True
+            )
+            return 0
+        pairs.frombytes(data[len(_SNAPSHOT_HEADER) :])
+
+        loaded = 0
+        with self.__lock:
+            self.__advance()
+            for user_id, entry in zip(pairs[::2], pairs[1::2]):
+                if len(self.__entries) >= self.__max_size:
+                    break
+                if self.__deadline(entry) > self.__tick:
+                    self.__delete(user_id)
+                    self.__insert(user_id, entry)
+                    loaded += 1
+        return loaded
+
+    def start(self) -> None:
+        if not self.__snapshot_path:
+            return
+        print(f"Activation codes loaded from snapshot: {self.load()}", flush=True)
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, name="code-store-snapshot", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        if not self.__thread:
+            return
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+        self.snapshot()
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            for wheel in self.__wheels:
+                for slot in wheel:
+                    slot.clear()
+            self.__occupied = [0] * self.__levels
+            self.__overflow.clear()
+            self.__expired = 0
+            self.__evicted = 0
+
+    def stats(self) -> dict:
+        with self.__lock:
+            self.__advance()
+            return {
+                "size": len(self.__entries),
+                "max_size": self.__max_size,
+                "expired": self.__expired,
+                "evicted": self.__evicted,
+                "last_snapshot": dict(self.__last_snapshot),
+            }
+
+    def __run(self) -> None:
+        while not self.__stop.wait(self.__snapshot_interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                # The previous snapshot is left in place, the next one retries
+                print(f"Activation code snapshot failed: {e!r}", flush=True)
+
+    def __deadline(self, entry: int) -> int:
+        """
+        Tick at which the wheel drops `entry`.
+        """
+        return math.ceil((_expires_at(entry) + self.__keep_expired) / self.__resolution)
+
+    def __locate(self, deadline: int) -> tuple[int, int] | None:
+        """
+        (level, slot index) of a deadline, None for the overflow set.
+        """
+        # Lowest level whose current round contains the deadline
+        for level in range(self.__levels):
+            round_bits = SLOT_BITS * (level + 1)
+            if deadline >> round_bits == self.__tick >> round_bits:
+                return level, deadline >> SLOT_BITS * level & SLOTS - 1
+        return None
+
+    def __add(self, user_id: int, deadline: int) -> None:
+        location = self.__locate(deadline)
+        if location is None:
+            self.__overflow.add(user_id)
+            return
+        level, index = location
+        self.__wheels[level][index].add(user_id)
+        self.__occupied[level] |= 1 << index
+
+    def __insert(self, user_id: int, entry: int) -> None:
+        self.__entries[user_id] = entry
+        self.__add(user_id, self.__deadline(entry))
+
+    def __delete(self, user_id: int) -> None:
+        entry = self.__entries.pop(user_id, None)
+        if entry is None:
+            return
+        location = self.__locate(self.__deadline(entry))
+        if location is None:
+            self.__overflow.discard(user_id)
+            return
+        level, index = location
+        slot = self.__wheels[level][index]
+        slot.discard(user_id)
+        if not slot:
+            self.__occupied[level] &= ~(1 << index)
+
+    def __next_slot(self, level: int) -> int | None:
+        """
+        Index of the first non-empty slot after the current one on `level`.
+        """
+        current = self.__tick >> SLOT_BITS * level & SLOTS - 1
+        later = self.__occupied[level] >> current + 1 << current + 1
+        return (later & -later).bit_length() - 1 if later else None
+
+    def __evict(self) -> None:
+        # Slots after the current one hold later deadlines, level by level
+        for level, wheel in enumerate(self.__wheels):
+            index = self.__next_slot(level)
+            if index is not None:
+                slot = wheel[index]
+                del self.__entries[slot.pop()]
+                if not slot:
+                    self.__occupied[level] &= ~(1 << index)
+                self.__evicted += 1
+                return
+        if self.__overflow:
+            del self.__entries[self.__overflow.pop()]
+            self.__evicted += 1
+
+    def __advance(self) -> float:
+        """
+        Expires the entries of every tick up to now, returns now. Never goes back with the
+        clock, the entries would be looked for in the wrong slots.
+        """
+        now = max(self.__clock(), self.__tick * self.__resolution)
+        tick = int(now / self.__resolution)
+        while self.__tick < tick:
+            # Straight to the next tick with entries to expire or cascade
+            self.__tick = min(self.__next_event(), tick + 1) - 1
+            if self.__tick == tick:
+                break
+            self.__tick += 1
+            self.__cascade()
+            index = self.__tick & SLOTS - 1
+            slot = self.__wheels[0][index]
+            for user_id in slot:
+                del self.__entries[user_id]
+            self.__expired += len(slot)
+            slot.clear()
+            self.__occupied[0] &= ~(1 << index)
+        return now
+
+    def __next_event(self) -> float:
+        # Lower levels hold the earlier deadlines, each in the slots after its current one
+        for level in range(self.__levels):
+            index = self.__next_slot(level)
+            if index is not None:
+                shift = SLOT_BITS * level
+                return (self.__tick >> shift + SLOT_BITS << SLOT_BITS | index) << shift
+        if self.__overflow:
+            top_bits = SLOT_BITS * self.__levels
+            return (self.__tick >> top_bits) + 1 << top_bits
+        return math.inf
+
+    def __cascade(self) -> None:
+        # A round starting at this tick on level n brings its slot's entries lower
+        cascaded = []
+        for level in range(1, self.__levels + 1):
+            if self.__tick & (1 << SLOT_BITS * level) - 1:
+                break
+            if level == self.__levels:
+                slot = self.__overflow
+            else:
+                index = self.__tick >> SLOT_BITS * level & SLOTS - 1
+                slot = self.__wheels[level][index]
+                self.__occupied[level] &= ~(1 << index)
+            cascaded += slot
+            slot.clear()
+        for user_id in cascaded:
+            self.__add(user_id, self.__deadline(self.__entries[user_id]))
+
+
+# "database" stores activation codes next to their users, "memory" in this process'
+# CodeStore: no database round trip, but for a single app process only, and codes written
+# since the last snapshot are lost on a crash. Sharded nodes keep their codes.
+ACTIVATION_CODE_STORE = os.getenv("ACTIVATION_CODE_STORE", "database")
+CODE_STORE_ENABLED = ACTIVATION_CODE_STORE == "memory" and not SHARDED_MODE
+
+code_store = CodeStore(
+    max_size=int(os.getenv("ACTIVATION_CODE_STORE_MAX_SIZE", "1000000")),
+    snapshot_path=os.getenv("ACTIVATION_CODE_SNAPSHOT"),
+    snapshot_interval=float(os.getenv("ACTIVATION_CODE_SNAPSHOT_INTERVAL", "10")),
+)
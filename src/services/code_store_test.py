@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+import pytest
+
+from src.services.code_store import SLOTS, CodeStore
+
+START = 1_700_000_000.0
+TTL = timedelta(seconds=60)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = START
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_code_is_consumed_once_and_expires(clock):
+    store = CodeStore(keep_expired=timedelta(seconds=30), clock=clock)
+    store.put(1, "1234", TTL)
+
+    assert store.get(1) == ("1234", True)
+    assert store.consume(1, "4321") is None
+    assert store.consume(1, "1234") == START + 60
+    assert store.consume(1, "1234") is None
+    # Put back as it was, e.g. when the activation rolled back
+    store.restore(1, "1234", START + 60)
+    assert store.get(1) == ("1234", True)
+    assert store.consume(1, "1234") == START + 60
+
+    store.put(1, "5678", TTL)
+    clock.now += 61
+    # Kept a while once expired, then dropped by the wheel
+    assert store.get(1) == ("5678", False)
+    assert store.consume(1, "5678") is False
+    clock.now += 30
+    assert store.get(1) is None
+    assert store.stats()["expired"] == 1
+
+
+def test_entries_expire_at_their_deadline_on_every_level(clock):
+    # Level 0 spans 64 s, level 1 ~68 min, beyond is the overflow set
+    store = CodeStore(levels=2, keep_expired=timedelta(0), clock=clock)
+    ttls = [1, 10, 63, 64, 65, 500, 4095, 4096, 5000, 20000]
+    for user_id, ttl in enumerate(ttls):
+        store.put(user_id, "1234", timedelta(seconds=ttl))
+
+    for user_id, ttl in enumerate(ttls):
+        clock.now = START + ttl - 0.5
+        assert store.get(user_id) == ("1234", True), ttl
+        clock.now = START + ttl + 0.5
+        assert store.get(user_id) is None, ttl
+    assert store.stats()["size"] == 0
+    assert store.stats()["expired"] == len(ttls)
+
+
+def test_full_store_evicts_the_closest_deadline(clock):
+    store = CodeStore(max_size=3, clock=clock)
+    store.put(1, "1111", timedelta(seconds=SLOTS * 3))
+    store.put(2, "2222", timedelta(seconds=10))
+    store.put(3, "3333", timedelta(seconds=SLOTS * 2))
+    store.put(4, "4444", TTL)
+
+    assert store.get(2) is None
+    assert [store.get(user_id)[0] for user_id in (1, 3, 4)] == ["1111", "3333", "4444"]
+    assert store.stats()["evicted"] == 1
+
+
+def test_snapshot_keeps_pending_codes_across_restarts(clock, tmp_path):
+    path = tmp_path / "codes.snapshot"
+    snapshot_path = str(path)
+    store = CodeStore(snapshot_path=snapshot_path, clock=clock)
+    store.put(1, "1234", TTL)
+    store.put(2, "5678", timedelta(seconds=5))
+    assert store.snapshot() == 2
+
+    clock.now += 30
+    restarted = CodeStore(
+        snapshot_path=snapshot_path, keep_expired=timedelta(seconds=10), clock=clock
+    )
+    # The second code went past its expiry and its grace while "down"
+    assert restarted.load() == 1
+    assert restarted.consume(1, "1234")
+    assert restarted.get(2) is None
+
+    path.write_bytes(b"garbage")
+    assert CodeStore(snapshot_path=snapshot_path, clock=clock).load() == 0
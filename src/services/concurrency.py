@@ -0,0 +1,14 @@
+import inspect
+from collections.abc import Callable
+
+from fastapi.concurrency import run_in_threadpool
+
+
+async def call(function: Callable, *args):
+    """
+    Awaits `function` when it is async, runs it in the threadpool otherwise, as FastAPI
+    does for sync routes: one route or dependency serves both API modes.
+    """
+    if inspect.iscoroutinefunction(function):
+        return await function(*args)
+    return await run_in_threadpool(function, *args)
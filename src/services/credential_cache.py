@@ -0,0 +1,96 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class CredentialCache:
+    """
+    LRU + TTL cache of verified Basic auth headers.
+    Keys are an HMAC of the header so no credential is kept in memory in clear.
+    """
+
+    __secret: bytes
+    __ttl: float
+    __max_size: int
+    __entries: OrderedDict
+    __keys_by_user: dict
+    __hits: int
+    __misses: int
+    __lock: threading.Lock
+
+    def __init__(self, ttl: float = 30, max_size: int = 10_000, secret: bytes = b""):
+        self.__secret = secret or os.urandom(32)
+        self.__ttl = ttl
+        self.__max_size = max_size
+        self.__entries = OrderedDict()
+        self.__keys_by_user = {}
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = threading.Lock()
+
+    def get(self, authorization: str) -> dict | None:
+        key = self.__key(authorization)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self.__remove(key)
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return dict(entry[1])
+
+    def set(self, authorization: str, user: dict) -> None:
+        if self.__max_size <= 0:
+            return
+        key = self.__key(authorization)
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            self.__entries[key] = (time.monotonic() + self.__ttl, dict(user))
+            self.__keys_by_user.setdefault(user.get("id"), set()).add(key)
+            while len(self.__entries) > self.__max_size:
+                self.__remove(next(iter(self.__entries)))
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self.__lock:
+            for key in self.__keys_by_user.pop(user_id, ()):
+                self.__entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.__keys_by_user.clear()
+            self.__hits = 0
+            self.__misses = 0
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                "size": len(self.__entries),
+                "max_size": self.__max_size,
+                "hits": self.__hits,
+                "misses": self.__misses,
+            }
+
+    def __key(self, authorization: str) -> bytes:
+        return hmac.digest(self.__secret, authorization.encode(), hashlib.sha256)
+
+    def __remove(self, key: bytes) -> None:
+        _, user = self.__entries.pop(key)
+        keys = self.__keys_by_user.get(user.get("id"))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.__keys_by_user[user.get("id")]
+
+
+credential_cache = CredentialCache(
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "30")),
+    max_size=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    secret=os.getenv("AUTH_CACHE_SECRET", "").encode(),
+)
@@ -0,0 +1,47 @@
+import time
+
+from src.services.credential_cache import CredentialCache
+
+USER = {"id": 1, "email": "user@test.com", "activated": False}
+
+
+def test_credential_cache_hit_and_miss():
+    cache = CredentialCache()
+
+    assert cache.get("Basic abc") is None
+    cache.set("Basic abc", USER)
+    assert cache.get("Basic abc") == USER
+    assert cache.get("Basic other") is None
+    assert cache.stats() == {"size": 1, "max_size": 10_000, "hits": 1, "misses": 2}
+
+
+def test_credential_cache_expires(monkeypatch):
+    cache = CredentialCache(ttl=30)
+    cache.set("Basic abc", USER)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 31)
+    assert cache.get("Basic abc") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_credential_cache_evicts_least_recently_used():
+    cache = CredentialCache(max_size=2)
+    cache.set("Basic a", {**USER, "id": 1})
+    cache.set("Basic b", {**USER, "id": 2})
+    cache.get("Basic a")
+    cache.set("Basic c", {**USER, "id": 3})
+
+    assert cache.get("Basic b") is None
+    assert cache.get("Basic a") is not None
+    assert cache.get("Basic c") is not None
+
+
+def test_credential_cache_invalidate_user():
+    cache = CredentialCache()
+    cache.set("Basic a", USER)
+    cache.set("Basic b", {**USER, "id": 2})
+
+    cache.invalidate_user(1)
+    assert cache.get("Basic a") is None
+    assert cache.get("Basic b") is not None
@@ -1,27 +1,300 @@
 import os
+import threading
+import time
+from collections.abc import Callable
+from weakref import WeakKeyDictionary
 
 import psycopg_pool
-from psycopg import Connection
+from psycopg import AsyncConnection, Connection
+
+from src.services import metrics, migrations
+from src.services.sharding import ShardedDatabase, ShardMap
+from src.services.sqlite import SQLiteDatabase
 
 DB_LOGIN = os.getenv("DB_LOGIN")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+# "postgres", or "sqlite" for a single node without a database server (SQLITE_PATH)
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres")
+SQLITE_MODE = DB_BACKEND == "sqlite"
+
+# JSON shard map (see ShardMap): users are spread over several Postgres nodes instead of DB_URL
+DB_SHARD_MAP = os.getenv("DB_SHARD_MAP")
+SHARDED_MODE = bool(DB_SHARD_MAP) and not SQLITE_MODE
+
+# "async" serves routes from the event loop on an AsyncConnectionPool, "sync" from the threadpool.
+# SQLite and sharded repositories are sync only.
+API_MODE = os.getenv("API_MODE", "sync")
+ASYNC_MODE = API_MODE == "async" and not SQLITE_MODE and not SHARDED_MODE
+if API_MODE == "async" and not ASYNC_MODE:
+    print(
+        f"API_MODE=async ignored, {'sqlite' if SQLITE_MODE else 'sharded'} mode is sync only",
+        flush=True,
+    )
+# Schema migrations run by the app lifespan, otherwise with `python3 -m src.cli migrate`
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true") == "true"
+
+# Wait for the `min_size` connections at startup (opened in parallel), else warm up in background.
+DB_PREWARM = os.getenv("DB_PREWARM", "true") == "true"
+
 # Connection pool instead of atomic for a more prod-ready setup.
+# Created closed: importing this module never touches the DB, `open_pools` does.
 pool = psycopg_pool.ConnectionPool(
-    conninfo=os.getenv("DB_URL"), min_size=4, max_size=20, timeout=30, open=True
+    conninfo=os.getenv("DB_URL"),
+    min_size=4,
+    max_size=20,
+    timeout=30,
+    num_workers=4,
+    open=False,
+)
+
+
+# Streaming replica serving reads (see ReplicaRouter), unset to read from the primary only
+DB_REPLICA_URL = os.getenv("DB_REPLICA_URL")
+REPLICA_ENABLED = bool(DB_REPLICA_URL) and not SQLITE_MODE and not SHARDED_MODE
+
+# Never waited for: a replica down at startup only means reads go to the primary
+replica_pool = psycopg_pool.ConnectionPool(
+    conninfo=DB_REPLICA_URL,
+    min_size=2,
+    max_size=20,
+    timeout=5,
+    num_workers=2,
+    open=False,
+)
+
+# Seconds behind the primary, 0 when caught up (or not a standby, e.g. in tests)
+_REPLICA_LAG = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+db_reads = metrics.registry.register(
+    metrics.Counter("db_reads_total", "Routed reads by target", ("target",))
+)
+
+
+class ReplicaRouter:
+    """
+    Read routing policy: reads go to the replica, unless its lag (checked every
+    `check_interval`) is unknown or above `max_lag` seconds, or the user was written less
+    than `sticky_for` seconds ago. Reads right after a write stay on the primary, so
+    e.g. activation never reads a user the replica hasn't replayed yet.
+    """
+
+    pool: psycopg_pool.ConnectionPool
+    __max_lag: float
+    __sticky_for: float
+    __check_interval: float
+    __lag: float | None
+    __recent_emails: dict
+    __recent_ids: dict
+    __lock: threading.Lock
+    __stop: threading.Event
+    __thread: threading.Thread | None
+
+    def __init__(
+        self,
+        pool: psycopg_pool.ConnectionPool,
+        max_lag: float = 1,
+        sticky_for: float = 5,
+        check_interval: float = 1,
+    ):
+        self.pool = pool
+        self.__max_lag = max_lag
+        # Past max_lag, a healthy replica has replayed the write
+        self.__sticky_for = max(sticky_for, max_lag)
+        self.__check_interval = check_interval
+        self.__lag = None
+        self.__recent_emails = {}
+        self.__recent_ids = {}
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def mark_written(
+        self, email: str | None = None, user_id: int | None = None
+    ) -> None:
+        expires = time.monotonic() + self.__sticky_for
+        with self.__lock:
+            for recent, key in (
+                (self.__recent_emails, email),
+                (self.__recent_ids, user_id),
+            ):
+                _prune(recent)
+                if key is not None:
+                    # Reinserted at the end: entries stay ordered by expiry
+                    recent.pop(key, None)
+                    recent[key] = expires
+
+    def use_replica(self, email: str) -> bool:
+        if self.__lag is None or self.__lag > self.__max_lag:
+            return False
+        return not self.__is_recent(self.__recent_emails, email)
+
+    def written_recently(self, user_id: int) -> bool:
+        return self.__is_recent(self.__recent_ids, user_id)
+
+    def replica_failed(self) -> None:
+        """
+        Back to the primary until the next successful lag check.
+        """
+        self.__lag = None
+
+    def check_lag(self) -> float | None:
+        try:
+            with self.pool.connection() as conn:
+                self.__lag = float(conn.execute(_REPLICA_LAG).fetchone()[0])
+        except Exception:
+            self.__lag = None
+        return self.__lag
+
+    def start(self) -> None:
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, name="replica-lag", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def stats(self) -> dict:
+        return {
+            "lag_s": self.__lag,
+            "max_lag_s": self.__max_lag,
+            "sticky": len(self.__recent_emails) + len(self.__recent_ids),
+            "replica_reads": db_reads.value("replica"),
+            "primary_reads": db_reads.value("primary"),
+        }
+
+    def __is_recent(self, recent: dict, key) -> bool:
+        expires = recent.get(key)
+        return expires is not None and expires > time.monotonic()
+
+    def __run(self) -> None:
+        while not self.__stop.is_set():
+            self.check_lag()
+            self.__stop.wait(self.__check_interval)
+
+
+def _prune(recent: dict) -> None:
+    now = time.monotonic()
+    while recent:
+        oldest = next(iter(recent))
+        if recent[oldest] > now:
+            break
+        del recent[oldest]
+
+
+replica_router = ReplicaRouter(
+    replica_pool,
+    max_lag=float(os.getenv("DB_REPLICA_MAX_LAG", "1")),
+    sticky_for=float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5")),
 )
 
 
+# Callbacks waiting for the end of a request transaction, by connection: (on commit,
+# on rollback) lists (see get_db)
+_commit_callbacks: WeakKeyDictionary = WeakKeyDictionary()
+_commit_callbacks_lock = threading.Lock()
+
+
+def after_commit(conn, callback: Callable[[], None]) -> None:
+    """
+    Runs `callback` once the request transaction of `conn` commits, not at all if it rolls
+    back. E.g. cache invalidations: done earlier, a concurrent request could cache the rows
+    they replace again before the commit. Runs right away on a connection not from get_db.
+    """
+    with _commit_callbacks_lock:
+        callbacks = _commit_callbacks.get(conn)
+        if callbacks is not None:
+            callbacks[0].append(callback)
+            return
+    callback()
+
+
+def after_rollback(conn, callback: Callable[[], None]) -> None:
+    """
+    Runs `callback` if the request transaction of `conn` rolls back, e.g. to undo a change
+    made outside the database. Never runs on a connection not from get_db.
+    """
+    with _commit_callbacks_lock:
+        callbacks = _commit_callbacks.get(conn)
+        if callbacks is not None:
+            callbacks[1].append(callback)
+
+
+def _begin_request(conn) -> None:
+    with _commit_callbacks_lock:
+        _commit_callbacks[conn] = ([], [])
+
+
+def _end_request(conn, committed: bool) -> list[Callable[[], None]]:
+    with _commit_callbacks_lock:
+        on_commit, on_rollback = _commit_callbacks.pop(conn, ([], []))
+    return on_commit if committed else on_rollback
+
+
 def get_db():
     conn = pool.getconn()
+    _begin_request(conn)
+    committed = False
     try:
         yield conn
         conn.commit()
+        committed = True
     except Exception:
         conn.rollback()
         raise
     finally:
+        # Not committed on exit is rolled back, by the pool if not above
+        callbacks = _end_request(conn, committed)
         pool.putconn(conn)
+        for callback in callbacks:
+            callback()
+
+
+# Opened by the app lifespan, an async pool needs a running event loop.
+async_pool = psycopg_pool.AsyncConnectionPool(
+    conninfo=os.getenv("DB_URL"),
+    min_size=4,
+    max_size=20,
+    timeout=30,
+    num_workers=4,
+    open=False,
+)
+
+
+# Opened by the app lifespan when SQLITE_MODE, migrations included
+sqlite_db = SQLiteDatabase(os.getenv("SQLITE_PATH", "./data/users.sqlite3"))
+
+# Opened by `open_pools` instead of the main pool when SHARDED_MODE
+sharded_db = ShardedDatabase(ShardMap.load(DB_SHARD_MAP)) if SHARDED_MODE else None
+
+
+async def get_async_db():
+    conn = await async_pool.getconn()
+    _begin_request(conn)
+    committed = False
+    try:
+        yield conn
+        await conn.commit()
+        committed = True
+    except Exception:
+        await conn.rollback()
+        raise
+    finally:
+        callbacks = _end_request(conn, committed)
+        await async_pool.putconn(conn)
+        for callback in callbacks:
+            callback()
 
 
 def _check_db_connection(conn: Connection):
@@ -29,40 +302,113 @@ def _check_db_connection(conn: Connection):
         cur.execute("SELECT version();")
         version = cur.fetchone()
         print("PostgreSQL version:", version[0])
+    conn.commit()
 
 
-def _initialize_db(conn: Connection):
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-CREATE TABLE IF NOT EXISTS users (
-    id          BIGSERIAL           PRIMARY KEY,
-    email       VARCHAR(255)        NOT NULL UNIQUE,
-    password    VARCHAR(255)        NOT NULL,
-    activated   BOOLEAN             NOT NULL DEFAULT FALSE,
-    created_at  TIMESTAMPTZ         NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
-CREATE TABLE IF NOT EXISTS activation_code (
-    id BIGSERIAL PRIMARY KEY,
-    user_id BIGINT NOT NULL,
-    code VARCHAR(4) NOT NULL,
-    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    CONSTRAINT fk_user
-        FOREIGN KEY (user_id)
-        REFERENCES users(id)
-        ON DELETE CASCADE
-);
-"""
+def run_migrations() -> list[int]:
+    if SHARDED_MODE:
+        applied = set()
+        for node in sharded_db.pools:
+            with sharded_db.connection(node) as conn:
+                applied.update(migrations.migrate(conn))
+        return sorted(applied)
+    with pool.connection() as conn:
+        return migrations.migrate(conn)
+
+
+def open_pools(prewarm: bool = DB_PREWARM) -> None:
+    if SHARDED_MODE:
+        try:
+            sharded_db.open(wait=prewarm)
+            for node in sharded_db.pools:
+                with sharded_db.connection(node) as conn:
+                    _check_db_connection(conn)
+        except:
+            raise Exception("Error initializing sharded database")
+        return
+    try:
+        pool.open(wait=prewarm)
+        with pool.connection() as conn:
+            _check_db_connection(conn)
+    except:
+        # Override Exception to avoid any secrets logged
+        raise Exception("Error initializing database")
+    if REPLICA_ENABLED:
+        replica_pool.open(wait=False)
+
+
+async def open_async_pool(prewarm: bool = DB_PREWARM) -> None:
+    await async_pool.open(wait=prewarm)
+
+
+def close_pools() -> None:
+    if SHARDED_MODE:
+        sharded_db.close()
+        return
+    if REPLICA_ENABLED:
+        replica_pool.close()
+    pool.close()
+
+
+async def close_async_pool() -> None:
+    await async_pool.close()
+
+
+def _is_warm(stats: dict) -> bool:
+    # connections_num counts the attempts, failed ones included
+    opened = stats.get("connections_num", 0) - stats.get("connections_errors", 0)
+    return opened >= stats["pool_min"]
+
+
+def is_ready() -> bool:
+    if SQLITE_MODE:
+        return sqlite_db.is_open
+    if SHARDED_MODE:
+        return sharded_db.is_open and all(
+            _is_warm(shard_pool.get_stats()) for shard_pool in sharded_db.pools.values()
         )
-        conn.commit()
+    if pool.closed or not _is_warm(pool.get_stats()):
+        return False
+    if ASYNC_MODE:
+        return not async_pool.closed and _is_warm(async_pool.get_stats())
+    return True
+
+
+def _pool_stats(key: str, scale: float) -> dict[tuple, float]:
+    pools = {"sync": pool, "async": async_pool} if ASYNC_MODE else {"sync": pool}
+    if REPLICA_ENABLED:
+        pools["replica"] = replica_pool
+    if SHARDED_MODE:
+        pools = {
+            f"shard_{node}": shard_pool for node, shard_pool in sharded_db.pools.items()
+        }
+    return {
+        (name,): db_pool.get_stats().get(key, 0) * scale
+        for name, db_pool in pools.items()
+        if not db_pool.closed
+    }
+
 
+def _register_pool_metric(
+    name: str, key: str, help: str, type: str = "gauge", scale: float = 1
+) -> None:
+    metrics.registry.register(
+        metrics.Gauges(name, help, ("pool",), lambda: _pool_stats(key, scale), type)
+    )
 
-conn = pool.getconn()
-try:
-    _check_db_connection(conn)
-    _initialize_db(conn)
-except:
-    # Override Exception to avoid any secrets logged
-    raise Exception("Error initializing database")
-finally:
-    pool.putconn(conn)
+
+_register_pool_metric("db_pool_size", "pool_size", "Connections open in the pool")
+_register_pool_metric("db_pool_idle", "pool_available", "Idle connections")
+_register_pool_metric(
+    "db_pool_waiting", "requests_waiting", "Clients waiting for a connection"
+)
+_register_pool_metric(
+    "db_pool_requests_total", "requests_num", "Connections requested", "counter"
+)
+_register_pool_metric(
+    "db_pool_wait_seconds_total",
+    "requests_wait_ms",
+    "Time spent waiting for a connection",
+    "counter",
+    scale=1 / 1000,
+)
@@ -0,0 +1,183 @@
+import os
+import time
+from contextlib import contextmanager
+
+import psycopg
+import psycopg_pool
+import pytest
+
+from src.models import User
+from src.models.value_objects import Email, Password
+from src.repositories.activation_code import DatabaseActivationCodeRepository
+from src.repositories.user import DatabaseUserRepository
+from src.services import database
+from src.services.database import (
+    ReplicaRouter,
+    after_commit,
+    after_rollback,
+    db_reads,
+)
+
+
+class _LaggingPool:
+    """Replica pool whose lag check returns `lag`, or fails when None"""
+
+    def __init__(self, lag: float | None):
+        self.lag = lag
+
+    @contextmanager
+    def connection(self):
+        if self.lag is None:
+            raise psycopg.OperationalError("replica down")
+        yield self
+
+    def execute(self, query):
+        return self
+
+    def fetchone(self):
+        return (self.lag,)
+
+
+class _RequestConnection:
+    """Pool and its connection, recording the transaction events"""
+
+    def __init__(self):
+        self.events = []
+
+    def getconn(self):
+        return self
+
+    def putconn(self, conn):
+        pass
+
+    def commit(self):
+        self.events.append("commit")
+
+    def rollback(self):
+        self.events.append("rollback")
+
+
+def test_after_commit_waits_for_the_request_commit(monkeypatch):
+    conn = _RequestConnection()
+    monkeypatch.setattr(database, "pool", conn)
+
+    request = database.get_db()
+    assert next(request) is conn
+    after_commit(conn, lambda: conn.events.append("callback"))
+    assert conn.events == []
+    with pytest.raises(StopIteration):
+        next(request)
+    assert conn.events == ["commit", "callback"]
+
+    conn.events.clear()
+    request = database.get_db()
+    next(request)
+    after_commit(conn, lambda: conn.events.append("callback"))
+    with pytest.raises(ValueError):
+        request.throw(ValueError())
+    assert conn.events == ["rollback"]
+
+    # Outside a request, nothing to wait for
+    after_commit(conn, lambda: conn.events.append("callback"))
+    assert conn.events == ["rollback", "callback"]
+
+
+def test_after_rollback_runs_only_when_the_request_rolls_back(monkeypatch):
+    conn = _RequestConnection()
+    monkeypatch.setattr(database, "pool", conn)
+
+    request = database.get_db()
+    next(request)
+    after_rollback(conn, lambda: conn.events.append("undo"))
+    with pytest.raises(StopIteration):
+        next(request)
+    assert conn.events == ["commit"]
+
+    request = database.get_db()
+    next(request)
+    after_rollback(conn, lambda: conn.events.append("undo"))
+    with pytest.raises(ValueError):
+        request.throw(ValueError())
+    assert conn.events == ["commit", "rollback", "undo"]
+
+
+def test_failed_connection_attempts_do_not_warm_a_pool(tmp_path):
+    unreachable = psycopg_pool.ConnectionPool(
+        f"host={tmp_path} dbname=missing", min_size=1, open=False
+    )
+    unreachable.open(wait=False)
+    try:
+        deadline = time.monotonic() + 5
+        while not unreachable.get_stats().get("connections_errors"):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert not database._is_warm(unreachable.get_stats())
+    finally:
+        unreachable.close()
+
+
+def test_router_reads_from_replica_while_lag_is_low():
+    replica = _LaggingPool(lag=0.2)
+    router = ReplicaRouter(replica, max_lag=1)
+
+    # Lag unknown until checked
+    assert not router.use_replica("user@test.com")
+    router.check_lag()
+    assert router.use_replica("user@test.com")
+
+    replica.lag = 3
+    router.check_lag()
+    assert not router.use_replica("user@test.com")
+    replica.lag = None
+    router.check_lag()
+    assert not router.use_replica("user@test.com")
+
+
+def test_router_sticks_to_primary_after_a_write(monkeypatch):
+    router = ReplicaRouter(_LaggingPool(lag=0), max_lag=1, sticky_for=5)
+    router.check_lag()
+    router.mark_written(email="user@test.com", user_id=1)
+
+    assert not router.use_replica("user@test.com")
+    assert router.use_replica("other@test.com")
+    assert router.written_recently(1) and not router.written_recently(2)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 6)
+    assert router.use_replica("user@test.com")
+    assert not router.written_recently(1)
+    router.mark_written(email="other@test.com")
+    assert router.stats()["sticky"] == 1
+
+
+def test_reads_are_routed_to_a_replica(db_conn):
+    if not os.getenv("DB_REPLICA_URL"):
+        pytest.skip("No replica configured")
+    replica_pool = psycopg_pool.ConnectionPool(
+        os.getenv("DB_REPLICA_URL"), min_size=1, open=True
+    )
+    router = ReplicaRouter(replica_pool, max_lag=0.5, sticky_for=0.5)
+    repository = DatabaseUserRepository(
+        db_conn, DatabaseActivationCodeRepository(db_conn), router=router
+    )
+    email = f"replica-{time.time_ns()}@test.com"
+    try:
+        repository.save_user(User(Email(email), Password("Password@123")))
+        db_conn.commit()
+        assert router.check_lag() is not None
+        reads = db_reads.value("replica"), db_reads.value("primary")
+
+        # Just written: read from the primary, then from the replica once replayed
+        assert repository.select_by_email(email)["email"] == email
+        time.sleep(0.6)
+        router.check_lag()
+        assert repository.select_by_email(email)["email"] == email
+
+        assert (db_reads.value("replica"), db_reads.value("primary")) == (
+            reads[0] + 1,
+            reads[1] + 1,
+        )
+    finally:
+        replica_pool.close()
+        db_conn.execute("DELETE FROM users WHERE email = %s", (email,))
+        db_conn.commit()
@@ -0,0 +1,285 @@
+import hashlib
+import math
+import os
+import threading
+from collections.abc import Callable
+from contextlib import AbstractContextManager, ExitStack, contextmanager
+
+from src.services import metrics
+from src.services.database import (
+    SHARDED_MODE,
+    SQLITE_MODE,
+    pool,
+    sharded_db,
+    sqlite_db,
+)
+from src.services.sharding import BUCKETS
+
+# Ids are allocated before commit: a refresh reads back this many ids below the last one
+# seen, so rows committed late by a concurrent transaction aren't skipped.
+REFRESH_OVERLAP = 1000
+
+
+class BloomFilter:
+    """
+    Set membership in `capacity` * ~1.2 bytes at a 1% error rate: no false negatives,
+    false positives at about `error_rate` while it holds up to `capacity` items.
+    """
+
+    capacity: int
+    error_rate: float
+    __size: int
+    __hashes: int
+    __bits: bytearray
+    __count: int
+    __lock: threading.Lock
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.__size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.__hashes = max(1, round(self.__size / capacity * math.log(2)))
+        self.__bits = bytearray((self.__size + 7) // 8)
+        self.__count = 0
+        self.__lock = threading.Lock()
+
+    def add(self, item: str) -> None:
+        positions = self.__positions(item)
+        # Setting a bit reads then writes its byte, concurrent adds would lose bits
+        with self.__lock:
+            for position in positions:
+                self.__bits[position >> 3] |= 1 << (position & 7)
+            self.__count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.__bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self.__positions(item)
+        )
+
+    def stats(self) -> dict:
+        count = self.__count
+        return {
+            "capacity": self.capacity,
+            "count": count,
+            "memory_bytes": len(self.__bits),
+            "hashes": self.__hashes,
+            "error_rate": self.error_rate,
+            # Expected rate for the items added so far (readds counted twice)
+            "estimated_false_positive_rate": round(
+                (1 - math.exp(-self.__hashes * count / self.__size)) ** self.__hashes,
+                6,
+            ),
+        }
+
+    def __positions(self, item: str) -> list[int]:
+        # Double hashing: k positions out of one 128 bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.__size for i in range(self.__hashes)]
+
+
+@contextmanager
+def _database_repositories():
+    """
+    Repositories to stream emails from by source, each with its own id watermark.
+    """
+    from src.repositories.activation_code import (
+        DatabaseActivationCodeRepository,
+        SQLiteActivationCodeRepository,
+    )
+    from src.repositories.user import DatabaseUserRepository, SQLiteUserRepository
+
+    if SQLITE_MODE:
+        yield {
+            "users": SQLiteUserRepository(
+                sqlite_db, SQLiteActivationCodeRepository(sqlite_db)
+            )
+        }
+        return
+    # A server-side cursor needs the transaction, kept for the whole stream
+    with ExitStack() as stack:
+        if SHARDED_MODE:
+            # Each node has its own id sequence, so its own watermark
+            conns = {
+                node: stack.enter_context(sharded_db.connection(node))
+                for node in sharded_db.pools
+            }
+        else:
+            conns = {"users": stack.enter_context(pool.connection())}
+        yield {
+            source: DatabaseUserRepository(conn, DatabaseActivationCodeRepository(conn))
+            for source, conn in conns.items()
+        }
+
+
+class EmailFilter:
+    """
+    Bloom filter of registered emails, so auth rejects unknown emails without a query.
+    Loaded in background from the users table, answering "may exist" until then. Users
+    are never deleted, so it only grows: emails saved by this worker are added right away,
+    by other workers through the user cache notifications, and by other processes
+    (e.g. a CLI import) on the next refresh. Disabled, it allocates nothing, every email
+    may exist and `add` returns right away.
+    """
+
+    __repositories: Callable[[], AbstractContextManager[dict]]
+    __filter: BloomFilter | None
+    __refresh_interval: float
+    __refresh_overlap: int
+    __ready: bool
+    __last_ids: dict[str, int]
+    __rejected: int
+    __false_positives: int
+    __lock: threading.Lock
+    __stop: threading.Event
+    __thread: threading.Thread | None
+
+    def __init__(
+        self,
+        repositories: Callable[
+            [], AbstractContextManager[dict]
+        ] = _database_repositories,
+        capacity: int = 1_000_000,
+        error_rate: float = 0.01,
+        refresh_interval: float = 60,
+        refresh_overlap: int = REFRESH_OVERLAP,
+        enabled: bool = True,
+    ):
+        self.__repositories = repositories
+        self.__filter = BloomFilter(capacity, error_rate) if enabled else None
+        self.__refresh_interval = refresh_interval
+        self.__refresh_overlap = refresh_overlap
+        self.__ready = False
+        self.__last_ids = {}
+        self.__rejected = 0
+        self.__false_positives = 0
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def might_exist(self, email: str) -> bool:
+        if not self.__ready or email in self.__filter:
+            return True
+        with self.__lock:
+            self.__rejected += 1
+        return False
+
+    def add(self, email: str) -> None:
+        # Called on every save
+        if self.__filter is not None:
+            self.__filter.add(email)
+
+    def record_false_positive(self) -> None:
+        """
+        Called when an email passed the filter but has no user.
+        """
+        if not self.__ready:
+            return
+        with self.__lock:
+            self.__false_positives += 1
+
+    def refresh(self) -> int:
+        """
+        Adds emails of users above the last id seen in each source, minus the overlap
+        (all of them on the first call).
+        """
+        if self.__filter is None:
+            return 0
+        added = 0
+        with self.__repositories() as repositories:
+            for source, repository in repositories.items():
+                last_id = self.__last_ids.get(source, 0)
+                after_id = max(0, last_id - self.__refresh_overlap)
+                for id, email in repository.stream_emails(after_id):
+                    self.__filter.add(email)
+                    last_id = max(last_id, id)
+                    added += 1
+                self.__last_ids[source] = last_id
+        self.__ready = True
+
+        return added
+
+    def start(self) -> None:
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, name="email-filter", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def stats(self) -> dict:
+        if self.__filter is None:
+            return {"enabled": False}
+        return {
+            **self.__filter.stats(),
+            "ready": self.__ready,
+            "rejected": self.__rejected,
+            "false_positives": self.__false_positives,
+        }
+
+    def __run(self) -> None:
+        while not self.__stop.is_set():
+            try:
+                added = self.refresh()
+                if added:
+                    print(f"Email filter: {added} email(s) loaded", flush=True)
+            except Exception as e:
+                # Still answering "may exist" for unseen emails, retried next interval
+                print(f"Email filter refresh failed: {e!r}", flush=True)
+            self.__stop.wait(self.__refresh_interval if self.__ready else 1)
+
+
+EMAIL_FILTER_ENABLED = os.getenv("EMAIL_FILTER_ENABLED", "false") == "true"
+
+email_filter = EmailFilter(
+    capacity=int(os.getenv("EMAIL_FILTER_CAPACITY", "1000000")),
+    error_rate=float(os.getenv("EMAIL_FILTER_ERROR_RATE", "0.01")),
+    refresh_interval=float(os.getenv("EMAIL_FILTER_REFRESH_INTERVAL", "60")),
+    # Sharded ids are sequence values * BUCKETS
+    refresh_overlap=REFRESH_OVERLAP * BUCKETS if SHARDED_MODE else REFRESH_OVERLAP,
+    enabled=EMAIL_FILTER_ENABLED,
+)
+
+
+def _filter_stat(key: str) -> dict[tuple, float]:
+    stats = email_filter.stats()
+    return {(): stats[key]} if key in stats else {}
+
+
+def _register_filter_metric(name: str, key: str, help: str, type: str = "gauge"):
+    metrics.registry.register(
+        metrics.Gauges(name, help, (), lambda: _filter_stat(key), type)
+    )
+
+
+_register_filter_metric("email_filter_emails", "count", "Emails added to the filter")
+_register_filter_metric(
+    "email_filter_memory_bytes", "memory_bytes", "Size of the filter bit array"
+)
+_register_filter_metric(
+    "email_filter_estimated_false_positive_rate",
+    "estimated_false_positive_rate",
+    "False positive rate expected from the emails added",
+)
+_register_filter_metric(
+    "email_filter_rejected_total",
+    "rejected",
+    "Auth attempts rejected as unknown emails without a query",
+    "counter",
+)
+_register_filter_metric(
+    "email_filter_false_positives_total",
+    "false_positives",
+    "Emails let through by the filter without a user",
+    "counter",
+)
@@ -0,0 +1,119 @@
+import asyncio
+from contextlib import contextmanager
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from src.models import User
+from src.models.value_objects import Email, Password
+from src.repositories import InMemoryActivationCodeRepository, InMemoryUserRepository
+from src.repositories.activation_code import DatabaseActivationCodeRepository
+from src.repositories.user import DatabaseUserRepository
+from src.services import auth
+from src.services.email_filter import BloomFilter, EmailFilter
+from src.services.migrations import migrate
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+    for i in range(10_000):
+        bloom.add(f"user{i}@test.com")
+
+    assert all(f"user{i}@test.com" in bloom for i in range(10_000))
+    false_positives = sum(f"other{i}@test.com" in bloom for i in range(10_000))
+    assert false_positives < 200
+    assert bloom.stats()["memory_bytes"] < 12_000
+
+
+def _in_memory_filter(*emails: str) -> tuple[EmailFilter, InMemoryUserRepository]:
+    repository = InMemoryUserRepository(InMemoryActivationCodeRepository())
+    for email in emails:
+        repository.save_user(User(Email(email), Password("Password@123")))
+
+    @contextmanager
+    def factory():
+        yield {"users": repository}
+
+    return EmailFilter(factory, capacity=1000), repository
+
+
+def test_disabled_email_filter_lets_every_email_through():
+    email_filter = EmailFilter(capacity=1_000_000, enabled=False)
+
+    email_filter.add("known@test.com")
+    assert email_filter.refresh() == 0
+    assert email_filter.might_exist("unknown@test.com")
+    assert email_filter.stats() == {"enabled": False}
+
+
+def test_email_filter_rejects_unknown_emails_once_loaded():
+    email_filter, repository = _in_memory_filter("known@test.com")
+
+    # Everything may exist until loaded
+    assert email_filter.might_exist("unknown@test.com")
+    assert email_filter.refresh() == 1
+    assert email_filter.might_exist("known@test.com")
+    assert not email_filter.might_exist("unknown@test.com")
+
+    email_filter.add("added@test.com")
+    assert email_filter.might_exist("added@test.com")
+    # Saved by another process, picked up by the next refresh
+    repository.save_inactive_user({"id": 1000, "email": "imported@test.com"})
+    email_filter.refresh()
+    assert email_filter.might_exist("imported@test.com")
+    assert email_filter.stats()["rejected"] == 1
+
+
+def test_email_filter_keeps_a_watermark_per_source():
+    # Sharded nodes each have their own id sequence
+    nodes = {
+        node: InMemoryUserRepository(InMemoryActivationCodeRepository())
+        for node in ("a", "b")
+    }
+    nodes["a"].save_inactive_user({"id": 50_000, "email": "a@test.com"})
+    nodes["b"].save_inactive_user({"id": 10, "email": "b@test.com"})
+
+    @contextmanager
+    def factory():
+        yield nodes
+
+    email_filter = EmailFilter(factory, capacity=1000)
+    assert email_filter.refresh() == 2
+
+    # Far below node a's ids
+    nodes["b"].save_inactive_user({"id": 20, "email": "new@test.com"})
+    email_filter.refresh()
+    assert email_filter.might_exist("new@test.com")
+
+
+def test_auth_rejects_unknown_email_before_the_repository(monkeypatch):
+    email_filter, _ = _in_memory_filter("known@test.com")
+    email_filter.refresh()
+    monkeypatch.setattr(auth, "email_filter", email_filter)
+
+    with pytest.raises(HTTPException) as e:
+        auth._parse_known_basic_auth({"email": "unknown@test.com"})
+    assert e.value.status_code == 404
+    assert auth._parse_known_basic_auth({"email": "known@test.com"})
+
+
+def test_app_refuses_the_filter_without_cache_notifications(monkeypatch):
+    monkeypatch.setattr(main, "EMAIL_FILTER_ENABLED", True)
+    monkeypatch.setattr(main, "LISTEN_USER_CACHE", False)
+
+    with pytest.raises(RuntimeError, match="USER_CACHE_LISTEN"):
+        asyncio.run(main.lifespan(main.app).__aenter__())
+
+
+def test_stream_emails_with_server_side_cursor(db_conn):
+    migrate(db_conn)
+    repository = DatabaseUserRepository(
+        db_conn, DatabaseActivationCodeRepository(db_conn)
+    )
+    user = User(Email("stream@test.com"), Password("Password@123"))
+    repository.save_user(user)
+    user_id = user.to_public_snapshot().get("id")
+
+    assert list(repository.stream_emails(user_id - 1)) == [(user_id, "stream@test.com")]
+    db_conn.rollback()
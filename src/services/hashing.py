@@ -0,0 +1,169 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+import bcrypt
+
+from src.services import metrics
+
+
+class HashingQueueFull(Exception):
+    detail = "Server is busy, please retry later"
+
+
+def _hashpw(password: bytes) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt())
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+# bcrypt_duration_seconds `op` label
+_OPS = {_hashpw: "hash", _checkpw: "verify"}
+
+
+class HashingService:
+    """
+    Runs bcrypt in a bounded process pool so hashing never occupies the request threadpool.
+    `workers=0` runs bcrypt inline (used by unit tests).
+    """
+
+    __workers: int
+    __max_pending: int
+    __pending: int
+    __calls: int
+    __total_latency: float
+    __max_latency: float
+    __executor: Executor | None
+    __lock: threading.Lock
+
+    def __init__(self, workers: int | None = None, max_pending: int | None = None):
+        self.__workers = (os.cpu_count() or 1) if workers is None else workers
+        self.__max_pending = (
+            max(self.__workers, 1) * 4 if max_pending is None else max_pending
+        )
+        self.__pending = 0
+        self.__calls = 0
+        self.__total_latency = 0.0
+        self.__max_latency = 0.0
+        self.__executor = None
+        self.__lock = threading.Lock()
+
+    def hash_password(self, password: str) -> str:
+        return self.__run(_hashpw, password.encode()).decode()
+
+    def check_password(self, password: str, hashed: str) -> bool:
+        return self.__run(_checkpw, password.encode(), hashed.encode())
+
+    def hash_passwords(self, passwords: list[str]) -> list[str]:
+        """
+        Hashes a whole batch across the pool, a queue slot per password: taken a chunk of
+        one password per worker at a time, so single calls get in between the chunks.
+        """
+        encoded = [password.encode() for password in passwords]
+        return [hashed.decode() for hashed in self.__run_many(_hashpw, encoded)]
+
+    async def hash_password_async(self, password: str) -> str:
+        return (await self.__run_async(_hashpw, password.encode())).decode()
+
+    async def check_password_async(self, password: str, hashed: str) -> bool:
+        return await self.__run_async(_checkpw, password.encode(), hashed.encode())
+
+    async def hash_passwords_async(self, passwords: list[str]) -> list[str]:
+        return await asyncio.to_thread(self.hash_passwords, passwords)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                "workers": self.__workers,
+                "queue_depth": self.__pending,
+                "queue_size": self.__max_pending,
+                "calls": self.__calls,
+                "avg_latency_ms": (
+                    self.__total_latency * 1000 / self.__calls if self.__calls else 0.0
+                ),
+                "max_latency_ms": self.__max_latency * 1000,
+            }
+
+    def shutdown(self) -> None:
+        with self.__lock:
+            executor, self.__executor = self.__executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+    def __run(self, fn, *args):
+        executor = self.__acquire()
+        start = time.perf_counter()
+        try:
+            if executor is None:
+                return fn(*args)
+            return executor.submit(fn, *args).result()
+        finally:
+            self.__release(fn, time.perf_counter() - start)
+
+    def __run_many(self, fn, items: list) -> list:
+        results = []
+        chunk_size = max(self.__workers, 1)
+        for offset in range(0, len(items), chunk_size):
+            chunk = items[offset : offset + chunk_size]
+            executor = self.__acquire(len(chunk))
+            start = time.perf_counter()
+            try:
+                if executor is None:
+                    results += map(fn, chunk)
+                else:
+                    results += executor.map(fn, chunk)
+            finally:
+                self.__release(fn, time.perf_counter() - start, len(chunk))
+        return results
+
+    async def __run_async(self, fn, *args):
+        executor = self.__acquire()
+        start = time.perf_counter()
+        try:
+            # Inline mode still leaves the event loop, on the default thread executor
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, fn, *args)
+        finally:
+            self.__release(fn, time.perf_counter() - start)
+
+    def __acquire(self, slots: int = 1) -> Executor | None:
+        with self.__lock:
+            if self.__pending + slots > self.__max_pending:
+                raise HashingQueueFull()
+            self.__pending += slots
+            return self.__get_executor()
+
+    def __release(self, fn, latency: float, calls: int = 1) -> None:
+        metrics.bcrypt_duration.observe(latency / calls, _OPS[fn], count=calls)
+        with self.__lock:
+            self.__pending -= calls
+            self.__calls += calls
+            self.__total_latency += latency
+            self.__max_latency = max(self.__max_latency, latency / calls)
+
+    def __get_executor(self) -> Executor | None:
+        if self.__workers == 0:
+            return None
+        if self.__executor is None:
+            # spawn instead of fork, the API process runs threads
+            self.__executor = ProcessPoolExecutor(
+                max_workers=self.__workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self.__executor
+
+
+def _env_int(name: str) -> int | None:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+hashing_service = HashingService(
+    workers=_env_int("HASHING_WORKERS"),
+    max_pending=_env_int("HASHING_MAX_QUEUE"),
+)
@@ -0,0 +1,50 @@
+import bcrypt
+import pytest
+
+from src.services.hashing import HashingQueueFull, HashingService
+
+
+def test_hashing_inline():
+    service = HashingService(workers=0)
+    hashed = service.hash_password("Password@123")
+
+    assert hashed.startswith("$2b$")
+    assert service.stats()["calls"] == 1
+    assert service.stats()["queue_depth"] == 0
+
+
+@pytest.fixture
+def process_pool_service():
+    """Its spawned worker runs the real bcrypt, not the fake of the parent process"""
+    service = HashingService(workers=1)
+    yield service
+    service.shutdown()
+
+
+def test_hashing_process_pool(process_pool_service):
+    hashed = process_pool_service.hash_password("Password@123")
+    assert bcrypt.checkpw(b"Password@123", hashed.encode())
+    assert process_pool_service.check_password("Password@123", hashed)
+    assert not process_pool_service.check_password("Wrong@1234", hashed)
+
+
+def test_hashing_rejects_when_queue_full():
+    service = HashingService(workers=0, max_pending=0)
+
+    with pytest.raises(HashingQueueFull):
+        service.hash_password("Password@123")
+    assert service.stats()["calls"] == 0
+
+
+def test_batch_takes_a_queue_slot_per_password():
+    # One password per worker at a time: the batch fits a queue smaller than itself
+    service = HashingService(workers=0, max_pending=1)
+    assert len(service.hash_passwords(["Password@1", "Password@2", "Password@3"])) == 3
+    assert service.stats()["calls"] == 3
+    assert service.stats()["queue_depth"] == 0
+
+    # But a chunk never takes more slots than the queue has
+    service = HashingService(workers=2, max_pending=1)
+    with pytest.raises(HashingQueueFull):
+        service.hash_passwords(["Password@1", "Password@2"])
+    assert service.stats()["queue_depth"] == 0
@@ -1,7 +1,16 @@
 import os
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import httpx
 
 from src.models import User
+from src.services import metrics
+
+# Activation mails are written to the outbox with the user and sent by the mail dispatcher,
+# otherwise sent by a background task after the response.
+MAIL_OUTBOX = os.getenv("MAIL_OUTBOX", "true") == "true"
 
 
 class MailSendError(Exception):
@@ -9,20 +18,43 @@ class MailSendError(Exception):
 
 
 class EmailAdapter(ABC):
-    @abstractmethod
     def send_activation_code(self, user: User) -> None:
+        user_data = user.to_public_snapshot()
+        self.send_activation_code_to(
+            user_data.get("email"), user_data.get("activation_code")
+        )
+
+    @abstractmethod
+    def send_activation_code_to(self, email: str, code: str) -> None:
+        """
+        Same as `send_activation_code`, for senders holding plain data (mail outbox).
+        """
         pass
 
+    def send_many(self, mails: list[tuple[str, str]]) -> list[Exception | None]:
+        """
+        Sends `(email, code)` activation mails, returns the error of each mail (None once sent).
+        """
+        errors = []
+        for email, code in mails:
+            try:
+                self.send_activation_code_to(email, code)
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+        return errors
+
 
 class InMemoryMailAdapter(EmailAdapter):
     mails: dict
 
-    def send_activation_code(self, user: User) -> None:
+    def __init__(self):
         self.mails = {}
-        user_data = user.to_snapshot()
-        self.mails[user_data.get("email")] = {
+
+    def send_activation_code_to(self, email: str, code: str) -> None:
+        self.mails[email] = {
             "type": "activation_code",
-            "code": user_data.get("activation_code"),
+            "code": code,
         }
 
     def has_activation_code_mail(self, email: str, code: str) -> bool:
@@ -32,12 +64,11 @@ class InMemoryMailAdapter(EmailAdapter):
 
 
 class ConsoleEmailAdapter(EmailAdapter):
-    def send_activation_code(self, user: User) -> None:
-        user_data = user.to_snapshot()
+    def send_activation_code_to(self, email: str, code: str) -> None:
         print(
             f"""
 ############################################################################################
-📧 Sending activation code to {user_data.get("email")}: {user_data.get("activation_code")}
+📧 Sending activation code to {email}: {code}
 ############################################################################################
 """,
             flush=True,
@@ -45,38 +76,137 @@ class ConsoleEmailAdapter(EmailAdapter):
 
 
 class HttpEmailAdapter(EmailAdapter):
-    def __init__(self):
-        # Use webhook.site url to test
-        self.api_url = "https://my-third-party/api/send"
-        self.api_key = os.getenv("MAIL_API_KEY", "change-this-key")
+    """
+    Sends through the provider's HTTP API on a shared keep-alive connection pool.
+    `send_many` posts to `bulk_url` by chunks of `bulk_size` when the provider has one.
+    """
+
+    __client: httpx.Client
+    __api_url: str
+    __bulk_url: str | None
+    __bulk_size: int
+    __executor: ThreadPoolExecutor
+
+    def __init__(
+        self,
+        api_url: str = "https://my-third-party/api/send",  # Use webhook.site url to test
+        api_key: str = "change-this-key",
+        bulk_url: str | None = None,
+        bulk_size: int = 100,
+        concurrency: int = 10,
+        timeout: float = 5,
+        connect_timeout: float = 2,
+    ):
+        self.__api_url = api_url
+        self.__bulk_url = bulk_url
+        self.__bulk_size = bulk_size
+        self.__executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="mail-http"
+        )
+        self.__client = httpx.Client(
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=concurrency, max_keepalive_connections=concurrency
+            ),
+        )
 
-    def send_activation_code(self, user: User) -> None:
-        import json
-        import urllib.request
-
-        user_data = user.to_snapshot()
-        payload = {
-            "to": user_data.get("email"),
-            "subject": "Activation Code",
-            "body": f'Your code: {user_data.get("activation_code")}',
-        }
-        data = json.dumps(payload).encode("utf-8")
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+    def send_activation_code_to(self, email: str, code: str) -> None:
+        self.__post(self.__api_url, _activation_code_mail(email, code))
+
+    def send_many(self, mails: list[tuple[str, str]]) -> list[Exception | None]:
+        if self.__bulk_url:
+            chunks = [
+                mails[i : i + self.__bulk_size]
+                for i in range(0, len(mails), self.__bulk_size)
+            ]
+            send, items = self.__send_chunk, chunks
+        else:
+            send, items = self.__send_one, mails
+
+        results = list(self.__executor.map(send, items))
+
+        if self.__bulk_url:
+            # Every mail of a chunk shares the chunk outcome
+            return [
+                error
+                for chunk, error in zip(chunks, results)
+                for _ in range(len(chunk))
+            ]
+        return results
+
+    def close(self) -> None:
+        self.__executor.shutdown()
+        self.__client.close()
+
+    def __send_one(self, mail: tuple[str, str]) -> Exception | None:
+        try:
+            self.send_activation_code_to(*mail)
+        except Exception as e:
+            return e
+        return None
 
-        url = f"{self.api_url}"
-        req = urllib.request.Request(url, data=data, headers=headers, method="POST")
+    def __send_chunk(self, mails: list[tuple[str, str]]) -> Exception | None:
+        try:
+            self.__post(
+                self.__bulk_url,
+                {"messages": [_activation_code_mail(*mail) for mail in mails]},
+            )
+        except Exception as e:
+            return e
+        return None
+
+    def __post(self, url: str, payload: dict) -> None:
+        try:
+            response = self.__client.post(url, json=payload)
+        except httpx.HTTPError as e:
+            raise MailSendError(f"{type(e).__name__}: {e}") from e
+        if response.status_code != 200:
+            raise MailSendError(
+                f"Third-party mail provider failure ({response.status_code})"
+            )
+
+
+def _activation_code_mail(email: str, code: str) -> dict:
+    return {
+        "to": email,
+        "subject": "Activation Code",
+        "body": f"Your code: {code}",
+    }
+
+
+def send_activation_codes(mail_adapter: EmailAdapter, users: list[User]) -> None:
+    """
+    Background task sending the activation mails, a failed mail doesn't stop the others.
+    """
+    error = None
+    for user in users:
         try:
-            with urllib.request.urlopen(req) as response:
-                if response.status != 200:
-                    raise Exception("Third-party mail provider failure")
+            mail_adapter.send_activation_code(user)
+            metrics.mail_tasks.inc("background", "sent")
         except Exception as e:
-            raise MailSendError(e.detail)
+            metrics.mail_tasks.inc("background", "failed")
+            error = error or e
+    if error:
+        raise error
+
+
+@lru_cache
+def get_http_email_adapter() -> HttpEmailAdapter:
+    """
+    Shared by every request so connections are reused.
+    """
+    return HttpEmailAdapter(
+        api_url=os.getenv("MAIL_API_URL", "https://my-third-party/api/send"),
+        api_key=os.getenv("MAIL_API_KEY", "change-this-key"),
+        bulk_url=os.getenv("MAIL_BULK_API_URL") or None,
+        bulk_size=int(os.getenv("MAIL_BULK_SIZE", "100")),
+        concurrency=int(os.getenv("MAIL_CONCURRENCY", "10")),
+        timeout=float(os.getenv("MAIL_TIMEOUT", "5")),
+    )
 
 
 def get_email_adapter() -> EmailAdapter:
     return (
         ConsoleEmailAdapter()
-    )  # Change this to HttpEmailAdapter() to test mail request
+    )  # Change this to get_http_email_adapter() to test mail request
@@ -0,0 +1,282 @@
+import os
+import threading
+import time
+from collections.abc import Callable
+from contextlib import AbstractContextManager, contextmanager
+from datetime import datetime, timedelta, timezone
+
+from src.repositories.activation_code import CODE_TTL
+from src.repositories.outbox import ACTIVATION_CODE_MAIL, OutboxRepository
+from src.services import metrics
+from src.services.mail import EmailAdapter, get_email_adapter
+
+
+@contextmanager
+def _database_repository():
+    from src.repositories.outbox import DatabaseOutboxRepository
+    from src.services.database import pool
+
+    # One transaction per use, committed on exit
+    with pool.connection() as conn:
+        yield DatabaseOutboxRepository(conn)
+
+
+def _error_message(error: Exception | None) -> str | None:
+    return repr(error) if error is not None else None
+
+
+class MailDispatcher:
+    """
+    Drains the mail outbox in batches, each batch sent with `EmailAdapter.send_many`
+    between two short transactions: one claims the batch, the other records the results.
+    Failed sends are retried with exponential backoff, then parked after `max_attempts`
+    or once the next attempt would be past `max_age` (the activation code has expired).
+    Parked messages are purged `parked_retention` after their creation, checked every
+    `purge_interval` seconds.
+    """
+
+    __repository: Callable[[], AbstractContextManager[OutboxRepository]]
+    __mail_adapter: EmailAdapter
+    __batch_size: int
+    __interval: float
+    __max_attempts: int
+    __backoff: float
+    __max_backoff: float
+    __max_age: timedelta
+    __parked_retention: timedelta
+    __purge_interval: float
+    __next_purge: float
+    __stop: threading.Event
+    __thread: threading.Thread | None
+    __lock: threading.Lock
+    __sent: int
+    __failed: int
+    __send_time: float
+    __max_send_time: float
+    __backlog: int | None
+    __parked: int | None
+    __purged: int
+
+    def __init__(
+        self,
+        repository: Callable[
+            [], AbstractContextManager[OutboxRepository]
+        ] = _database_repository,
+        mail_adapter: EmailAdapter | None = None,
+        batch_size: int = 100,
+        interval: float = 1,
+        max_attempts: int = 8,
+        backoff: float = 5,
+        max_backoff: float = 3600,
+        max_age: timedelta = CODE_TTL,
+        parked_retention: timedelta = timedelta(days=7),
+        purge_interval: float = 3600,
+    ):
+        self.__repository = repository
+        self.__mail_adapter = mail_adapter or get_email_adapter()
+        self.__batch_size = batch_size
+        self.__interval = interval
+        self.__max_attempts = max_attempts
+        self.__backoff = backoff
+        self.__max_backoff = max_backoff
+        self.__max_age = max_age
+        self.__parked_retention = parked_retention
+        self.__purge_interval = purge_interval
+        self.__next_purge = 0
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__lock = threading.Lock()
+        self.__sent = 0
+        self.__failed = 0
+        self.__send_time = 0
+        self.__max_send_time = 0
+        self.__backlog = None
+        self.__parked = None
+        self.__purged = 0
+
+    def dispatch_once(self) -> dict:
+        """
+        Sends one batch of due messages and returns how many were sent and failed.
+        """
+        with self.__repository() as repository:
+            messages = repository.claim_batch(self.__batch_size)
+        errors = self.__send(messages)
+
+        with self.__repository() as repository:
+            repository.delete(
+                [
+                    message["id"]
+                    for message, error in zip(messages, errors)
+                    if error is None
+                ]
+            )
+            for message, error in zip(messages, errors):
+                if error is not None:
+                    repository.reschedule(
+                        message["id"], self.__retry_delay(message), error
+                    )
+            self.__backlog = repository.backlog()
+            self.__parked = repository.parked()
+
+        failed = sum(1 for error in errors if error is not None)
+        metrics.mail_tasks.inc("outbox", "sent", amount=len(messages) - failed)
+        metrics.mail_tasks.inc("outbox", "failed", amount=failed)
+        with self.__lock:
+            self.__sent += len(messages) - failed
+            self.__failed += failed
+
+        return {"sent": len(messages) - failed, "failed": failed}
+
+    def dispatch_all(self) -> dict:
+        """
+        Dispatches batches until no due message is left.
+        """
+        totals = {"sent": 0, "failed": 0}
+        while not self.__stop.is_set():
+            report = self.dispatch_once()
+            totals["sent"] += report["sent"]
+            totals["failed"] += report["failed"]
+            if report["sent"] + report["failed"] < self.__batch_size:
+                break
+
+        return totals
+
+    def purge_parked(self, retention: timedelta | None = None) -> int:
+        """
+        Deletes the messages parked for longer than `retention` (`parked_retention` by
+        default), returns their count.
+        """
+        created_before = datetime.now(timezone.utc) - (
+            self.__parked_retention if retention is None else retention
+        )
+        with self.__repository() as repository:
+            purged = repository.purge_parked(created_before)
+            self.__parked = repository.parked()
+        with self.__lock:
+            self.__purged += purged
+        return purged
+
+    def start(self) -> None:
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, name="mail-dispatcher", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def stats(self) -> dict:
+        with self.__lock:
+            attempts = self.__sent + self.__failed
+            return {
+                "backlog": self.__backlog,
+                "parked": self.__parked,
+                "purged": self.__purged,
+                "sent": self.__sent,
+                "failed": self.__failed,
+                # Batch send time spread over its mails
+                "avg_send_ms": self.__send_time * 1000 / attempts if attempts else 0,
+                "max_batch_send_ms": self.__max_send_time * 1000,
+            }
+
+    def __send(self, messages: list[dict]) -> list[str | None]:
+        """
+        Returns the error message of each message, None once sent.
+        """
+        errors = [self.__unsendable(message) for message in messages]
+        mails = [
+            (message["payload"]["email"], message["payload"]["activation_code"])
+            for message, error in zip(messages, errors)
+            if error is None
+        ]
+        if not mails:
+            return errors
+
+        start = time.perf_counter()
+        # Concurrency is up to the adapter (HttpEmailAdapter sends on its connection pool)
+        send_errors = iter(self.__mail_adapter.send_many(mails))
+        elapsed = time.perf_counter() - start
+        with self.__lock:
+            self.__send_time += elapsed
+            self.__max_send_time = max(self.__max_send_time, elapsed)
+
+        return [
+            error if error is not None else _error_message(next(send_errors))
+            for error in errors
+        ]
+
+    def __unsendable(self, message: dict) -> str | None:
+        if message["kind"] != ACTIVATION_CODE_MAIL:
+            return f"Unknown mail kind {message['kind']!r}"
+        if self.__expired(message, datetime.now(timezone.utc)):
+            return "Activation code expired before sending"
+        return None
+
+    def __expired(self, message: dict, at: datetime) -> bool:
+        return at >= message["created_at"] + self.__max_age
+
+    def __retry_delay(self, message: dict) -> timedelta | None:
+        attempts = message["attempts"]
+        if attempts + 1 >= self.__max_attempts:
+            return None
+        delay = timedelta(seconds=min(self.__backoff * 2**attempts, self.__max_backoff))
+        if self.__expired(message, datetime.now(timezone.utc) + delay):
+            return None
+        return delay
+
+    def __run(self) -> None:
+        while not self.__stop.is_set():
+            try:
+                report = self.dispatch_all()
+                if report["failed"]:
+                    print(f"Mail dispatcher: {report}", flush=True)
+                if time.monotonic() >= self.__next_purge:
+                    self.__next_purge = time.monotonic() + self.__purge_interval
+                    if purged := self.purge_parked():
+                        print(
+                            f"Mail dispatcher: {purged} parked mail(s) purged",
+                            flush=True,
+                        )
+            except Exception as e:
+                # Keep dispatching on the next interval, the DB may be briefly unavailable
+                print(f"Mail dispatcher failed: {e!r}", flush=True)
+            self.__stop.wait(self.__interval)
+
+
+MAIL_DISPATCHER_ENABLED = os.getenv("MAIL_DISPATCHER_ENABLED", "true") == "true"
+
+mail_dispatcher = MailDispatcher(
+    batch_size=int(os.getenv("MAIL_DISPATCHER_BATCH_SIZE", "100")),
+    interval=float(os.getenv("MAIL_DISPATCHER_INTERVAL", "1")),
+    max_attempts=int(os.getenv("MAIL_DISPATCHER_MAX_ATTEMPTS", "8")),
+    parked_retention=timedelta(
+        hours=float(os.getenv("MAIL_OUTBOX_PARKED_RETENTION_HOURS", "168"))
+    ),
+)
+
+
+def _outbox_count(key: str) -> dict[tuple, float]:
+    count = mail_dispatcher.stats()[key]
+    return {} if count is None else {(): count}
+
+
+metrics.registry.register(
+    metrics.Gauges(
+        "mail_outbox_backlog",
+        "Outbox messages left to send, as of the last dispatch",
+        (),
+        lambda: _outbox_count("backlog"),
+    )
+)
+metrics.registry.register(
+    metrics.Gauges(
+        "mail_outbox_parked",
+        "Outbox messages given up on, kept until purged",
+        (),
+        lambda: _outbox_count("parked"),
+    )
+)
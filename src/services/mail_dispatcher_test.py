@@ -0,0 +1,136 @@
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+
+from src.repositories.activation_code import CODE_TTL
+from src.repositories.outbox import (
+    ACTIVATION_CODE_MAIL,
+    CLAIM_LEASE,
+    DatabaseOutboxRepository,
+    InMemoryOutboxRepository,
+)
+from src.services.mail import InMemoryMailAdapter, MailSendError
+from src.services.mail_dispatcher import MailDispatcher
+from src.services.migrations import migrate
+
+
+class FlakyMailAdapter(InMemoryMailAdapter):
+    def send_activation_code_to(self, email: str, code: str) -> None:
+        if email.startswith("bounce"):
+            raise MailSendError()
+        super().send_activation_code_to(email, code)
+
+
+def _outbox(*emails: str) -> InMemoryOutboxRepository:
+    repository = InMemoryOutboxRepository()
+    for email in emails:
+        repository.enqueue(
+            ACTIVATION_CODE_MAIL, {"email": email, "activation_code": "1234"}
+        )
+    return repository
+
+
+def test_dispatcher_sends_and_deletes_outbox_messages():
+    repository = _outbox("a@test.com", "b@test.com", "c@test.com")
+    mail_adapter = InMemoryMailAdapter()
+    dispatcher = MailDispatcher(
+        lambda: nullcontext(repository), mail_adapter, batch_size=2
+    )
+
+    assert dispatcher.dispatch_all() == {"sent": 3, "failed": 0}
+    assert repository.messages == {}
+    assert mail_adapter.has_activation_code_mail("c@test.com", "1234")
+    assert dispatcher.stats()["backlog"] == 0
+
+
+def test_dispatcher_reschedules_failed_sends_with_backoff():
+    repository = _outbox("a@test.com", "bounce@test.com")
+    dispatcher = MailDispatcher(
+        lambda: nullcontext(repository), FlakyMailAdapter(), backoff=10
+    )
+
+    assert dispatcher.dispatch_once() == {"sent": 1, "failed": 1}
+    [message] = repository.messages.values()
+    assert message["attempts"] == 1
+    assert "MailSendError" in message["last_error"]
+    # Not due before the backoff delay
+    assert dispatcher.dispatch_once() == {"sent": 0, "failed": 0}
+    assert dispatcher.stats()["failed"] == 1
+
+
+def test_dispatcher_parks_message_after_max_attempts():
+    repository = _outbox("bounce@test.com")
+    dispatcher = MailDispatcher(
+        lambda: nullcontext(repository),
+        FlakyMailAdapter(),
+        max_attempts=1,
+    )
+
+    dispatcher.dispatch_once()
+
+    assert repository.messages[1]["available_at"] is None
+    assert repository.backlog() == 0
+    assert dispatcher.stats()["parked"] == 1
+
+
+def test_dispatcher_purges_messages_parked_past_their_retention():
+    repository = _outbox("bounce@test.com", "bounce-old@test.com", "a@test.com")
+    repository.messages[2]["created_at"] -= timedelta(days=8)
+    dispatcher = MailDispatcher(
+        lambda: nullcontext(repository), FlakyMailAdapter(), max_attempts=1
+    )
+    dispatcher.dispatch_once()
+
+    assert dispatcher.purge_parked() == 1
+    assert list(repository.messages) == [1]
+    assert dispatcher.stats()["parked"] == 1
+    assert dispatcher.purge_parked(timedelta(0)) == 1
+    assert dispatcher.stats()["purged"] == 2
+
+
+def test_dispatcher_parks_messages_once_their_code_expired():
+    repository = _outbox("bounce@test.com", "late@test.com")
+    repository.messages[2]["created_at"] -= CODE_TTL
+    mail_adapter = FlakyMailAdapter()
+    dispatcher = MailDispatcher(
+        lambda: nullcontext(repository),
+        mail_adapter,
+        backoff=CODE_TTL.total_seconds(),
+    )
+
+    assert dispatcher.dispatch_once() == {"sent": 0, "failed": 2}
+    # The retry would come after the code expired, the late mail isn't even sent
+    assert [message["available_at"] for message in repository.messages.values()] == [
+        None,
+        None,
+    ]
+    assert not mail_adapter.has_activation_code_mail("late@test.com", "1234")
+
+
+def test_claimed_messages_are_leased_to_one_dispatcher():
+    repository = _outbox("a@test.com")
+
+    assert len(repository.claim_batch(10)) == 1
+    assert repository.claim_batch(10) == []
+    repository.messages[1]["available_at"] -= CLAIM_LEASE
+    assert len(repository.claim_batch(10)) == 1
+
+
+def test_database_outbox_purges_parked_messages(db_conn):
+    migrate(db_conn)
+    repository = DatabaseOutboxRepository(db_conn)
+    repository.enqueue_activation_mails(
+        [{"email": "parked@test.com", "activation_code": "1234"}]
+    )
+    [message] = [
+        message
+        for message in repository.claim_batch(100)
+        if message["payload"]["email"] == "parked@test.com"
+    ]
+    parked = repository.parked()
+    repository.reschedule(message["id"], None, "MailSendError()")
+
+    assert repository.parked() == parked + 1
+    assert repository.purge_parked(message["created_at"]) == 0
+    assert repository.purge_parked(datetime.now(timezone.utc)) >= 1
+    assert repository.parked() == 0
+    db_conn.rollback()
@@ -0,0 +1,132 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.services.mail import HttpEmailAdapter, MailSendError
+
+
+class _MailServer(ThreadingHTTPServer):
+    """Mail API counting requests, mails and TCP connections, mails to `fail_to` get a 500"""
+
+    daemon_threads = True
+
+    def __init__(self, fail_to: tuple = ()):
+        super().__init__(("127.0.0.1", 0), _MailHandler)
+        self.latency = 0
+        self.fail_to = set(fail_to)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.mails = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/api/send"
+
+    @property
+    def bulk_url(self) -> str:
+        return f"{self.url}/bulk"
+
+    def handle_error(self, request, client_address):
+        # Clients timing out close the connection before the response
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _MailHandler(BaseHTTPRequestHandler):
+    # Keep-alive, one handler instance per TCP connection
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: _MailServer
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        messages = body["messages"] if self.path.endswith("/bulk") else [body]
+        time.sleep(self.server.latency)
+
+        failed = any(message["to"] in self.server.fail_to for message in messages)
+        with self.server.lock:
+            self.server.requests += 1
+            if not failed:
+                self.server.mails.extend(messages)
+
+        response = json.dumps({"accepted": 0 if failed else len(messages)}).encode()
+        self.send_response(500 if failed else 200)
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def mail_server():
+    server = _MailServer(fail_to=("bounce@test.com",))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def adapters():
+    """HttpEmailAdapter factory, its adapters are closed even when the test fails"""
+    created = []
+
+    def create(**kwargs) -> HttpEmailAdapter:
+        created.append(HttpEmailAdapter(**kwargs))
+        return created[-1]
+
+    yield create
+    for adapter in created:
+        adapter.close()
+
+
+def test_http_adapter_reuses_connections(mail_server, adapters):
+    adapter = adapters(api_url=mail_server.url, concurrency=2)
+    mails = [(f"user{i}@test.com", "1234") for i in range(20)]
+
+    errors = adapter.send_many(mails)
+
+    assert errors == [None] * 20
+    assert mail_server.requests == 20
+    assert mail_server.connections <= 2
+    assert mail_server.mails[0]["body"] == "Your code: 1234"
+
+
+def test_http_adapter_sends_by_bulk_chunks(mail_server, adapters):
+    adapter = adapters(
+        api_url=mail_server.url, bulk_url=mail_server.bulk_url, bulk_size=10
+    )
+    mails = [(f"user{i}@test.com", "1234") for i in range(25)]
+    mails[12] = ("bounce@test.com", "1234")
+
+    errors = adapter.send_many(mails)
+
+    assert mail_server.requests == 3
+    # The whole failed chunk is reported
+    assert [i for i, error in enumerate(errors) if error] == list(range(10, 20))
+    assert len(mail_server.mails) == 15
+
+
+def test_http_adapter_raises_mail_send_error(mail_server, adapters):
+    adapter = adapters(api_url=mail_server.url)
+
+    with pytest.raises(MailSendError):
+        adapter.send_activation_code_to("bounce@test.com", "1234")
+    mail_server.latency = 0.5
+    with pytest.raises(MailSendError, match="ReadTimeout"):
+        adapters(api_url=mail_server.url, timeout=0.1).send_activation_code_to(
+            "user@test.com", "1234"
+        )
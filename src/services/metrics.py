@@ -0,0 +1,246 @@
+import bisect
+import threading
+import time
+from collections.abc import Callable
+
+# Seconds, from a fast cached request to a bcrypt hash under load
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _Metric:
+    """
+    Each thread records into its own dict, so recording takes no lock:
+    the lock is only taken when a thread records for the first time, and on collect.
+    """
+
+    name: str
+    help: str
+    labelnames: tuple[str, ...]
+    __local: threading.local
+    __shards: list[dict]
+    __lock: threading.Lock
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.__local = threading.local()
+        self.__shards = []
+        self.__lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self.__local.values
+        except AttributeError:
+            values = self.__local.values = {}
+            with self.__lock:
+                self.__shards.append(values)
+            return values
+
+    def _shards(self) -> list[dict]:
+        with self.__lock:
+            # list() copies a dict atomically, the owner thread may be recording
+            return [list(shard.items()) for shard in self.__shards]
+
+    def _labels(self, labelvalues: tuple, extra: str = "") -> str:
+        return _format_labels(self.labelnames, labelvalues, extra)
+
+
+class Counter(_Metric):
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return sum(dict(shard).get(labelvalues, 0) for shard in self._shards())
+
+    def collect(self) -> list[str]:
+        totals = {}
+        for shard in self._shards():
+            for labelvalues, value in shard:
+                totals[labelvalues] = totals.get(labelvalues, 0) + value
+
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+            *(
+                f"{self.name}{self._labels(labelvalues)} {value}"
+                for labelvalues, value in sorted(totals.items())
+            ),
+        ]
+
+
+class Histogram(_Metric):
+    buckets: tuple[float, ...]
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labelvalues, count: int = 1) -> None:
+        """
+        `count` records the same value several times (e.g. the average of a batch).
+        """
+        shard = self._shard()
+        series = shard.get(labelvalues)
+        if series is None:
+            # Per bucket counts (not cumulative, the last one is +Inf), sum
+            series = shard[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += count
+        series[1] += value * count
+
+    def collect(self) -> list[str]:
+        totals = {}
+        for shard in self._shards():
+            for labelvalues, (counts, total) in shard:
+                series = totals.setdefault(
+                    labelvalues, [[0] * (len(self.buckets) + 1), 0.0]
+                )
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total) in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = self._labels(labelvalues, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = self._labels(labelvalues)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauges:
+    """
+    Values read at scrape time from a callback returning {labelvalues: value}.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...],
+        read: Callable[[], dict[tuple, float]],
+        type: str = "gauge",
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.type = type
+        self.__read = read
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labelvalues, value in self.__read().items():
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    __metrics: list
+
+    def __init__(self):
+        self.__metrics = []
+
+    def register(self, metric):
+        self.__metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.__metrics:
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:
+                # One failing source (e.g. a closed pool) doesn't hide the others
+                lines.append(f"# {metric.name} unavailable: {e!r}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests by route and status code",
+        ("method", "route", "status"),
+    )
+)
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route",
+        ("method", "route"),
+    )
+)
+bcrypt_duration = registry.register(
+    Histogram(
+        "bcrypt_duration_seconds",
+        "bcrypt call duration, including the wait for a hashing worker",
+        ("op",),
+        buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2.5, 5, 10),
+    )
+)
+mail_tasks = registry.register(
+    Counter(
+        "mail_tasks_total",
+        "Activation mails sent by background tasks or the outbox dispatcher",
+        ("source", "result"),
+    )
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request count, status and latency per route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Set by the router once matched, the template keeps the label set bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            http_request_duration.observe(
+                time.perf_counter() - start, scope["method"], route_path
+            )
+            http_requests.inc(scope["method"], route_path, status)
@@ -0,0 +1,55 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+from main import app
+from src.services.metrics import Counter, Histogram, Registry
+
+
+def test_counter_sums_per_thread_values():
+    counter = Counter("jobs_total", "Jobs", ("result",))
+
+    def record():
+        for _ in range(1000):
+            counter.inc("ok")
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc("failed")
+
+    assert counter.value("ok") == 4000
+    assert 'jobs_total{result="failed"} 1' in counter.collect()
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.register(
+        Histogram("duration_seconds", "Duration", ("op",), buckets=(0.1, 1))
+    )
+    histogram.observe(0.05, "hash")
+    histogram.observe(0.5, "hash", count=2)
+    histogram.observe(5, "hash")
+
+    lines = registry.render().splitlines()
+
+    assert 'duration_seconds_bucket{op="hash",le="0.1"} 1' in lines
+    assert 'duration_seconds_bucket{op="hash",le="1"} 3' in lines
+    assert 'duration_seconds_bucket{op="hash",le="+Inf"} 4' in lines
+    assert 'duration_seconds_count{op="hash"} 4' in lines
+
+
+def test_metrics_endpoint_records_route_templates():
+    client = TestClient(app)
+    client.get("/api/health")
+
+    response = client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert (
+        'http_requests_total{method="GET",route="/api/health",status="200"}'
+        in response.text
+    )
+    assert "# TYPE bcrypt_duration_seconds histogram" in response.text
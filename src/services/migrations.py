@@ -0,0 +1,77 @@
+import re
+import sqlite3
+from pathlib import Path
+
+from psycopg import Connection
+
+MIGRATIONS_DIR = Path(__file__).parent.parent / "migrations"
+SQLITE_MIGRATIONS_DIR = MIGRATIONS_DIR / "sqlite"
+# Arbitrary key, shared by every worker running migrations
+MIGRATIONS_LOCK_ID = 727_001
+
+_migration_file_pattern = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+def list_migrations(directory: Path = MIGRATIONS_DIR) -> list[tuple[int, str, Path]]:
+    migrations = []
+    for path in directory.iterdir():
+        match = _migration_file_pattern.match(path.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), path))
+
+    return sorted(migrations)
+
+
+def migrate(conn: Connection, directory: Path = MIGRATIONS_DIR) -> list[int]:
+    """
+    Applies pending migrations in a single transaction and returns their versions.
+    The advisory lock makes concurrent workers wait, then find nothing left to apply.
+    """
+    applied = []
+    with conn.transaction(), conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        cursor.execute(
+            """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version     INTEGER             PRIMARY KEY,
+    name        VARCHAR(255)        NOT NULL,
+    applied_at  TIMESTAMPTZ         NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+        )
+        cursor.execute("SELECT version FROM schema_version")
+        done = {row[0] for row in cursor.fetchall()}
+
+        for version, name, path in list_migrations(directory):
+            if version in done:
+                continue
+            cursor.execute(path.read_text())
+            cursor.execute(
+                "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                (version, name),
+            )
+            applied.append(version)
+            print(f"Applied migration {version:04d}_{name}", flush=True)
+
+    return applied
+
+
+def migrate_sqlite(
+    conn: sqlite3.Connection, directory: Path = SQLITE_MIGRATIONS_DIR
+) -> list[int]:
+    """
+    Same as `migrate` for the SQLite backend, the version is kept in `PRAGMA user_version`.
+    The caller holds the write connection, so migrations never run concurrently.
+    """
+    applied = []
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, name, path in list_migrations(directory):
+        if version <= current:
+            continue
+        conn.executescript(
+            f"BEGIN;\n{path.read_text()}\nPRAGMA user_version = {version};\nCOMMIT;"
+        )
+        applied.append(version)
+        print(f"Applied SQLite migration {version:04d}_{name}", flush=True)
+
+    return applied
@@ -0,0 +1,38 @@
+from src.services.migrations import list_migrations, migrate
+
+
+def test_migrations_are_numbered_in_order():
+    versions = [version for version, _, _ in list_migrations()]
+    assert versions == sorted(set(versions))
+
+
+def test_migrate_is_idempotent(db_conn):
+    migrate(db_conn)
+
+    assert migrate(db_conn) == []
+    with db_conn.cursor() as cursor:
+        cursor.execute("SELECT max(version) FROM schema_version")
+        assert cursor.fetchone()[0] == list_migrations()[-1][0]
+
+
+def test_activation_code_lookup_uses_index(db_conn):
+    migrate(db_conn)
+
+    with db_conn.transaction(), db_conn.cursor() as cursor:
+        # Tiny test tables would make any plan a seq scan, check the index is usable
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(
+            """
+EXPLAIN SELECT 1 from activation_code
+WHERE activation_code.user_id = %s
+    AND activation_code.code = %s
+    AND created_at >= now() - interval '1 minute'
+LIMIT 1
+""",
+            (1, "1234"),
+        )
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+
+    # Partitions have their own copy of activation_code_lookup_idx
+    assert "_lookup_idx" in plan
+    assert "Index" in plan
@@ -0,0 +1,260 @@
+import os
+import re
+import threading
+import time
+from collections.abc import Callable
+from contextlib import AbstractContextManager, ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+
+from psycopg import Connection, sql
+
+from src.repositories.activation_code import CODE_TTL
+
+PARTITION_PERIOD = timedelta(hours=1)
+DEFAULT_PARTITION = "activation_code_default"
+# Arbitrary key, held by the one worker rotating a database's partitions
+ROTATION_LOCK_ID = 727_002
+
+_partition_name_pattern = re.compile(r"^activation_code_p(\d{10})$")
+
+_LIST_PARTITIONS = """
+SELECT child.relname FROM pg_inherits
+JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+WHERE pg_inherits.inhparent = 'activation_code'::regclass
+"""
+
+
+def partition_name(start: datetime) -> str:
+    return f"activation_code_p{start.astimezone(timezone.utc):%Y%m%d%H}"
+
+
+def partition_start(name: str) -> datetime | None:
+    """
+    Start of the hour stored by a partition named by `partition_name`, else None.
+    """
+    match = _partition_name_pattern.match(name)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d%H").replace(tzinfo=timezone.utc)
+
+
+def _create_partition(conn: Connection, start: datetime, lock_timeout: str) -> None:
+    name = partition_name(start)
+    bounds = (start, start + PARTITION_PERIOD)
+    with conn.transaction():
+        conn.execute(
+            sql.SQL("SET LOCAL lock_timeout = {}").format(sql.Literal(lock_timeout))
+        )
+        # Created then attached, which only blocks writes to the default partition
+        conn.execute(
+            sql.SQL("CREATE TABLE {} (LIKE activation_code INCLUDING DEFAULTS)").format(
+                sql.Identifier(name)
+            )
+        )
+        conn.execute(
+            sql.SQL("CREATE INDEX {} ON {} (user_id, code, created_at)").format(
+                sql.Identifier(f"{name}_lookup_idx"), sql.Identifier(name)
+            )
+        )
+        # The default partition can't keep rows of the new range (inserted late by
+        # a rotation behind schedule)
+        conn.execute(
+            sql.SQL(
+                """
+WITH moved AS (
+    DELETE FROM {}
+    WHERE created_at >= %s AND created_at < %s
+    RETURNING id, user_id, code, created_at
+)
+INSERT INTO {} (id, user_id, code, created_at) SELECT * FROM moved
+"""
+            ).format(sql.Identifier(DEFAULT_PARTITION), sql.Identifier(name)),
+            bounds,
+        )
+        conn.execute(
+            sql.SQL(
+                "ALTER TABLE activation_code ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})"
+            ).format(sql.Identifier(name), *map(sql.Literal, bounds))
+        )
+
+
+def _drop_partition(conn: Connection, name: str, lock_timeout: str) -> None:
+    """
+    Detached first: only the detach locks the parent table, the drop then removes a table
+    no query reads anymore. Not CONCURRENTLY, which Postgres refuses while the default
+    partition exists.
+    """
+    timeout = sql.SQL("SET LOCAL lock_timeout = {}").format(sql.Literal(lock_timeout))
+    with conn.transaction():
+        conn.execute(timeout)
+        conn.execute(
+            sql.SQL("ALTER TABLE activation_code DETACH PARTITION {}").format(
+                sql.Identifier(name)
+            )
+        )
+    with conn.transaction():
+        conn.execute(timeout)
+        conn.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+
+
+def rotate(
+    conn: Connection,
+    ttl: timedelta,
+    ahead: int = 3,
+    now: datetime | None = None,
+    lock_timeout: str = "2s",
+) -> dict:
+    """
+    Creates the partitions of the current hour and the `ahead` next ones, drops those
+    whose rows are all older than `ttl`, and deletes the expired rows of the default one.
+    A lock not granted within `lock_timeout` raises, and is retried on the next rotation.
+    Every worker runs a rotator: the one holding the ROTATION_LOCK_ID advisory lock
+    rotates, the others return an empty report.
+    """
+    locked = conn.execute(
+        "SELECT pg_try_advisory_lock(%s)", (ROTATION_LOCK_ID,)
+    ).fetchone()[0]
+    conn.commit()
+    if not locked:
+        return {"created": [], "dropped": [], "default_expired": 0}
+    try:
+        return _rotate(conn, ttl, ahead, now, lock_timeout)
+    finally:
+        # Session lock: released explicitly before the connection goes back to its pool
+        conn.rollback()
+        conn.execute("SELECT pg_advisory_unlock(%s)", (ROTATION_LOCK_ID,))
+        conn.commit()
+
+
+def _rotate(
+    conn: Connection,
+    ttl: timedelta,
+    ahead: int,
+    now: datetime | None,
+    lock_timeout: str,
+) -> dict:
+    now = now or datetime.now(timezone.utc)
+    current = now.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    existing = {row[0] for row in conn.execute(_LIST_PARTITIONS).fetchall()}
+    conn.commit()
+
+    created = []
+    for hour in range(ahead + 1):
+        start = current + hour * PARTITION_PERIOD
+        if partition_name(start) not in existing:
+            _create_partition(conn, start, lock_timeout)
+            created.append(partition_name(start))
+
+    dropped = []
+    for name in sorted(existing):
+        start = partition_start(name)
+        if start is not None and start + PARTITION_PERIOD <= now - ttl:
+            _drop_partition(conn, name, lock_timeout)
+            dropped.append(name)
+
+    with conn.transaction():
+        expired = conn.execute(
+            sql.SQL("DELETE FROM {} WHERE created_at < %s").format(
+                sql.Identifier(DEFAULT_PARTITION)
+            ),
+            (now - ttl,),
+        ).rowcount
+
+    return {"created": created, "dropped": dropped, "default_expired": expired}
+
+
+@contextmanager
+def _database_connections():
+    from src.services.database import SHARDED_MODE, pool, sharded_db
+
+    if not SHARDED_MODE:
+        with pool.connection() as conn:
+            yield [conn]
+        return
+    # Each node rotates its own partitions
+    with ExitStack() as stack:
+        yield [
+            stack.enter_context(sharded_db.connection(node))
+            for node in sharded_db.pools
+        ]
+
+
+class PartitionRotator:
+    """
+    Runs `rotate` every `interval` seconds on each Postgres database, replacing the row
+    deletes of the sweeper there.
+    """
+
+    __connections: Callable[[], AbstractContextManager[list[Connection]]]
+    __ttl: timedelta
+    __ahead: int
+    __interval: float
+    __stop: threading.Event
+    __thread: threading.Thread | None
+    __last_rotation: dict
+
+    def __init__(
+        self,
+        connections: Callable[
+            [], AbstractContextManager[list[Connection]]
+        ] = _database_connections,
+        ttl: timedelta = CODE_TTL,
+        ahead: int = 3,
+        interval: float = 300,
+    ):
+        self.__connections = connections
+        self.__ttl = ttl
+        self.__ahead = ahead
+        self.__interval = interval
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__last_rotation = {}
+
+    def rotate_once(self) -> dict:
+        start = time.perf_counter()
+        report = {"created": [], "dropped": [], "default_expired": 0}
+        with self.__connections() as connections:
+            for conn in connections:
+                rotated = rotate(conn, self.__ttl, self.__ahead)
+                for key, value in rotated.items():
+                    report[key] += value
+        self.__last_rotation = {
+            **report,
+            "duration_ms": (time.perf_counter() - start) * 1000,
+        }
+        return self.__last_rotation
+
+    def start(self) -> None:
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, name="partition-rotator", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def stats(self) -> dict:
+        return dict(self.__last_rotation)
+
+    def __run(self) -> None:
+        while not self.__stop.is_set():
+            try:
+                report = self.rotate_once()
+                if report["created"] or report["dropped"]:
+                    print(f"Activation code partitions: {report}", flush=True)
+            except Exception as e:
+                # Partitions are created hours ahead, the next rotation has time to retry
+                print(f"Activation code partition rotation failed: {e!r}", flush=True)
+            self.__stop.wait(self.__interval)
+
+
+PARTITION_ROTATION_ENABLED = os.getenv("PARTITION_ROTATION_ENABLED", "true") == "true"
+
+partition_rotator = PartitionRotator(
+    ahead=int(os.getenv("PARTITIONS_AHEAD", "3")),
+    interval=float(os.getenv("PARTITION_ROTATION_INTERVAL", "300")),
+)
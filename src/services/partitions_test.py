@@ -0,0 +1,120 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import psycopg
+import pytest
+
+from src.repositories.activation_code import CODE_TTL
+from src.services.migrations import migrate
+from src.services.partitions import (
+    _LIST_PARTITIONS,
+    ROTATION_LOCK_ID,
+    partition_name,
+    partition_start,
+    rotate,
+)
+
+# Far from the partitions of the dev database
+PAST = datetime(2001, 1, 1, 10, 30, tzinfo=timezone.utc)
+
+
+def test_partition_name_round_trip():
+    start = datetime(2030, 5, 17, 8, tzinfo=timezone.utc)
+    assert partition_name(start) == "activation_code_p2030051708"
+    assert partition_start(partition_name(start)) == start
+    assert partition_start("activation_code_default") is None
+
+
+@pytest.fixture
+def code_user(db_conn):
+    migrate(db_conn)
+    user_id = db_conn.execute(
+        """
+INSERT INTO users (email, password) VALUES ('partitions@test.com', 'hash')
+ON CONFLICT (email) DO UPDATE SET password = EXCLUDED.password
+RETURNING id
+"""
+    ).fetchone()[0]
+    db_conn.commit()
+
+    yield user_id
+
+    db_conn.rollback()
+    for (name,) in db_conn.execute(_LIST_PARTITIONS).fetchall():
+        if name.startswith(partition_name(PAST)[:-2]):
+            db_conn.execute(f"DROP TABLE {name}")
+    # Its codes go with it
+    db_conn.execute("DELETE FROM users WHERE id = %s", (user_id,))
+    db_conn.commit()
+
+
+def _partition_of_code(db_conn, user_id: int) -> str | None:
+    row = db_conn.execute(
+        "SELECT tableoid::regclass::text FROM activation_code WHERE user_id = %s",
+        (user_id,),
+    ).fetchone()
+    db_conn.commit()
+    return row and row[0]
+
+
+def test_rotate_creates_partitions_ahead_and_drops_expired_ones(db_conn, code_user):
+    # Inserted before its partition exists: kept by the default one meanwhile
+    db_conn.execute(
+        "INSERT INTO activation_code (user_id, code, created_at) VALUES (%s, '1234', %s)",
+        (code_user, PAST + timedelta(hours=1)),
+    )
+    db_conn.commit()
+    assert _partition_of_code(db_conn, code_user) == "activation_code_default"
+
+    report = rotate(db_conn, CODE_TTL, ahead=2, now=PAST)
+    assert report["created"] == [
+        "activation_code_p2001010110",
+        "activation_code_p2001010111",
+        "activation_code_p2001010112",
+    ]
+    assert _partition_of_code(db_conn, code_user) == "activation_code_p2001010111"
+    assert rotate(db_conn, CODE_TTL, ahead=2, now=PAST)["created"] == []
+
+    report = rotate(
+        db_conn, CODE_TTL, ahead=2, now=PAST + timedelta(hours=2, minutes=5)
+    )
+    assert report["dropped"] == [
+        "activation_code_p2001010110",
+        "activation_code_p2001010111",
+    ]
+    assert _partition_of_code(db_conn, code_user) is None
+
+
+def test_rotate_skips_while_another_worker_rotates(db_conn, code_user):
+    with psycopg.connect(os.getenv("DB_URL")) as other_worker:
+        other_worker.execute("SELECT pg_advisory_lock(%s)", (ROTATION_LOCK_ID,))
+        assert rotate(db_conn, CODE_TTL, ahead=2, now=PAST)["created"] == []
+        other_worker.execute("SELECT pg_advisory_unlock(%s)", (ROTATION_LOCK_ID,))
+
+    assert len(rotate(db_conn, CODE_TTL, ahead=2, now=PAST)["created"]) == 3
+
+
+def test_code_lookup_prunes_to_the_current_partitions(db_conn):
+    migrate(db_conn)
+    now = datetime.now(timezone.utc)
+    rotate(db_conn, CODE_TTL, ahead=3, now=now)
+
+    plan = "\n".join(
+        row[0]
+        for row in db_conn.execute(
+            """
+EXPLAIN SELECT 1 from activation_code
+WHERE activation_code.user_id = %s
+    AND activation_code.code = %s
+    AND created_at >= %s
+    AND created_at < %s
+LIMIT 1
+""",
+            (1, "1234", now - CODE_TTL, now + CODE_TTL),
+        ).fetchall()
+    )
+    db_conn.rollback()
+
+    assert partition_name(now) in plan
+    assert partition_name(now + timedelta(hours=2)) not in plan
+    assert partition_name(now + timedelta(hours=3)) not in plan
@@ -0,0 +1,257 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+PROFILING_HEADER = "X-Profile"
+
+
+class StackSampler:
+    """
+    Statistical profiler: a thread snapshots the stack of every thread, or of the
+    `thread_ids` ones, each `interval` seconds. Samples are collapsed stacks
+    ("thread;outer;...;inner") counted as in flamegraph input.
+    """
+
+    __interval: float
+    __thread_ids: set[int] | None
+    __samples: Counter
+    __labels: dict
+    __stop: threading.Event
+    __thread: threading.Thread | None
+
+    def __init__(self, interval: float = 0.005, thread_ids: set[int] | None = None):
+        self.__interval = interval
+        self.__thread_ids = thread_ids
+        self.__samples = Counter()
+        self.__labels = {}
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def start(self) -> "StackSampler":
+        self.__thread = threading.Thread(
+            target=self.__run, name="stack-sampler", daemon=True
+        )
+        self.__thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+        return self.__samples
+
+    def __run(self) -> None:
+        own_id = threading.get_ident()
+        while not self.__stop.wait(self.__interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (
+                    self.__thread_ids is not None and thread_id not in self.__thread_ids
+                ):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self.__label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.__samples[";".join(reversed(stack))] += 1
+
+    def __label(self, code) -> str:
+        # Formatted once per code object, samples are taken hundreds of times per second
+        label = self.__labels.get(code)
+        if label is None:
+            filename = os.path.basename(code.co_filename)
+            label = self.__labels[code] = (
+                f"{code.co_name} ({filename}:{code.co_firstlineno})"
+            )
+        return label
+
+
+class ProfileStore:
+    """
+    Writes collapsed stacks to `directory`, keeping the `max_files` most recent profiles.
+    """
+
+    directory: Path
+    __max_files: int
+    __lock: threading.Lock
+
+    def __init__(self, directory: str, max_files: int = 100):
+        self.directory = Path(directory)
+        self.__max_files = max_files
+        self.__lock = threading.Lock()
+
+    def write(self, name: str, samples: Counter) -> Path:
+        safe_name = re.sub(r"[^\w.-]+", "_", name).strip("_")
+        now = time.time()
+        timestamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}"
+        path = self.directory / f"{timestamp}-{safe_name}.folded"
+        with self.__lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path.write_text(
+                "".join(f"{stack} {count}\n" for stack, count in samples.items())
+            )
+            profiles = sorted(
+                self.directory.glob("*.folded"), key=lambda p: p.stat().st_mtime
+            )
+            for old in profiles[: max(0, len(profiles) - self.__max_files)]:
+                old.unlink(missing_ok=True)
+        return path
+
+
+def sign(
+    secret: bytes, method: str, path: str, expires: int, nonce: str | None = None
+) -> str:
+    """
+    `X-Profile` header value for one `method` `path` request, valid until the `expires`
+    unix timestamp. `Profiler.verify` accepts each nonce once.
+    """
+    nonce = nonce or secrets.token_hex(8)
+    message = f"{method.upper()} {path} {expires} {nonce}".encode()
+    digest = hmac.new(secret, message, hashlib.sha256).hexdigest()
+    return f"{expires}.{nonce}.{digest}"
+
+
+def verify(secret: bytes, value: str | None, method: str, path: str) -> bool:
+    if not secret or not value:
+        return False
+    try:
+        expires, nonce, _ = value.split(".")
+        expires = int(expires)
+    except ValueError:
+        return False
+    return expires >= time.time() and hmac.compare_digest(
+        sign(secret, method, path, expires, nonce), value
+    )
+
+
+class Profiler:
+    """
+    Runs one sampler at a time, for a request or for a time-boxed process profile.
+    """
+
+    store: ProfileStore
+    secret: bytes
+    sample_rate: float
+    __interval: float
+    __busy: threading.Lock
+    # Nonce -> expiry of the signatures already accepted
+    __used: dict[str, int]
+    __used_lock: threading.Lock
+
+    def __init__(
+        self,
+        store: ProfileStore,
+        secret: bytes = b"",
+        sample_rate: float = 0,
+        interval: float = 0.005,
+    ):
+        self.store = store
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.__interval = interval
+        self.__busy = threading.Lock()
+        self.__used = {}
+        self.__used_lock = threading.Lock()
+
+    def verify(self, header: str | None, method: str, path: str) -> bool:
+        """
+        Checks a signature made for this request, and spends its nonce so that it can't
+        be replayed. Nonces are remembered per worker process until they expire.
+        """
+        if not verify(self.secret, header, method, path):
+            return False
+        expires, nonce, _ = header.split(".")
+        now = time.time()
+        with self.__used_lock:
+            for used, used_expires in list(self.__used.items()):
+                if used_expires < now:
+                    del self.__used[used]
+            if nonce in self.__used:
+                return False
+            self.__used[nonce] = int(expires)
+        return True
+
+    def should_profile(self, header: str | None, method: str, path: str) -> bool:
+        return self.verify(header, method, path) or (
+            self.sample_rate > 0 and random.random() < self.sample_rate
+        )
+
+    def start(self, thread_ids: set[int] | None = None) -> StackSampler | None:
+        """
+        Samples the `thread_ids` threads, or all of them. Returns None when a profile is
+        already running.
+        """
+        if not self.__busy.acquire(blocking=False):
+            return None
+        return StackSampler(self.__interval, thread_ids).start()
+
+    def finish(self, sampler: StackSampler, name: str) -> Path:
+        try:
+            return self.store.write(name, sampler.stop())
+        finally:
+            self.__busy.release()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware sampling requests carrying a valid `X-Profile` header, or a random
+    `sample_rate` share of them. Only added to the app when PROFILING_ENABLED is set.
+    Only the event loop thread serving the request is sampled: sync use cases and
+    repositories show up as the wait on the threadpool.
+    """
+
+    def __init__(self, app, profiler: Profiler, skip_paths: tuple[str, ...] = ()):
+        self.app = app
+        self.profiler = profiler
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            return await self.app(scope, receive, send)
+
+        header = dict(scope["headers"]).get(PROFILING_HEADER.lower().encode())
+        if not self.profiler.should_profile(
+            header and header.decode(), scope["method"], scope["path"]
+        ):
+            return await self.app(scope, receive, send)
+        sampler = self.profiler.start({threading.get_ident()})
+        if sampler is None:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = getattr(scope.get("route"), "path", scope["path"])
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            await asyncio.to_thread(
+                self.profiler.finish,
+                sampler,
+                f"{scope['method']}-{route}-{elapsed_ms:.0f}ms",
+            )
+
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false") == "true"
+# Max duration of a process profile triggered by the admin endpoint
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "60"))
+
+profiler = Profiler(
+    ProfileStore(
+        os.getenv("PROFILING_DIR", "/tmp/profiles"),
+        max_files=int(os.getenv("PROFILING_MAX_FILES", "100")),
+    ),
+    secret=os.getenv("PROFILING_SECRET", "").encode(),
+    sample_rate=float(os.getenv("PROFILING_SAMPLE_RATE", "0")),
+    interval=float(os.getenv("PROFILING_INTERVAL", "0.005")),
+)
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.services.profiler import (
+    ProfileStore,
+    Profiler,
+    ProfilingMiddleware,
+    StackSampler,
+    sign,
+    verify,
+)
+
+SECRET = b"test-secret"
+
+
+def _busy_loop(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_collapses_thread_stacks():
+    sampler = StackSampler(interval=0.001).start()
+    _busy_loop(0.1)
+    samples = sampler.stop()
+
+    assert any(
+        stack.startswith("MainThread;") and "_busy_loop" in stack for stack in samples
+    )
+
+
+def test_sampler_only_samples_the_given_threads():
+    other = threading.Thread(target=_busy_loop, args=(0.1,), name="other")
+    other.start()
+    sampler = StackSampler(interval=0.001, thread_ids={threading.get_ident()}).start()
+    _busy_loop(0.1)
+    samples = sampler.stop()
+    other.join()
+
+    assert samples
+    assert all(stack.startswith("MainThread;") for stack in samples)
+
+
+def test_signature_expires():
+    expires = int(time.time()) + 60
+    assert verify(SECRET, sign(SECRET, "GET", "/slow", expires), "GET", "/slow")
+    assert not verify(
+        SECRET, sign(SECRET, "GET", "/slow", int(time.time()) - 1), "GET", "/slow"
+    )
+    assert not verify(
+        b"other-secret", sign(SECRET, "GET", "/slow", expires), "GET", "/slow"
+    )
+    assert not verify(SECRET, "garbage", "GET", "/slow")
+
+
+def test_signature_is_bound_to_the_request_and_single_use():
+    profiler = Profiler(ProfileStore("/tmp/unused"), secret=SECRET)
+    header = sign(SECRET, "POST", "/api/admin/profile", int(time.time()) + 60)
+
+    assert not profiler.verify(header, "GET", "/api/admin/profile")
+    assert not profiler.verify(header, "POST", "/api/admin/stats")
+    assert profiler.verify(header, "POST", "/api/admin/profile")
+    # Replayed
+    assert not profiler.verify(header, "POST", "/api/admin/profile")
+
+
+def test_middleware_profiles_signed_requests_only(tmp_path):
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        _busy_loop(0.05)
+        return "ok"
+
+    store = ProfileStore(str(tmp_path), max_files=2)
+    app.add_middleware(ProfilingMiddleware, profiler=Profiler(store, secret=SECRET))
+    client = TestClient(app)
+
+    def header():
+        return {"X-Profile": sign(SECRET, "GET", "/slow", int(time.time()) + 60)}
+
+    client.get("/slow")
+    assert list(tmp_path.iterdir()) == []
+
+    for _ in range(3):
+        client.get("/slow", headers=header())
+    profiles = list(tmp_path.glob("*-GET-_slow-*ms.folded"))
+    # Rotated, the oldest profile was removed
+    assert len(profiles) == 2
+    assert "slow (profiler_test.py" in profiles[0].read_text()
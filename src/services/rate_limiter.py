@@ -0,0 +1,167 @@
+import base64
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by client, spread over shards that each have their own lock and
+    (allowed, rejected) counters. A bucket that refilled completely is the same as no
+    bucket, so buckets are evicted once full again, and the least recently used ones
+    beyond `max_keys`.
+    """
+
+    __shards: list[tuple[threading.Lock, OrderedDict, list[int]]]
+    __max_shard_size: int
+
+    def __init__(self, shards: int = 64, max_keys: int = 1_000_000):
+        self.__shards = [
+            (threading.Lock(), OrderedDict(), [0, 0]) for _ in range(shards)
+        ]
+        self.__max_shard_size = max(1, max_keys // shards)
+
+    def hit(self, key: str, rate: float, burst: int) -> float:
+        """
+        Takes a token from the `key` bucket (`burst` tokens, refilled at `rate` per second).
+        Returns 0 when allowed, otherwise the seconds to wait for the next token.
+        """
+        lock, buckets, counts = self.__shards[hash(key) % len(self.__shards)]
+        now = time.monotonic()
+        with lock:
+            # (tokens, updated_at, full_at)
+            bucket = buckets.pop(key, None)
+            tokens = (
+                min(burst, bucket[0] + (now - bucket[1]) * rate) if bucket else burst
+            )
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            self.__evict(buckets, now)
+
+            if allowed:
+                counts[0] += 1
+                return 0
+            counts[1] += 1
+            return (1 - tokens) / rate
+
+    def clear(self) -> None:
+        for lock, buckets, _ in self.__shards:
+            with lock:
+                buckets.clear()
+
+    def stats(self) -> dict:
+        stats = {"keys": 0, "allowed": 0, "rejected": 0}
+        for lock, buckets, counts in self.__shards:
+            with lock:
+                stats["keys"] += len(buckets)
+                stats["allowed"] += counts[0]
+                stats["rejected"] += counts[1]
+        return stats
+
+    def __evict(self, buckets: OrderedDict, now: float) -> None:
+        # A few buckets per hit keeps eviction amortized
+        for _ in range(2):
+            oldest = next(iter(buckets), None)
+            if oldest is None:
+                return
+            # Only buckets full before now: whether a hit lands in the shard of a bucket
+            # refilled at that very moment doesn't change the result
+            if buckets[oldest][2] >= now and len(buckets) <= self.__max_shard_size:
+                return
+            del buckets[oldest]
+
+
+def _parse_limit(value: str) -> tuple[float, int] | None:
+    """
+    "10/60" allows bursts of 10 requests, refilled over 60 seconds. "0" disables the limit.
+    """
+    if value.strip() == "0":
+        return None
+    requests, seconds = value.split("/")
+    return int(requests) / float(seconds), int(requests)
+
+
+async def _basic_auth_email(request: Request) -> str | None:
+    # Cheap decode only, credentials are checked later by auth._parse_basic_auth
+    try:
+        header = request.headers.get("Authorization", "")
+        return base64.b64decode(header.split(" ")[1]).decode().split(":")[0]
+    except Exception:
+        return None
+
+
+async def _body_email(request: Request) -> str | None:
+    # The body is already read and cached by FastAPI at this point
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    return str(body.get("email")) if isinstance(body, dict) else None
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true") == "true"
+
+# Per route limits, by client IP and by account email
+RATE_LIMITS = {
+    "register": {
+        "ip": _parse_limit(os.getenv("RATE_LIMIT_REGISTER_IP", "20/60")),
+        "email": _parse_limit(os.getenv("RATE_LIMIT_REGISTER_EMAIL", "3/60")),
+    },
+    "register_batch": {
+        "ip": _parse_limit(os.getenv("RATE_LIMIT_REGISTER_BATCH_IP", "5/60")),
+    },
+    "activate": {
+        "ip": _parse_limit(os.getenv("RATE_LIMIT_ACTIVATE_IP", "30/60")),
+        "email": _parse_limit(os.getenv("RATE_LIMIT_ACTIVATE_EMAIL", "10/60")),
+    },
+}
+
+_email_getters = {
+    "register": _body_email,
+    "activate": _basic_auth_email,
+}
+
+rate_limiter = RateLimiter(
+    shards=int(os.getenv("RATE_LIMIT_SHARDS", "64")),
+    max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "1000000")),
+)
+
+
+def rate_limit(route: str):
+    """
+    Route dependency, to pass in `dependencies=` so it runs before the route's own
+    dependencies (authentication, hashing, database).
+    """
+    limits = RATE_LIMITS[route]
+
+    async def check_rate_limit(request: Request) -> None:
+        if not RATE_LIMIT_ENABLED:
+            return
+
+        keys = []
+        if limits.get("ip"):
+            # The proxy's own address behind a reverse proxy, unless it is trusted with
+            # FORWARDED_ALLOW_IPS so uvicorn puts the X-Forwarded-For client here
+            client = request.client.host if request.client else "unknown"
+            keys.append((f"{route}:ip:{client}", limits["ip"]))
+        if limits.get("email"):
+            email = await _email_getters[route](request)
+            if email:
+                keys.append((f"{route}:email:{email.lower()}", limits["email"]))
+
+        for key, (rate, burst) in keys:
+            retry_after = rate_limiter.hit(key, rate, burst)
+            if retry_after:
+                raise HTTPException(
+                    429,
+                    "Too many requests",
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+
+    return check_rate_limit
@@ -0,0 +1,65 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from src.services.rate_limiter import RATE_LIMITS, RateLimiter, _parse_limit, rate_limit
+
+
+# One shard puts both keys in the same one
+@pytest.mark.parametrize("shards", [1, 64])
+def test_rate_limiter_allows_burst_then_refills(shards):
+    limiter = RateLimiter(shards=shards)
+    with patch("src.services.rate_limiter.time.monotonic", return_value=100):
+        assert [limiter.hit("ip:1", rate=1, burst=3) for _ in range(3)] == [0, 0, 0]
+        assert limiter.hit("ip:1", rate=1, burst=3) == 1
+        # Other keys have their own bucket
+        assert limiter.hit("ip:2", rate=1, burst=3) == 0
+
+    with patch("src.services.rate_limiter.time.monotonic", return_value=101):
+        assert limiter.hit("ip:1", rate=1, burst=3) == 0
+
+    assert limiter.stats() == {"keys": 2, "allowed": 5, "rejected": 1}
+
+
+def test_rate_limiter_evicts_refilled_and_overflowing_buckets():
+    limiter = RateLimiter(shards=1, max_keys=100)
+    with patch("src.services.rate_limiter.time.monotonic", return_value=100):
+        for i in range(150):
+            limiter.hit(f"ip:{i}", rate=1, burst=5)
+        assert limiter.stats()["keys"] == 100
+
+    # Refilled buckets go away as new keys come in
+    with patch("src.services.rate_limiter.time.monotonic", return_value=200):
+        for i in range(50):
+            limiter.hit(f"new:{i}", rate=1, burst=5)
+        assert limiter.stats()["keys"] == 50
+
+
+def test_parse_limit():
+    assert _parse_limit("10/60") == (10 / 60, 10)
+    assert _parse_limit("0") is None
+
+
+def test_rate_limit_keys_on_the_forwarded_client_of_trusted_proxies_only(monkeypatch):
+    monkeypatch.setitem(RATE_LIMITS["register_batch"], "ip", (1 / 60, 1))
+    limited_app = FastAPI()
+
+    @limited_app.get("/", dependencies=[Depends(rate_limit("register_batch"))])
+    def index():
+        return {}
+
+    def statuses(client):
+        return [
+            client.get("/", headers={"X-Forwarded-For": ip}).status_code
+            for ip in ("1.1.1.1", "1.1.1.1", "2.2.2.2")
+        ]
+
+    behind_proxy = TestClient(
+        ProxyHeadersMiddleware(limited_app, trusted_hosts="testclient")
+    )
+    assert statuses(behind_proxy) == [200, 429, 200]
+    # An untrusted peer can't pick its bucket
+    assert statuses(TestClient(limited_app)) == [200, 429, 429]
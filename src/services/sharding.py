@@ -0,0 +1,241 @@
+import hashlib
+import json
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import psycopg_pool
+from psycopg import Connection
+
+# Logical shards: fixed for the life of the data, every user id encodes its bucket
+# (id = sequence value * BUCKETS + bucket). Nodes own buckets, resharding moves them.
+BUCKETS = 1024
+
+# (table, user id column, columns) copied when a bucket moves, users first for the foreign key
+_MOVED_TABLES = (
+    ("users", "id", "id, email, password, activated, created_at"),
+    ("activation_code", "user_id", "id, user_id, code, created_at"),
+)
+
+
+def email_bucket(email: str) -> int:
+    # Stable across processes and versions, unlike hash()
+    digest = hashlib.blake2b(email.strip().lower().encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % BUCKETS
+
+
+def id_bucket(user_id: int) -> int:
+    return user_id % BUCKETS
+
+
+class ShardMap:
+    """
+    Which node owns each bucket. Loaded from JSON:
+    {"nodes": {"a": "postgresql://...", ...}, "buckets": [[first, last, "a"], ...]}
+    "buckets" (inclusive ranges) may be left out to split them evenly, in node order.
+    """
+
+    nodes: dict[str, str]
+    __owners: list[str]
+
+    def __init__(self, nodes: dict[str, str], owners: list[str]):
+        if not nodes:
+            raise ValueError("A shard map needs at least one node")
+        if len(owners) != BUCKETS:
+            raise ValueError(f"{len(owners)} buckets assigned out of {BUCKETS}")
+        unknown = set(owners) - set(nodes)
+        if unknown:
+            raise ValueError(f"Buckets assigned to unknown nodes: {sorted(unknown)}")
+        self.nodes = dict(nodes)
+        self.__owners = list(owners)
+
+    @classmethod
+    def even(cls, nodes: dict[str, str]) -> "ShardMap":
+        names = list(nodes)
+        return cls(
+            nodes, [names[bucket * len(names) // BUCKETS] for bucket in range(BUCKETS)]
+        )
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ShardMap":
+        nodes = config["nodes"]
+        if "buckets" not in config:
+            return cls.even(nodes)
+        owners = [None] * BUCKETS
+        for first, last, node in config["buckets"]:
+            owners[first : last + 1] = [node] * (last - first + 1)
+        if None in owners:
+            raise ValueError(f"Bucket {owners.index(None)} isn't assigned")
+        return cls(nodes, owners)
+
+    @classmethod
+    def load(cls, path: str) -> "ShardMap":
+        with open(path) as file:
+            return cls.from_config(json.load(file))
+
+    def to_config(self) -> dict:
+        ranges = []
+        for bucket, node in enumerate(self.__owners):
+            if ranges and ranges[-1][2] == node:
+                ranges[-1][1] = bucket
+            else:
+                ranges.append([bucket, bucket, node])
+        return {"nodes": self.nodes, "buckets": ranges}
+
+    def node_for_bucket(self, bucket: int) -> str:
+        return self.__owners[bucket]
+
+    def node_for_email(self, email: str) -> str:
+        return self.__owners[email_bucket(email)]
+
+    def node_for_id(self, user_id: int) -> str:
+        return self.__owners[id_bucket(user_id)]
+
+    def buckets_of(self, node: str) -> list[int]:
+        return [bucket for bucket, owner in enumerate(self.__owners) if owner == node]
+
+    def rebalance(self, nodes: dict[str, str]) -> "ShardMap":
+        """
+        New map over `nodes` where each node owns about as many buckets, moving as few
+        buckets as possible: only the surplus of each node, and those of removed nodes.
+        """
+        names = list(nodes)
+        targets = {
+            name: BUCKETS // len(names) + (i < BUCKETS % len(names))
+            for i, name in enumerate(names)
+        }
+        owners = list(self.__owners)
+        kept = dict.fromkeys(names, 0)
+        moving = []
+        for bucket, owner in enumerate(owners):
+            if owner in kept and kept[owner] < targets[owner]:
+                kept[owner] += 1
+            else:
+                moving.append(bucket)
+        for name in names:
+            for _ in range(targets[name] - kept[name]):
+                owners[moving.pop()] = name
+
+        return ShardMap(nodes, owners)
+
+    def moves(self, other: "ShardMap") -> dict[tuple[str, str], list[int]]:
+        """
+        Buckets changing node from this map to `other`, by (source, destination).
+        """
+        moves = {}
+        for bucket, source in enumerate(self.__owners):
+            destination = other.node_for_bucket(bucket)
+            if source != destination:
+                moves.setdefault((source, destination), []).append(bucket)
+        return moves
+
+
+class ShardedDatabase:
+    """
+    One connection pool per node of the shard map, created closed like the main pool.
+    """
+
+    shard_map: ShardMap
+    pools: dict[str, psycopg_pool.ConnectionPool]
+
+    def __init__(self, shard_map: ShardMap, min_size: int = 2, max_size: int = 10):
+        self.shard_map = shard_map
+        self.pools = {
+            node: psycopg_pool.ConnectionPool(
+                conninfo=conninfo,
+                min_size=min_size,
+                max_size=max_size,
+                timeout=30,
+                num_workers=2,
+                open=False,
+            )
+            for node, conninfo in shard_map.nodes.items()
+        }
+
+    def open(self, wait: bool = True) -> None:
+        for pool in self.pools.values():
+            pool.open(wait=wait)
+
+    def close(self) -> None:
+        for pool in self.pools.values():
+            pool.close()
+
+    @property
+    def is_open(self) -> bool:
+        return all(not pool.closed for pool in self.pools.values())
+
+    @contextmanager
+    def connection(self, node: str) -> Iterator[Connection]:
+        """
+        A transaction on `node`, committed on exit.
+        """
+        with self.pools[node].connection() as conn:
+            yield conn
+
+    def connection_for_email(self, email: str):
+        return self.connection(self.shard_map.node_for_email(email))
+
+    def connection_for_id(self, user_id: int):
+        return self.connection(self.shard_map.node_for_id(user_id))
+
+    def stats(self) -> dict:
+        return {
+            node: {
+                "buckets": len(self.shard_map.buckets_of(node)),
+                "connections": pool.get_stats().get("pool_size", 0),
+            }
+            for node, pool in self.pools.items()
+        }
+
+
+def move_buckets(
+    source: Connection, destination: Connection, buckets: list[int]
+) -> int:
+    """
+    Copies the users of `buckets` with their activation codes from `source` to
+    `destination` (autocommit connections), then deletes them from `source`. Returns the
+    number of users moved. Offline only: writes to those buckets meanwhile would be lost.
+
+    `destination` commits first, a failure in between leaves rows on both nodes: the rows
+    still on `source` replace their copies, so the move can be run again.
+    """
+    with destination.transaction():
+        for table, key, columns in _MOVED_TABLES:
+            destination.execute(
+                f"CREATE TEMP TABLE moved_{table} (LIKE {table}) ON COMMIT DROP"
+            )
+            with source.cursor() as out_cursor, destination.cursor() as in_cursor:
+                with out_cursor.copy(
+                    f"COPY (SELECT {columns} FROM {table} WHERE mod({key}, %s) = ANY(%s)) TO STDOUT",
+                    (BUCKETS, buckets),
+                ) as out, in_cursor.copy(
+                    f"COPY moved_{table} ({columns}) FROM STDIN"
+                ) as into:
+                    for data in out:
+                        into.write(data)
+            if table == "users":
+                # Copies left by an interrupted move, codes go with them (ON DELETE CASCADE)
+                destination.execute(
+                    "DELETE FROM users WHERE id IN (SELECT id FROM moved_users)"
+                )
+            inserted = destination.execute(
+                f"INSERT INTO {table} ({columns}) SELECT {columns} FROM moved_{table}"
+            )
+            if table == "users":
+                moved = inserted.rowcount
+            # Ids allocated on `destination` must stay above the moved ones
+            destination.execute(
+                f"""
+SELECT setval(
+    '{table}_id_seq',
+    GREATEST((SELECT last_value FROM {table}_id_seq), (SELECT max(id) / %s FROM {table}))
+)
+""",
+                (BUCKETS,),
+            )
+
+    with source.transaction():
+        source.execute(
+            "DELETE FROM users WHERE mod(id, %s) = ANY(%s)", (BUCKETS, buckets)
+        )
+
+    return moved
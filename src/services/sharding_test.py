@@ -0,0 +1,187 @@
+import psycopg
+import pytest
+from psycopg.conninfo import make_conninfo
+
+from src.models import User
+from src.models.value_objects import Email, Password
+from src.repositories.activation_code import ShardedActivationCodeRepository
+from src.repositories.exceptions import DuplicateEmailError, UserNotFound
+from src.repositories.user import ShardedUserRepository
+from src.services import migrations
+from src.services.sharding import (
+    BUCKETS,
+    ShardedDatabase,
+    ShardMap,
+    email_bucket,
+    id_bucket,
+    move_buckets,
+)
+
+SHARD_DATABASES = ("test_shard_a", "test_shard_b", "test_shard_c")
+
+
+def _user(email: str) -> User:
+    return User(Email(email), Password("Password123!"))
+
+
+def test_email_bucket_ignores_case_and_spaces():
+    assert email_bucket("User@Test.com ") == email_bucket("user@test.com")
+    assert 0 <= email_bucket("user@test.com") < BUCKETS
+    assert id_bucket(7 * BUCKETS + 42) == 42
+
+
+def test_shard_map_config_round_trip():
+    shard_map = ShardMap.even({"a": "dbname=a", "b": "dbname=b"})
+    assert shard_map.to_config()["buckets"] == [
+        [0, BUCKETS // 2 - 1, "a"],
+        [BUCKETS // 2, BUCKETS - 1, "b"],
+    ]
+    loaded = ShardMap.from_config(shard_map.to_config())
+    assert loaded.buckets_of("b") == shard_map.buckets_of("b")
+
+    with pytest.raises(ValueError):
+        ShardMap.from_config({"nodes": {"a": ""}, "buckets": [[0, 10, "a"]]})
+
+
+def test_rebalance_moves_only_the_new_node_share():
+    current = ShardMap.even({"a": "dbname=a", "b": "dbname=b"})
+    rebalanced = current.rebalance({"a": "dbname=a", "b": "dbname=b", "c": "dbname=c"})
+
+    sizes = [len(rebalanced.buckets_of(node)) for node in ("a", "b", "c")]
+    assert max(sizes) - min(sizes) <= 1
+    moves = current.moves(rebalanced)
+    assert set(moves) == {("a", "c"), ("b", "c")}
+    assert sum(len(buckets) for buckets in moves.values()) == len(
+        rebalanced.buckets_of("c")
+    )
+
+
+@pytest.fixture
+def shard_urls(db_conn):
+    """Empty, migrated databases next to DB_URL's, one per node"""
+    db_conn.autocommit = True
+    existing = {
+        row[0] for row in db_conn.execute("SELECT datname FROM pg_database").fetchall()
+    }
+    urls = {}
+    for name in SHARD_DATABASES:
+        if name not in existing:
+            db_conn.execute(f"CREATE DATABASE {name}")
+        urls[name[-1]] = make_conninfo(db_conn.info.dsn, dbname=name)
+        with psycopg.connect(urls[name[-1]], autocommit=True) as conn:
+            migrations.migrate(conn)
+            conn.execute("TRUNCATE users, activation_code RESTART IDENTITY CASCADE")
+    return urls
+
+
+@pytest.fixture
+def sharded_db(shard_urls):
+    db = ShardedDatabase(
+        ShardMap.even({"a": shard_urls["a"], "b": shard_urls["b"]}), min_size=1
+    )
+    db.open()
+    yield db
+    db.close()
+
+
+def _emails_by_node(db: ShardedDatabase) -> dict[str, list[str]]:
+    emails = {}
+    for node in db.pools:
+        with db.connection(node) as conn:
+            emails[node] = [
+                row[0] for row in conn.execute("SELECT email FROM users").fetchall()
+            ]
+    return emails
+
+
+def test_sharded_repository_routes_by_email_and_id(sharded_db):
+    repository = ShardedUserRepository(sharded_db)
+    users = [_user(f"user{i}@test.com") for i in range(20)]
+    created = repository.save_users(users + [_user("user0@test.com")])
+    assert created == users
+    repository.save_user(_user("single@test.com"))
+    with pytest.raises(DuplicateEmailError):
+        repository.save_user(_user("single@test.com"))
+
+    emails = _emails_by_node(sharded_db)
+    # Spread over both nodes, each email on the node owning its bucket
+    assert emails["a"] and emails["b"]
+    for node, node_emails in emails.items():
+        assert {sharded_db.shard_map.node_for_email(e) for e in node_emails} == {node}
+
+    user = repository.select_by_email("user3@test.com")
+    assert id_bucket(user["id"]) == email_bucket("user3@test.com")
+    code = users[3].to_public_snapshot().get("activation_code")
+    ShardedActivationCodeRepository(sharded_db).has_valid_code(user["id"], code)
+    repository.activate_with_code(user["id"], code)
+    assert repository.select_by_email("user3@test.com")["activated"]
+    with pytest.raises(UserNotFound):
+        repository.select_by_email("unknown@test.com")
+
+    streamed = list(repository.stream_emails())
+    assert [id for id, _ in streamed] == sorted(id for id, _ in streamed)
+    assert len(streamed) == 21
+
+
+def test_sharded_sweep_deletes_expired_codes_of_every_node(sharded_db):
+    ShardedUserRepository(sharded_db).save_users(
+        [_user(f"user{i}@test.com") for i in range(10)]
+    )
+    for node in sharded_db.pools:
+        with sharded_db.connection(node) as conn:
+            conn.execute(
+                "UPDATE activation_code SET created_at = now() - interval '1 hour'"
+            )
+
+    repository = ShardedActivationCodeRepository(sharded_db)
+    first = repository.delete_expired_codes(0, 4)
+    rest = repository.delete_expired_codes(first[-1], 100)
+    assert len(first) == 4 and len(rest) == 6
+    assert max(first) < min(rest)
+
+
+def test_move_buckets_to_a_new_node(sharded_db, shard_urls):
+    repository = ShardedUserRepository(sharded_db)
+    repository.save_users([_user(f"user{i}@test.com") for i in range(30)])
+    current = sharded_db.shard_map
+    target = current.rebalance(
+        {"a": shard_urls["a"], "b": shard_urls["b"], "c": shard_urls["c"]}
+    )
+
+    connections = {
+        node: psycopg.connect(url, autocommit=True)
+        for node, url in target.nodes.items()
+    }
+    moves = current.moves(target).items()
+    try:
+        moved = sum(
+            move_buckets(connections[source], connections[destination], buckets)
+            for (source, destination), buckets in moves
+        )
+        # Run again by mistake: nothing left to move, nothing lost
+        assert not sum(
+            move_buckets(connections[source], connections[destination], buckets)
+            for (source, destination), buckets in moves
+        )
+    finally:
+        for conn in connections.values():
+            conn.close()
+
+    resharded = ShardedDatabase(target, min_size=1)
+    resharded.open()
+    try:
+        emails = _emails_by_node(resharded)
+        assert len(emails["c"]) == moved > 0
+        assert sum(len(node_emails) for node_emails in emails.values()) == 30
+        # Ids kept, new ones allocated above the moved ones
+        repository = ShardedUserRepository(resharded)
+        for i in range(30):
+            user = repository.select_by_email(f"user{i}@test.com")
+            assert target.node_for_id(user["id"]) == target.node_for_email(
+                f"user{i}@test.com"
+            )
+        repository.save_users([_user(f"new{i}@test.com") for i in range(30)])
+        with resharded.connection("c") as conn:
+            assert conn.execute("SELECT count(*) FROM activation_code").fetchone()[0]
+    finally:
+        resharded.close()
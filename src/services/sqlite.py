@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+from src.services import migrations
+
+
+class SQLiteDatabase:
+    """
+    Embedded backend for single-node deployments. WAL mode lets reads run during a write:
+    writes go through one connection behind a lock (SQLite has a single writer anyway),
+    reads through a connection per thread. Each connection caches its compiled statements.
+    """
+
+    path: str
+    __write_conn: sqlite3.Connection | None
+    __write_lock: threading.RLock
+    __depth: int
+    __on_rollback: list[Callable[[], None]]
+    __local: threading.local
+    __read_conns: list[sqlite3.Connection]
+    __read_conns_lock: threading.Lock
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__write_conn = None
+        self.__write_lock = threading.RLock()
+        self.__depth = 0
+        self.__on_rollback = []
+        self.__local = threading.local()
+        self.__read_conns = []
+        self.__read_conns_lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.__write_conn is not None
+
+    def open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self.__connect()
+        conn.execute("PRAGMA journal_mode = WAL")
+        migrations.migrate_sqlite(conn)
+        self.__write_conn = conn
+
+    def close(self) -> None:
+        with self.__write_lock:
+            if self.__write_conn:
+                self.__write_conn.close()
+                self.__write_conn = None
+        with self.__read_conns_lock:
+            for conn in self.__read_conns:
+                conn.close()
+            self.__read_conns.clear()
+        self.__local = threading.local()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Serialized write transaction, committed on exit. Nested calls join the outer one.
+        """
+        with self.__write_lock:
+            conn = self.__write_conn
+            if conn is None:
+                raise RuntimeError("SQLite database is not open")
+            if self.__depth:
+                self.__depth += 1
+                try:
+                    yield conn
+                finally:
+                    self.__depth -= 1
+                return
+
+            # IMMEDIATE takes the write lock now rather than on the first write
+            conn.execute("BEGIN IMMEDIATE")
+            self.__depth = 1
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                for callback in self.__on_rollback:
+                    callback()
+                raise
+            finally:
+                self.__depth = 0
+                self.__on_rollback = []
+
+    def after_rollback(self, callback: Callable[[], None]) -> None:
+        """
+        Runs `callback` if the current write transaction rolls back, e.g. to undo a change
+        made outside the database.
+        """
+        with self.__write_lock:
+            if not self.__depth:
+                raise RuntimeError("No SQLite transaction to roll back")
+            self.__on_rollback.append(callback)
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        This thread's read connection, sees every committed write.
+        """
+        conn = getattr(self.__local, "conn", None)
+        if conn is None:
+            conn = self.__local.conn = self.__connect()
+            conn.execute("PRAGMA query_only = ON")
+            with self.__read_conns_lock:
+                self.__read_conns.append(conn)
+        return conn
+
+    def __connect(self) -> sqlite3.Connection:
+        # Autocommit mode, transactions are explicit
+        conn = sqlite3.connect(
+            self.path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute("PRAGMA foreign_keys = ON")
+        # Durable at each checkpoint rather than each commit, the usual WAL setting
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
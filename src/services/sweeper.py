@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from collections.abc import Callable
+from contextlib import AbstractContextManager, contextmanager
+
+from src.repositories import ActivationCodeRepository
+
+
+@contextmanager
+def _database_repository():
+    from src.repositories.activation_code import SQLiteActivationCodeRepository
+    from src.services.database import SQLITE_MODE, sqlite_db
+
+    if not SQLITE_MODE:
+        # Row deletes would bloat the partitions the rotator drops (services/partitions.py)
+        raise RuntimeError(
+            "Postgres drops expired activation codes with their partition"
+        )
+    # Each batch is its own write transaction
+    yield SQLiteActivationCodeRepository(sqlite_db)
+
+
+class ActivationCodeSweeper:
+    """
+    Deletes expired activation codes in small id-ordered batches, pausing between batches.
+    """
+
+    __repository: Callable[[], AbstractContextManager[ActivationCodeRepository]]
+    __batch_size: int
+    __batch_delay: float
+    __interval: float
+    __stop: threading.Event
+    __thread: threading.Thread | None
+    __last_sweep: dict
+
+    def __init__(
+        self,
+        repository: Callable[
+            [], AbstractContextManager[ActivationCodeRepository]
+        ] = _database_repository,
+        batch_size: int = 500,
+        batch_delay: float = 0.1,
+        interval: float = 60,
+    ):
+        self.__repository = repository
+        self.__batch_size = batch_size
+        self.__batch_delay = batch_delay
+        self.__interval = interval
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__last_sweep = {}
+
+    def sweep_once(self) -> dict:
+        deleted = 0
+        batch_durations = []
+        after_id = 0
+        while True:
+            start = time.perf_counter()
+            with self.__repository() as repository:
+                ids = repository.delete_expired_codes(after_id, self.__batch_size)
+            batch_durations.append(time.perf_counter() - start)
+            deleted += len(ids)
+            # wait() returns True once stopped
+            if len(ids) < self.__batch_size or self.__stop.wait(self.__batch_delay):
+                break
+            after_id = ids[-1]
+
+        self.__last_sweep = {
+            "deleted": deleted,
+            "batches": len(batch_durations),
+            "avg_batch_ms": sum(batch_durations) * 1000 / len(batch_durations),
+            "max_batch_ms": max(batch_durations) * 1000,
+        }
+        return self.__last_sweep
+
+    def start(self) -> None:
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, name="activation-code-sweeper", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def stats(self) -> dict:
+        return dict(self.__last_sweep)
+
+    def __run(self) -> None:
+        while not self.__stop.is_set():
+            try:
+                report = self.sweep_once()
+                if report["deleted"]:
+                    print(f"Activation code sweeper: {report}", flush=True)
+            except Exception as e:
+                # Keep sweeping on the next interval, the DB may be briefly unavailable
+                print(f"Activation code sweeper failed: {e!r}", flush=True)
+            self.__stop.wait(self.__interval)
+
+
+SWEEPER_ENABLED = os.getenv("SWEEPER_ENABLED", "true") == "true"
+
+sweeper = ActivationCodeSweeper(
+    batch_size=int(os.getenv("SWEEPER_BATCH_SIZE", "500")),
+    batch_delay=float(os.getenv("SWEEPER_BATCH_DELAY", "0.1")),
+    interval=float(os.getenv("SWEEPER_INTERVAL", "60")),
+)
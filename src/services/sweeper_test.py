@@ -0,0 +1,21 @@
+from contextlib import nullcontext
+
+from src.repositories import InMemoryActivationCodeRepository
+from src.services.sweeper import ActivationCodeSweeper
+
+
+def test_sweeper_deletes_expired_codes_by_batch():
+    repository = InMemoryActivationCodeRepository()
+    for user_id in range(1, 8):
+        repository.save_fake_activation_code(user_id, "1234")
+        if user_id != 4:
+            repository.expire_code(user_id)
+
+    sweeper = ActivationCodeSweeper(
+        lambda: nullcontext(repository), batch_size=2, batch_delay=0
+    )
+    report = sweeper.sweep_once()
+
+    assert report["deleted"] == 6
+    assert report["batches"] == 4
+    assert list(repository.activation_codes) == [4]
@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
+import psycopg
+
+from src.services import metrics
+from src.services.credential_cache import credential_cache
+from src.services.database import replica_router
+from src.services.email_filter import email_filter
+
+USER_CACHE_CHANNEL = "user_cache"
+# Returned by `get` when the email isn't cached, None being a cached unknown email
+NOT_CACHED = object()
+
+
+class UserCache:
+    """
+    LRU + TTL cache of `select_by_email` results, unknown emails included (for `negative_ttl`).
+    """
+
+    __ttl: float
+    __negative_ttl: float
+    __max_size: int
+    __entries: OrderedDict
+    __emails_by_id: dict
+    __hits: int
+    __misses: int
+    __lock: threading.Lock
+
+    def __init__(
+        self, ttl: float = 30, negative_ttl: float = 5, max_size: int = 10_000
+    ):
+        self.__ttl = ttl
+        self.__negative_ttl = negative_ttl
+        self.__max_size = max_size
+        self.__entries = OrderedDict()
+        self.__emails_by_id = {}
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = threading.Lock()
+
+    def get(self, email: str):
+        with self.__lock:
+            entry = self.__entries.get(email)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self.__remove(email)
+                self.__misses += 1
+                return NOT_CACHED
+            self.__entries.move_to_end(email)
+            self.__hits += 1
+            return dict(entry[1]) if entry[1] is not None else None
+
+    def set(self, email: str, user: dict | None) -> None:
+        """
+        `user` is None for an email without user.
+        """
+        ttl = self.__ttl if user is not None else self.__negative_ttl
+        if self.__max_size <= 0 or ttl <= 0:
+            return
+        with self.__lock:
+            if email in self.__entries:
+                self.__remove(email)
+            self.__entries[email] = (
+                time.monotonic() + ttl,
+                dict(user) if user is not None else None,
+            )
+            if user is not None:
+                self.__emails_by_id[user.get("id")] = email
+            while len(self.__entries) > self.__max_size:
+                self.__remove(next(iter(self.__entries)))
+
+    def invalidate_email(self, email: str) -> None:
+        with self.__lock:
+            if email in self.__entries:
+                self.__remove(email)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self.__lock:
+            email = self.__emails_by_id.get(user_id)
+            if email is not None:
+                self.__remove(email)
+
+    def invalidate_all(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.__emails_by_id.clear()
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.__emails_by_id.clear()
+            self.__hits = 0
+            self.__misses = 0
+
+    def stats(self) -> dict:
+        with self.__lock:
+            lookups = self.__hits + self.__misses
+            return {
+                "size": len(self.__entries),
+                "max_size": self.__max_size,
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "hit_ratio": round(self.__hits / lookups, 3) if lookups else 0,
+            }
+
+    def __remove(self, email: str) -> None:
+        _, user = self.__entries.pop(email)
+        if user is not None and self.__emails_by_id.get(user.get("id")) == email:
+            del self.__emails_by_id[user.get("id")]
+
+
+def email_changed(email: str) -> str:
+    return f"email:{email}"
+
+
+def user_changed(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def apply_change(payload: str) -> None:
+    """
+    Drops what a `email_changed` / `user_changed` payload refers to from the local caches.
+    """
+    kind, _, value = payload.partition(":")
+    if kind == "email":
+        user_cache.invalidate_email(value)
+        # Only published for saved users, another worker may have registered it
+        email_filter.add(value)
+        replica_router.mark_written(email=value)
+    elif kind == "user" and value.isdigit():
+        user_cache.invalidate_user(int(value))
+        credential_cache.invalidate_user(int(value))
+        replica_router.mark_written(user_id=int(value))
+
+
+class UserCacheListener:
+    """
+    Keeps the caches of several workers coherent: writes `pg_notify` a payload on
+    USER_CACHE_CHANNEL in their transaction, so every worker's listener gets it on commit.
+    """
+
+    __conninfo: str | None
+    __on_change: Callable[[str], None]
+    __on_reconnect: Callable[[], None]
+    __stop: threading.Event
+    __thread: threading.Thread | None
+    __received: int
+
+    def __init__(
+        self,
+        conninfo: str | None,
+        on_change: Callable[[str], None] = apply_change,
+        on_reconnect: Callable[[], None] | None = None,
+    ):
+        self.__conninfo = conninfo
+        self.__on_change = on_change
+        self.__on_reconnect = on_reconnect or user_cache.invalidate_all
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__received = 0
+
+    def start(self) -> None:
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, name="user-cache-listener", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def stats(self) -> dict:
+        return {"listening": self.__thread is not None, "received": self.__received}
+
+    def __run(self) -> None:
+        while not self.__stop.is_set():
+            try:
+                with psycopg.connect(self.__conninfo, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {USER_CACHE_CHANNEL}")
+                    # Changes may have been missed while not listening
+                    self.__on_reconnect()
+                    while not self.__stop.is_set():
+                        for notify in conn.notifies(timeout=1):
+                            self.__received += 1
+                            self.__on_change(notify.payload)
+            except Exception as e:
+                print(f"User cache listener failed: {e!r}", flush=True)
+                self.__stop.wait(1)
+
+
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "true") == "true"
+# Cross-worker invalidation with LISTEN/NOTIFY, for several workers on Postgres
+USER_CACHE_LISTEN = os.getenv("USER_CACHE_LISTEN", "false") == "true"
+
+user_cache = UserCache(
+    ttl=float(os.getenv("USER_CACHE_TTL", "30")),
+    negative_ttl=float(os.getenv("USER_CACHE_NEGATIVE_TTL", "5")),
+    max_size=int(os.getenv("USER_CACHE_SIZE", "10000")),
+)
+user_cache_listener = UserCacheListener(os.getenv("DB_URL"))
+
+
+def _lookups() -> dict[tuple, float]:
+    stats = user_cache.stats()
+    return {("hit",): stats["hits"], ("miss",): stats["misses"]}
+
+
+metrics.registry.register(
+    metrics.Gauges(
+        "user_cache_lookups_total",
+        "select_by_email lookups served from the user cache or not",
+        ("result",),
+        _lookups,
+        "counter",
+    )
+)
@@ -0,0 +1,87 @@
+import os
+import time
+
+from src.services import user_cache as user_cache_module
+from src.services.user_cache import (
+    NOT_CACHED,
+    USER_CACHE_CHANNEL,
+    UserCache,
+    UserCacheListener,
+    email_changed,
+    user_changed,
+)
+
+USER = {"id": 1, "email": "user@test.com", "activated": False}
+
+
+def test_user_cache_hit_miss_and_unknown_email():
+    cache = UserCache()
+
+    assert cache.get("user@test.com") is NOT_CACHED
+    cache.set("user@test.com", USER)
+    cache.set("unknown@test.com", None)
+
+    assert cache.get("user@test.com") == USER
+    assert cache.get("unknown@test.com") is None
+    assert cache.stats() == {
+        "size": 2,
+        "max_size": 10_000,
+        "hits": 2,
+        "misses": 1,
+        "hit_ratio": 0.667,
+    }
+
+
+def test_user_cache_expires_unknown_emails_first(monkeypatch):
+    cache = UserCache(ttl=30, negative_ttl=5)
+    cache.set("user@test.com", USER)
+    cache.set("unknown@test.com", None)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+    assert cache.get("unknown@test.com") is NOT_CACHED
+    assert cache.get("user@test.com") == USER
+
+
+def test_user_cache_evicts_least_recently_used():
+    cache = UserCache(max_size=2)
+    cache.set("a@test.com", {**USER, "id": 1})
+    cache.set("b@test.com", {**USER, "id": 2})
+    cache.get("a@test.com")
+    cache.set("c@test.com", {**USER, "id": 3})
+
+    assert cache.get("b@test.com") is NOT_CACHED
+    assert cache.get("a@test.com") is not NOT_CACHED
+
+
+def test_apply_change_invalidates_by_email_and_user_id(monkeypatch):
+    cache = UserCache()
+    monkeypatch.setattr(user_cache_module, "user_cache", cache)
+    cache.set("user@test.com", USER)
+    cache.set("unknown@test.com", None)
+
+    user_cache_module.apply_change(email_changed("unknown@test.com"))
+    user_cache_module.apply_change(user_changed(1))
+
+    assert cache.stats()["size"] == 0
+
+
+def test_listener_applies_notifications(db_conn):
+    changes = []
+    listener = UserCacheListener(
+        os.getenv("DB_URL"), on_change=changes.append, on_reconnect=lambda: None
+    )
+    listener.start()
+    try:
+        deadline = time.monotonic() + 5
+        # Sent until received, the listener may not be listening yet
+        while not changes and time.monotonic() < deadline:
+            db_conn.execute(
+                "SELECT pg_notify(%s, %s)", (USER_CACHE_CHANNEL, user_changed(7))
+            )
+            db_conn.commit()
+            time.sleep(0.1)
+    finally:
+        listener.stop()
+
+    assert changes and set(changes) == {"user:7"}
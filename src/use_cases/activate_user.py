@@ -1,32 +1,40 @@
 from fastapi import Depends
 
 from src.repositories import (
-    ActivationCodeRepository,
+    AsyncUserRepository,
     UserRepository,
-    get_activation_code_repository,
+    get_async_user_repository,
     get_user_repository,
 )
 
 
 class ActivateUser:
     __user_repo: UserRepository
-    __activation_code_repo: ActivationCodeRepository
 
-    def __init__(
-        self,
-        user_repo: UserRepository,
-        activation_repo: ActivationCodeRepository,
-    ):
+    def __init__(self, user_repo: UserRepository):
         self.__user_repo = user_repo
-        self.__activation_code_repo = activation_repo
 
     def execute(self, user_id: int, code: str):
-        self.__activation_code_repo.has_valid_code(user_id=user_id, code=code)
-        self.__user_repo.update_activated(user_id)
+        self.__user_repo.activate_with_code(user_id=user_id, code=code)
+
+
+class AsyncActivateUser:
+    __user_repo: AsyncUserRepository
+
+    def __init__(self, user_repo: AsyncUserRepository):
+        self.__user_repo = user_repo
+
+    async def execute(self, user_id: int, code: str):
+        await self.__user_repo.activate_with_code(user_id=user_id, code=code)
 
 
 def get_activate_user_use_case(
     user_repo: UserRepository = Depends(get_user_repository),
-    activation_repo: UserRepository = Depends(get_activation_code_repository),
 ) -> ActivateUser:
-    return ActivateUser(user_repo=user_repo, activation_repo=activation_repo)
+    return ActivateUser(user_repo=user_repo)
+
+
+def get_async_activate_user_use_case(
+    user_repo: AsyncUserRepository = Depends(get_async_user_repository),
+) -> AsyncActivateUser:
+    return AsyncActivateUser(user_repo=user_repo)
@@ -32,9 +32,7 @@ def save_inactive_user():
 def test_activate_user_execute(save_inactive_user):
     user_data, user_repository, activation_code_repository = save_inactive_user
 
-    activate_user = ActivateUser(
-        user_repo=user_repository, activation_repo=activation_code_repository
-    )
+    activate_user = ActivateUser(user_repo=user_repository)
 
     activate_user.execute(user_data.get("id"), user_data.get("activation_code"))
     user_data = user_repository.select_by_email(user_data.get("email"))
@@ -44,9 +42,7 @@ def test_activate_user_execute(save_inactive_user):
 def test_activate_user_bad_code(save_inactive_user):
     user_data, user_repository, activation_code_repository = save_inactive_user
 
-    activate_user = ActivateUser(
-        user_repo=user_repository, activation_repo=activation_code_repository
-    )
+    activate_user = ActivateUser(user_repo=user_repository)
 
     with pytest.raises(InvalidActivationCode):
         activate_user.execute(user_data.get("id"), "bad_code")
@@ -55,10 +51,18 @@ def test_activate_user_bad_code(save_inactive_user):
 def test_activate_user_expired_code(save_inactive_user):
     user_data, user_repository, activation_code_repository = save_inactive_user
 
-    activate_user = ActivateUser(
-        user_repo=user_repository, activation_repo=activation_code_repository
-    )
+    activate_user = ActivateUser(user_repo=user_repository)
     activation_code_repository.expire_code(user_data.get("id"))
 
     with pytest.raises(CodeExpired):
         activate_user.execute(user_data.get("id"), user_data.get("activation_code"))
+
+
+def test_activate_user_code_is_consumed(save_inactive_user):
+    user_data, user_repository, activation_code_repository = save_inactive_user
+
+    activate_user = ActivateUser(user_repo=user_repository)
+    activate_user.execute(user_data.get("id"), user_data.get("activation_code"))
+
+    with pytest.raises(InvalidActivationCode):
+        activate_user.execute(user_data.get("id"), user_data.get("activation_code"))
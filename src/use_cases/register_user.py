@@ -1,8 +1,13 @@
 from fastapi import BackgroundTasks, Depends
 
 from src.models import User
-from src.repositories import UserRepository, get_user_repository
-from src.services.mail import EmailAdapter, get_email_adapter
+from src.repositories import (
+    AsyncUserRepository,
+    UserRepository,
+    get_async_user_repository,
+    get_user_repository,
+)
+from src.services.mail import EmailAdapter, get_email_adapter, send_activation_codes
 
 
 class RegisterUser:
@@ -22,9 +27,36 @@ class RegisterUser:
 
     def execute(self, user: User):
         self.__user_repo.save_user(user)
+        if self.__user_repo.outbox_enabled:
+            # Mail committed with the user, sent by the mail dispatcher
+            return
         self.__background_tasks.add_task(
-            self.__mail_adapter.send_activation_code,
-            user,
+            send_activation_codes, self.__mail_adapter, [user]
+        )
+
+
+class AsyncRegisterUser:
+    __user_repo: AsyncUserRepository
+    __mail_adapter: EmailAdapter
+    __background_tasks: BackgroundTasks
+
+    def __init__(
+        self,
+        user_repo: AsyncUserRepository,
+        mail_adapter: EmailAdapter,
+        background_tasks: BackgroundTasks,
+    ):
+        self.__user_repo = user_repo
+        self.__mail_adapter = mail_adapter
+        self.__background_tasks = background_tasks
+
+    async def execute(self, user: User):
+        await self.__user_repo.save_user(user)
+        if self.__user_repo.outbox_enabled:
+            # Mail committed with the user, sent by the mail dispatcher
+            return
+        self.__background_tasks.add_task(
+            send_activation_codes, self.__mail_adapter, [user]
         )
 
 
@@ -38,3 +70,15 @@ def get_register_user_use_case(
         mail_adapter=mail_adapter,
         background_tasks=background_tasks,
     )
+
+
+def get_async_register_user_use_case(
+    user_repo: AsyncUserRepository = Depends(get_async_user_repository),
+    mail_adapter: EmailAdapter = Depends(get_email_adapter),
+    background_tasks: BackgroundTasks = BackgroundTasks(),
+) -> AsyncRegisterUser:
+    return AsyncRegisterUser(
+        user_repo=user_repo,
+        mail_adapter=mail_adapter,
+        background_tasks=background_tasks,
+    )
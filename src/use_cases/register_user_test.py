@@ -1,13 +1,18 @@
+import bcrypt
 import pytest
 from fastapi import BackgroundTasks
 
 from src.models import User
 from src.models.exceptions import ValidationError
 from src.models.value_objects import Email, Password
-from src.repositories import InMemoryActivationCodeRepository, InMemoryUserRepository
+from src.repositories import (
+    AsyncInMemoryUserRepository,
+    InMemoryActivationCodeRepository,
+    InMemoryUserRepository,
+)
 from src.services.mail import InMemoryMailAdapter
 
-from .register_user import RegisterUser
+from .register_user import AsyncRegisterUser, RegisterUser
 
 
 def test_register_user_fail_input_validation():
@@ -59,3 +64,48 @@ async def test_register_user_execute():
     assert mail_adapter.has_activation_code_mail(
         email=email, code=user_data.get("activation_code")
     )
+
+
+def test_register_user_hashes_password_once(monkeypatch):
+    calls = []
+    fake_hashpw = bcrypt.hashpw
+
+    def counting_hashpw(password: bytes, salt: bytes) -> bytes:
+        calls.append(password)
+        return fake_hashpw(password, salt)
+
+    monkeypatch.setattr(bcrypt, "hashpw", counting_hashpw)
+
+    activation_code_repository = InMemoryActivationCodeRepository()
+    user_repository = InMemoryUserRepository(activation_code_repository)
+    mail_adapter = InMemoryMailAdapter()
+    user = User(Email("user@test.com"), Password("Password@123"))
+    RegisterUser(user_repository, mail_adapter, BackgroundTasks()).execute(user)
+    mail_adapter.send_activation_code(user)
+
+    assert len(calls) == 1
+    assert user.to_snapshot().get("password") == user.to_snapshot().get("password")
+    assert "password" not in user.to_public_snapshot()
+
+
+@pytest.mark.asyncio
+async def test_async_register_user_execute():
+    activation_code_repository = InMemoryActivationCodeRepository()
+    user_repository = InMemoryUserRepository(activation_code_repository)
+    mail_adapter = InMemoryMailAdapter()
+    background_tasks = BackgroundTasks()
+    register_user = AsyncRegisterUser(
+        AsyncInMemoryUserRepository(user_repository),
+        mail_adapter,
+        background_tasks,
+    )
+
+    email = "user@test.com"
+    user = User(Email(email), Password("Password@123"))
+    await register_user.execute(user)
+
+    assert user_repository.has_user(email) == True
+    user_data = user.to_snapshot()
+    activation_code_repository.has_valid_code(
+        user_id=user_data.get("id"), code=user_data.get("activation_code")
+    )
@@ -0,0 +1,87 @@
+from fastapi import BackgroundTasks, Depends
+
+from src.models import User
+from src.repositories import (
+    AsyncUserRepository,
+    UserRepository,
+    get_async_user_repository,
+    get_user_repository,
+)
+from src.services.mail import EmailAdapter, get_email_adapter, send_activation_codes
+
+
+class RegisterUsers:
+    __user_repo: UserRepository
+    __mail_adapter: EmailAdapter
+    __background_tasks: BackgroundTasks
+
+    def __init__(
+        self,
+        user_repo: UserRepository,
+        mail_adapter: EmailAdapter,
+        background_tasks: BackgroundTasks,
+    ):
+        self.__user_repo = user_repo
+        self.__mail_adapter = mail_adapter
+        self.__background_tasks = background_tasks
+
+    def execute(self, users: list[User]) -> list[User]:
+        """
+        Returns the created users, the others already exist.
+        """
+        created = self.__user_repo.save_users(users)
+        if not self.__user_repo.outbox_enabled:
+            self.__background_tasks.add_task(
+                send_activation_codes, self.__mail_adapter, created
+            )
+
+        return created
+
+
+class AsyncRegisterUsers:
+    __user_repo: AsyncUserRepository
+    __mail_adapter: EmailAdapter
+    __background_tasks: BackgroundTasks
+
+    def __init__(
+        self,
+        user_repo: AsyncUserRepository,
+        mail_adapter: EmailAdapter,
+        background_tasks: BackgroundTasks,
+    ):
+        self.__user_repo = user_repo
+        self.__mail_adapter = mail_adapter
+        self.__background_tasks = background_tasks
+
+    async def execute(self, users: list[User]) -> list[User]:
+        created = await self.__user_repo.save_users(users)
+        if not self.__user_repo.outbox_enabled:
+            self.__background_tasks.add_task(
+                send_activation_codes, self.__mail_adapter, created
+            )
+
+        return created
+
+
+def get_register_users_use_case(
+    user_repo: UserRepository = Depends(get_user_repository),
+    mail_adapter: EmailAdapter = Depends(get_email_adapter),
+    background_tasks: BackgroundTasks = BackgroundTasks(),
+) -> RegisterUsers:
+    return RegisterUsers(
+        user_repo=user_repo,
+        mail_adapter=mail_adapter,
+        background_tasks=background_tasks,
+    )
+
+
+def get_async_register_users_use_case(
+    user_repo: AsyncUserRepository = Depends(get_async_user_repository),
+    mail_adapter: EmailAdapter = Depends(get_email_adapter),
+    background_tasks: BackgroundTasks = BackgroundTasks(),
+) -> AsyncRegisterUsers:
+    return AsyncRegisterUsers(
+        user_repo=user_repo,
+        mail_adapter=mail_adapter,
+        background_tasks=background_tasks,
+    )
@@ -0,0 +1,32 @@
+from fastapi import BackgroundTasks
+
+from src.models import User
+from src.models.value_objects import Email, Password
+from src.repositories import InMemoryActivationCodeRepository, InMemoryUserRepository
+from src.services.mail import InMemoryMailAdapter
+
+from .register_users import RegisterUsers
+
+
+def test_register_users_execute():
+    activation_code_repository = InMemoryActivationCodeRepository()
+    user_repository = InMemoryUserRepository(activation_code_repository)
+    user_repository.save_user(User(Email("taken@test.com"), Password("Password@123")))
+    register_users = RegisterUsers(
+        user_repository, InMemoryMailAdapter(), BackgroundTasks()
+    )
+
+    users = [
+        User(Email("first@test.com"), Password("Password@123")),
+        User(Email("taken@test.com"), Password("Password@123")),
+        User(Email("second@test.com"), Password("Password@123")),
+        User(Email("first@test.com"), Password("Password@123")),
+    ]
+    created = register_users.execute(users)
+
+    assert created == [users[0], users[2]]
+    for user in created:
+        user_data = user.to_snapshot()
+        activation_code_repository.has_valid_code(
+            user_id=user_data.get("id"), code=user_data.get("activation_code")
+        )